@@ -1,84 +1,181 @@
-import os
+import json
+import threading
 import subprocess
 import logging
 from pathlib import Path
 import sys
 
-def run_amtapc(audio_file, output_file, style="level3"):
+AMT_APC_DIR = Path("/app/amt-apc")
+MODEL_FILE = AMT_APC_DIR / "models" / "params" / "apc.pth"
+SERVER_SCRIPT = Path(__file__).parent / "amtapc_server.py"
+
+
+def _check_install():
+    """Make sure the amt-apc checkout and model weights are present"""
+    if not AMT_APC_DIR.exists():
+        raise FileNotFoundError(f"AMT-APC directory {AMT_APC_DIR} does not exist")
+
+    if not MODEL_FILE.exists():
+        raise FileNotFoundError(f"Model file {MODEL_FILE} does not exist. Please ensure it is downloaded.")
+
+
+def _style_level(style):
+    """Accept either a level number (1-3) or a 'levelN' string"""
+    style = str(style)
+    return style if style.startswith("level") else f"level{style}"
+
+
+class AMTAPCEngine:
+    """
+    Long-lived AMT-APC inference process shared by every job in the worker
+
+    apc.pth is loaded once by amtapc_server.py; jobs are sent to it over a
+    pipe so there is no interpreter start, torch import or model load per job.
+    The child runs with cwd set to the amt-apc checkout, so the worker itself
+    never has to chdir.
+    """
+
+    def __init__(self, device=None):
+        self.device = device
+        self.process = None
+        self._lock = threading.Lock()
+        self._next_id = 0
+
+    def start(self):
+        """Start the resident inference process and wait for the model to load"""
+        _check_install()
+        logging.info(f"Using model file: {MODEL_FILE}")
+
+        cmd = [
+            sys.executable, "-u", str(SERVER_SCRIPT),
+            "--amt_apc_dir", str(AMT_APC_DIR),
+            "--path_model", str(MODEL_FILE),
+        ]
+        if self.device:
+            cmd += ["--device", self.device]
+
+        logging.info(f"Starting AMT-APC engine: {' '.join(cmd)}")
+        self.process = subprocess.Popen(
+            cmd,
+            cwd=str(AMT_APC_DIR),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+            bufsize=1,
+        )
+
+        ready = self._read_response()
+        if not ready.get("ready"):
+            raise Exception(f"AMT-APC engine failed to start: {ready}")
+        logging.info("AMT-APC engine ready")
+
+    def close(self):
+        """Stop the inference process"""
+        if self.process and self.process.poll() is None:
+            self.process.stdin.close()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        self.process = None
+
+    def _read_response(self):
+        line = self.process.stdout.readline()
+        if not line:
+            code = self.process.wait()
+            raise Exception(f"AMT-APC engine exited unexpectedly with code {code}")
+        return json.loads(line)
+
+    def transcribe(self, audio_file, output_file, style):
+        """
+        Run inference for one job on the resident model
+
+        Args:
+            audio_file (Path): Input audio file
+            output_file (Path): Output MIDI file
+            style (str): Piano cover style (level1, level2, level3)
+        """
+        with self._lock:
+            # Bring the engine back if it died during a previous job
+            if self.process is None or self.process.poll() is not None:
+                logging.warning("AMT-APC engine is not running; restarting it")
+                self.start()
+
+            self._next_id += 1
+            request = {
+                "id": self._next_id,
+                "input": str(audio_file),
+                "output": str(output_file),
+                "style": style,
+            }
+            self.process.stdin.write(json.dumps(request) + "\n")
+            self.process.stdin.flush()
+            response = self._read_response()
+
+        if not response.get("ok"):
+            raise Exception(f"AMT-APC processing failed: {response.get('error')}")
+        logging.info(f"AMT-APC inference took {response.get('seconds')}s")
+
+
+def run_amtapc(audio_file, output_file, style="level3", engine=None):
     """
     Process audio file with AMT-APC and generate MIDI file
-    
+
     Args:
         audio_file (str): Path to the input audio file
         output_file (str): Path to output MIDI file (e.g., "/tmp/job123.midi")
-        style (str): Piano cover style (level1, level2, level3)
-        
+        style (str): Piano cover style (level1, level2, level3) or level number
+        engine (AMTAPCEngine): Resident engine from the worker; falls back to a one-off subprocess if None
+
     Returns:
         Path: Path to the generated MIDI file
     """
     logging.info(f"Running AMT-APC on {audio_file} with style {style}")
-    audio_file = Path(audio_file)
-    output_file = Path(output_file)
+    audio_file = Path(audio_file).resolve()
+    output_file = Path(output_file).resolve()
     output_dir = output_file.parent
     output_dir.mkdir(parents=True, exist_ok=True)
-    
-    # Ensure we're in the correct directory for the AMT-APC script
-    amt_apc_dir = Path("/app/amt-apc")
-    model_file = amt_apc_dir / "models" / "params" / "apc.pth"
-
-    if not amt_apc_dir.exists():
-        raise FileNotFoundError(f"AMT-APC directory {amt_apc_dir} does not exist")
-    
-    if not model_file.exists():
-        raise FileNotFoundError(f"Model file {model_file} does not exist. Please ensure it is downloaded.")
-    
-    logging.info(f"Using model file: {model_file}")
-
-
-    original_dir = os.getcwd()
-    logging.info(f"Original working directory: {original_dir}")
-    
+
+    style_level = _style_level(style)
+
     try:
-        # Run AMT-APC inference
-        os.chdir(amt_apc_dir)
-        logging.info(f"Current working directory: {os.getcwd()}")
+        if engine is not None:
+            engine.transcribe(audio_file, output_file, style_level)
+        else:
+            _check_install()
+            logging.info(f"Using model file: {MODEL_FILE}")
 
-        style_level = f"level{style}"
+            # Command to run AMT-APC inference
+            cmd = [
+                sys.executable,
+                "infer",  # No .py extension
+                str(audio_file),
+                "--style", style_level,
+                "--output", str(output_file),
+                "--path_model", str(MODEL_FILE)  # Add explicit model path
+            ]
 
-        # Command to run AMT-APC inference
-        cmd = [
-            sys.executable,
-            "infer",  # No .py extension
-            str(audio_file),
-            "--style", style_level,
-            "--output", str(output_file),
-            "--path_model", str(model_file)  # Add explicit model path
-        ]
+            logging.info(f"Executing: {' '.join(cmd)}")
+            result = subprocess.run(
+                cmd,
+                check=True,
+                cwd=str(AMT_APC_DIR),
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True
+            )
+
+            logging.info(f"AMT-APC output: {result.stdout}")
 
-        logging.info(f"Executing: {' '.join(cmd)}")
-        result = subprocess.run(
-            cmd,
-            check=True,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
-        )
-        
-        logging.info(f"AMT-APC output: {result.stdout}")
-        
-        # Move/rename to the desired output file path
         if output_file.exists():
             logging.info(f"Generated MIDI file at {output_file}")
             return output_file
         else:
             raise FileNotFoundError(f"AMT-APC did not generate MIDI file at {output_file}")
-        
+
     except subprocess.CalledProcessError as e:
         logging.error(f"AMT-APC failed: {e.stderr}")
         raise Exception(f"AMT-APC processing failed: {e}")
     except Exception as e:
         logging.error(f"Error running AMT-APC: {e}")
         raise
-    finally:
-        os.chdir(original_dir)
-        logging.info(f"Restored working directory to: {os.getcwd()}")
\ No newline at end of file
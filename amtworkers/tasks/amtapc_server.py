@@ -0,0 +1,85 @@
+"""
+Resident AMT-APC inference process
+
+Started once per worker by AMTAPCEngine with the amt-apc checkout as its
+working directory. It loads apc.pth a single time and then serves requests
+as JSON lines on stdin, answering each with one JSON line on stdout:
+
+    {"id": 1, "input": "/tmp/a.mp3", "output": "/tmp/a.midi", "style": "level2"}
+    {"id": 1, "ok": true}
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+import traceback
+from pathlib import Path
+
+STYLES = ["level1", "level2", "level3"]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--amt_apc_dir", default="/app/amt-apc")
+    parser.add_argument("--path_model", default=None)
+    parser.add_argument("--device", default=None)
+    args = parser.parse_args()
+
+    # Keep the real stdout for the protocol and send everything amt-apc
+    # prints (progress, warnings) to stderr so it can't corrupt responses
+    protocol_out = os.fdopen(os.dup(sys.stdout.fileno()), "w", buffering=1)
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    sys.stdout = sys.stderr
+
+    logging.basicConfig(level=logging.INFO, format="[amtapc-server] %(message)s")
+
+    amt_apc_dir = Path(args.amt_apc_dir)
+    sys.path.insert(0, str(amt_apc_dir))
+
+    import torch
+    from models import Pipeline
+    from data import SVSampler
+    from utils import CONFIG
+
+    device = args.device or ("cuda" if torch.cuda.is_available() else "cpu")
+    path_model = args.path_model or CONFIG.PATH.AMT_APC
+
+    start = time.time()
+    pipeline = Pipeline(path_model, device)
+    sv_sampler = SVSampler()
+    # Touch every style once so a bad style table fails at startup, not mid-job
+    for style in STYLES:
+        sv_sampler.sample(style)
+    logging.info(f"Loaded AMT-APC model {path_model} on {device} in {time.time() - start:.2f}s")
+
+    protocol_out.write(json.dumps({"ready": True}) + "\n")
+
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+
+        request = json.loads(line)
+        response = {"id": request.get("id")}
+        try:
+            style = request["style"]
+            if style not in STYLES:
+                raise ValueError(f"Unknown style {style}")
+
+            job_start = time.time()
+            sv = sv_sampler.sample(style)
+            pipeline.wav2midi(request["input"], request["output"], sv)
+            response["ok"] = True
+            response["seconds"] = round(time.time() - job_start, 3)
+        except Exception as e:
+            traceback.print_exc()
+            response["ok"] = False
+            response["error"] = str(e)
+
+        protocol_out.write(json.dumps(response) + "\n")
+
+
+if __name__ == "__main__":
+    main()
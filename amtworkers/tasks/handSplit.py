@@ -0,0 +1,136 @@
+from bisect import bisect_left, bisect_right
+
+# Notes above/below these always start in the treble/bass hand
+TREBLE_LOW = 66
+BASS_HIGH = 54
+# A hand spans at most 14 semitones (a ninth)
+MAX_SPAN = 14
+MAX_ITERATIONS = 20
+
+
+def split_hands(pitches, max_span=MAX_SPAN, max_iterations=MAX_ITERATIONS):
+    """
+    Assign the notes of one chord to the treble and bass staves
+
+    Notes above 66 go to the treble, notes below 54 to the bass, and the
+    ones in between to whichever hand's average pitch is closer. Then, while
+    a hand spans more than max_span semitones, its note farthest from the
+    hand's average moves to the other hand if it sits closer to that hand's
+    average; otherwise it is dropped and balancing stops.
+
+    Both hands are always contiguous runs of the chord sorted by pitch, so
+    the chord is sorted once and each step only moves the split point (or
+    trims an end), with averages read off prefix sums.
+
+    Args:
+        pitches: MIDI note numbers of the chord, in chord order
+        max_span: Widest interval a hand may cover
+        max_iterations: Upper bound on balancing steps
+
+    Returns:
+        (treble, bass): Lists of indices into pitches, lowest note first.
+        Dropped notes are in neither list.
+    """
+    n = len(pitches)
+    order = sorted(range(n), key=pitches.__getitem__)
+    p = [pitches[i] for i in order]
+
+    prefix = [0]
+    for pitch in p:
+        prefix.append(prefix[-1] + pitch)
+
+    def average(start, end, default):
+        return (prefix[end] - prefix[start]) / (end - start) if end > start else default
+
+    # Bass is p[lo:split], treble is p[split:hi]
+    lo, hi = 0, n
+    bass_end = bisect_left(p, BASS_HIGH)
+    treble_start = bisect_right(p, TREBLE_LOW)
+
+    # Middle notes go to the closer average; that is a threshold on pitch
+    avg_treble = average(treble_start, n, TREBLE_LOW)
+    avg_bass = average(0, bass_end, BASS_HIGH)
+    split = bass_end
+    while split < treble_start and abs(p[split] - avg_treble) > abs(p[split] - avg_bass):
+        split += 1
+
+    # Position of each note in its hand's list (obvious notes, then middle
+    # notes, then notes moved in); breaks ties between equally far notes
+    rank = [None] * n
+    for i in range(n):
+        group = 0 if i < bass_end or i >= treble_start else 1
+        rank[i] = (group, order[i])
+    moves = 0
+
+    def first_listed(start, end, candidates):
+        """Bring the earliest-listed note among equal pitches to its run's edge"""
+        best = min(candidates, key=rank.__getitem__)
+        edge = candidates[0]
+        order[best], order[edge] = order[edge], order[best]
+        rank[best], rank[edge] = rank[edge], rank[best]
+        return rank[edge]
+
+    def run(start, end, from_top):
+        """Indices of notes sharing the lowest (or highest) pitch of p[start:end], edge first"""
+        if from_top:
+            first = bisect_left(p, p[end - 1], start, end)
+            return list(range(end - 1, first - 1, -1))
+        last = bisect_right(p, p[start], start, end)
+        return list(range(start, last))
+
+    for _ in range(max_iterations):
+        changed = False
+
+        avg_treble = average(split, hi, TREBLE_LOW)
+        avg_bass = average(lo, split, BASS_HIGH)
+
+        # Treble too wide?
+        if hi > split and p[hi - 1] - p[split] > max_span:
+            low, high = p[split], p[hi - 1]
+            low_rank = first_listed(split, hi, run(split, hi, False))
+            high_rank = first_listed(split, hi, run(split, hi, True))
+            take_low = abs(low - avg_treble) > abs(high - avg_treble) or (
+                abs(low - avg_treble) == abs(high - avg_treble) and low_rank < high_rank
+            )
+            if take_low and abs(low - avg_bass) < abs(low - avg_treble):
+                rank[split] = (2, moves)
+                moves += 1
+                split += 1
+                changed = True
+            elif take_low:
+                # Dropped; it sat between the hands, so the treble starts above it
+                order[split] = None
+                break
+            else:
+                # The top note is never closer to the bass
+                hi -= 1
+                break
+
+        # Bass too wide?
+        if split > lo and p[split - 1] - p[lo] > max_span:
+            low, high = p[lo], p[split - 1]
+            low_rank = first_listed(lo, split, run(lo, split, False))
+            high_rank = first_listed(lo, split, run(lo, split, True))
+            take_high = abs(high - avg_bass) > abs(low - avg_bass) or (
+                abs(high - avg_bass) == abs(low - avg_bass) and high_rank < low_rank
+            )
+            if take_high and abs(high - avg_treble) < abs(high - avg_bass):
+                split -= 1
+                rank[split] = (2, moves)
+                moves += 1
+                changed = True
+            elif take_high:
+                order[split - 1] = None
+                break
+            else:
+                # The bottom note is never closer to the treble
+                lo += 1
+                break
+
+        if not changed:
+            break
+
+    treble = [i for i in order[split:hi] if i is not None]
+    bass = [i for i in order[lo:split] if i is not None]
+    return treble, bass
+
@@ -0,0 +1,222 @@
+import os
+import re
+import time
+import shutil
+import logging
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import Future
+
+# How long the first file of a batch waits for others to join it
+BATCH_WINDOW_SECONDS = 0.5
+MAX_BATCH_FILES = 8
+MAX_PROCESSES = 2
+
+# "error:" and "fatal error:", but not "programming error:"
+ERROR_PATTERN = re.compile(r"(?<!programming )error:")
+
+# Command-line options per output backend
+BACKEND_OPTIONS = {
+    "pdf": [],
+    "svg": ["-dbackend=svg"],
+}
+
+def _is_error(line):
+    """
+    Whether a line of LilyPond output reports an error (including fatal
+    ones). "programming error:" lines are internal diagnostics; LilyPond
+    still exits 0 and writes usable output after them.
+    """
+    return ERROR_PATTERN.search(line) is not None
+
+class _Request:
+    def __init__(self, ly_path, output_path, backend):
+        self.ly_path = ly_path
+        self.output_path = output_path
+        self.backend = backend
+        self.submitted = time.monotonic()
+        self.future = Future()
+
+class LilyPondRenderer:
+    """
+    Engraves the .ly files of all of a worker's jobs with shared LilyPond runs
+
+    Every LilyPond start loads Guile and the font tables, which takes seconds
+    before any engraving, but one invocation can engrave many files. Files
+    submitted within batch_window of the oldest pending one go into the same
+    invocation (at most max_batch files), and at most max_processes
+    invocations run at once. Files that arrive while every process is busy
+    wait and go out together in the next batch. A batch only holds files
+    for one backend (PDF or SVG).
+
+    Per-file render time is read off LilyPond's progress output (it logs
+    "Processing `file.ly'" as it starts each file) and logged per batch.
+    A file fails if its part of the output has an error line or it produced
+    nothing, even when LilyPond wrote a partial PDF or SVG for it; that
+    doesn't fail the rest of its batch. If a batch exits non-zero without
+    an error line for any file, its files are engraved again one at a time.
+
+    Batches are engraved in a temporary directory under work_dir (the
+    workers' scratch root, e.g. a tmpfs), or the system temp directory if
+    it is empty or unusable.
+    """
+
+    def __init__(self, max_processes=MAX_PROCESSES, batch_window=BATCH_WINDOW_SECONDS, max_batch=MAX_BATCH_FILES,
+                 work_dir=None):
+        self.max_processes = max_processes
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.work_dir = work_dir or None
+        self._pending = []
+        self._condition = threading.Condition()
+        self._slots = threading.BoundedSemaphore(max_processes)
+        self._running = []
+        self._stopped = False
+        self._dispatcher = threading.Thread(target=self._dispatch, name="lilypond", daemon=True)
+
+    def start(self):
+        if self.work_dir:
+            try:
+                os.makedirs(self.work_dir, exist_ok=True)
+            except OSError as e:
+                logging.warning(f"LilyPond work directory {self.work_dir} is unusable, using the temp directory: {e}")
+                self.work_dir = None
+        self._dispatcher.start()
+        logging.info(f"LilyPond renderer started ({self.max_processes} processes, "
+                     f"batches of up to {self.max_batch} files within {self.batch_window}s)")
+
+    def stop(self):
+        """Render whatever is still pending, then wait for running batches"""
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+        self._dispatcher.join()
+        for thread in list(self._running):
+            thread.join()
+
+    def submit(self, ly_path, output_path, backend="pdf"):
+        """
+        Queue a .ly file to be engraved to output_path
+
+        Output is named the way LilyPond names it, after output_path: a PDF
+        is written to output_path itself, SVG pages to output_path for a
+        one-page score and otherwise to its stem plus "-1", "-2", ... before
+        the extension.
+
+        Returns:
+            Future: Resolves to the file's render time in seconds, or raises
+            subprocess.CalledProcessError (with LilyPond's log for the file
+            as output) if nothing was produced
+        """
+        if backend not in BACKEND_OPTIONS:
+            raise ValueError(f"Unsupported LilyPond backend: {backend}")
+        request = _Request(str(ly_path), str(output_path), backend)
+        with self._condition:
+            if self._stopped:
+                raise RuntimeError("LilyPond renderer is stopped")
+            self._pending.append(request)
+            self._condition.notify_all()
+        return request.future
+
+    def render(self, ly_path, output_path, backend="pdf"):
+        """Engrave a .ly file to output_path and wait for it; returns the render time in seconds"""
+        return self.submit(ly_path, output_path, backend).result()
+
+    def _dispatch(self):
+        while True:
+            with self._condition:
+                while not self._pending and not self._stopped:
+                    self._condition.wait()
+                if not self._pending:
+                    return
+
+            # Wait for a free process first; files keep joining the batch meanwhile
+            self._slots.acquire()
+            with self._condition:
+                backend = self._pending[0].backend
+                deadline = self._pending[0].submitted + self.batch_window
+                while not self._stopped:
+                    if sum(request.backend == backend for request in self._pending) >= self.max_batch:
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                batch = [request for request in self._pending if request.backend == backend][:self.max_batch]
+                self._pending = [request for request in self._pending if request not in batch]
+
+            thread = threading.Thread(target=self._run, args=(batch,), name="lilypond-batch", daemon=True)
+            self._running.append(thread)
+            thread.start()
+
+    def _run(self, batch):
+        try:
+            self._engrave(batch)
+        except Exception as e:
+            for request in batch:
+                if not request.future.done():
+                    request.future.set_exception(e)
+        finally:
+            self._running.remove(threading.current_thread())
+            self._slots.release()
+
+    def _engrave(self, batch):
+        with tempfile.TemporaryDirectory(prefix="lilypond_", dir=self.work_dir) as out_dir:
+            # Copied under distinct names, since outputs are named after the inputs
+            inputs = []
+            for index, request in enumerate(batch):
+                input_path = os.path.join(out_dir, f"score_{index:03d}.ly")
+                shutil.copyfile(request.ly_path, input_path)
+                inputs.append(input_path)
+
+            cmd = ["lilypond", *BACKEND_OPTIONS[batch[0].backend], "-o", out_dir, *inputs]
+            started = time.monotonic()
+            process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                       text=True, errors="replace")
+
+            # Files are engraved in argument order; each starts with a "Processing" line
+            file_started = []
+            logs = [[] for _ in batch]
+            preamble = []
+            for line in process.stdout:
+                if line.startswith("Processing `") and len(file_started) < len(batch):
+                    file_started.append(time.monotonic())
+                (logs[len(file_started) - 1] if file_started else preamble).append(line)
+            process.wait()
+            finished = time.monotonic()
+
+            ends = file_started[1:] + [finished]
+            outputs = sorted(os.listdir(out_dir))
+            used = sum(os.path.getsize(os.path.join(out_dir, name)) for name in outputs)
+            errors = [any(_is_error(line) for line in log) for log in logs]
+            unattributed = process.returncode != 0 and not any(errors)
+            if unattributed and len(batch) > 1:
+                logging.warning(f"LilyPond exited with status {process.returncode} on {len(batch)} files without "
+                                f"reporting which failed; engraving them one at a time")
+                for request in batch:
+                    self._engrave([request])
+                return
+
+            timings = []
+            for index, request in enumerate(batch):
+                stem = f"score_{index:03d}"
+                produced = [
+                    name for name in outputs
+                    if name.startswith(stem) and name[len(stem)] in ".-" and name != os.path.basename(inputs[index])
+                ]
+                seconds = ends[index] - file_started[index] if index < len(file_started) else 0.0
+                if produced and not errors[index] and not unattributed:
+                    output_stem, _ = os.path.splitext(request.output_path)
+                    for name in produced:
+                        shutil.move(os.path.join(out_dir, name), output_stem + name[len(stem):])
+                    request.future.set_result(seconds)
+                    timings.append(f"{os.path.basename(request.ly_path)} {seconds:.2f}s")
+                else:
+                    request.future.set_exception(subprocess.CalledProcessError(
+                        process.returncode or 1, cmd, output="".join(preamble + logs[index])))
+                    timings.append(f"{os.path.basename(request.ly_path)} failed")
+
+        startup = (file_started[0] if file_started else finished) - started
+        logging.info(f"LilyPond engraved {len(batch)} file(s) to {batch[0].backend.upper()} in {finished - started:.2f}s "
+                     f"(startup {startup:.2f}s, {used / 1e6:.1f} MB scratch): {', '.join(timings)}")
@@ -1,10 +1,12 @@
 import logging
+from contextlib import ExitStack
 from pathlib import Path
-import struct
 import xml.etree.ElementTree as ET
-from xml.dom import minidom
-from collections import defaultdict
-import mido
+import numpy as np
+from amtworkers.tasks.midiParser import parse_midi
+from amtworkers.tasks.handSplit import split_hands
+from amtworkers.tasks.xmlWriter import MusicXMLWriter
+from amtworkers.tasks.lyWriter import LilyPondWriter
 
 class MidiToMusicXML:
     def __init__(self):
@@ -12,123 +14,17 @@ class MidiToMusicXML:
         self.notes = []
         self.bpm = 120
 
-    def parse_midi_file(self, filepath):
+    def parse_midi_file(self, filepath, midi_data=None):
         """Parse MIDI file and extract notes"""
+        if midi_data is None:
+            midi_data = parse_midi(filepath)
 
-        try:
-            self.bpm = self.get_bpm_with_mido(filepath)
-            logging.info(f"BPM extracted with mido: {self.bpm}")
-        except Exception as e:
-            logging.info(f"Using default BPM (120): {e}")
-        
-        with open(filepath, 'rb') as f:
-            data = f.read()
-        
-        # Skip header and get timing
-        offset = 8
-        _, _, self.ticks_per_quarter = struct.unpack('>HHH', data[offset:offset+6])
-        offset = 14
-        
-        # Parse all tracks
-        while offset < len(data):
-            if data[offset:offset+4] == b'MTrk':
-                offset += 8  # Skip MTrk and length
-                offset = self._parse_track(data, offset)
-            else:
-                offset += 1
-    
-    def _parse_track(self, data, offset):
-        """Parse single track"""
-        track_end = offset + struct.unpack('>I', data[offset-4:offset])[0]
-        current_time = 0
-        running_status = 0
-        note_ons = {}
-        
-        while offset < track_end:
-            # Read delta time
-            delta_time, offset = self._read_varint(data, offset)
-            current_time += delta_time
-            
-            # Read event
-            if data[offset] & 0x80:
-                running_status = data[offset]
-                offset += 1
-            
-            status = running_status & 0xF0
-            
-            if status == 0x90:  # Note on
-                if offset + 2 <= len(data):  # ✅ Bounds check
-                    note, velocity = data[offset:offset+2]
-                    offset += 2
-                    if velocity > 0:
-                        note_ons[note] = current_time
-                    else:  # Velocity 0 = note off
-                        if note in note_ons:
-                            self._add_note(note, note_ons[note], current_time)
-                            del note_ons[note]
-                else:
-                    break
-                        
-            elif status == 0x80:  # Note off
-                if offset + 2 <= len(data):  # ✅ Bounds check
-                    note = data[offset]
-                    offset += 2
-                    if note in note_ons:
-                        self._add_note(note, note_ons[note], current_time)
-                        del note_ons[note]
-                else:
-                    break
-                    
-            elif status in [0xA0, 0xB0, 0xE0]:  # 2-byte events
-                if offset + 2 <= len(data):  # ✅ Bounds check
-                    offset += 2
-                else:
-                    break
-            elif status in [0xC0, 0xD0]:  # 1-byte events
-                if offset + 1 <= len(data):  # ✅ Bounds check
-                    offset += 1
-                else:
-                    break
-            elif offset > 0 and data[offset-1] == 0xFF:  # Meta event
-                if offset < len(data):  # ✅ Bounds check
-                    offset += 1
-                    length, offset = self._read_varint(data, offset)
-                    if offset < len(data):  # ✅ Bounds check
-                        meta_type = data[offset]
-                        if meta_type == 0x51 and length == 3 and offset + 3 <= len(data):  # ✅ Bounds check
-                            tempo_bytes = data[offset:offset+3]
-                            microseconds_per_quarter = int.from_bytes(tempo_bytes, byteorder='big')
-                            self.bpm = round(60000000 / microseconds_per_quarter)
-                        offset += length
-                    else:
-                        break
-                else:
-                    break
-            else:
-                offset += 1
-                
-        return offset
-    
-    def _read_varint(self, data, offset):
-        """Read MIDI variable length integer"""
-        value = 0
-        while offset < len(data):
-            byte = data[offset]
-            offset += 1
-            value = (value << 7) | (byte & 0x7F)
-            if not (byte & 0x80):
-                break
-        return value, offset
-    
-    def _add_note(self, midi_note, start_time, end_time):
-        """Add note to collection"""
-        duration = max(end_time - start_time, self.ticks_per_quarter // 16)
-        self.notes.append({
-            'midi_note': midi_note,
-            'start_time': start_time,
-            'duration': duration,
-            'pitch': self._midi_to_pitch(midi_note)
-        })
+        self.ticks_per_quarter = midi_data.ticks_per_quarter
+        self.bpm = midi_data.initial_bpm()
+        logging.info(f"BPM from MIDI tempo map: {self.bpm}")
+
+        # Structured note table (pitch, onset, duration, velocity, track)
+        self.notes = midi_data.notes
     
     def _midi_to_pitch(self, midi_note):
         """Convert MIDI note to pitch info"""
@@ -141,11 +37,6 @@ class MidiToMusicXML:
         else:
             return {'step': note_name, 'alter': 0, 'octave': octave}
     
-    def _quantize_time(self, time):
-        """Quantize time to nearest 32nd note"""
-        grid = self.ticks_per_quarter // 16  # important
-        return round(time / grid) * grid
-    
     def _get_note_type(self, duration):
         """Get note type from duration"""
         quarter = self.ticks_per_quarter
@@ -203,70 +94,28 @@ class MidiToMusicXML:
         note_type = self._get_note_type(duration)
         return note_type in ['eighth', '16th', '32nd']
     
-    def get_bpm_with_mido(self, filepath):
-        """Extract BPM using mido library"""
-        mid = mido.MidiFile(filepath)
-        
-        for track in mid.tracks:
-            for msg in track:
-                if msg.type == 'set_tempo':
-                    microseconds_per_beat = msg.tempo
-                    bpm = 60000000 / microseconds_per_beat
-                    return round(bpm)
-        
-        return 120  # Default if no tempo found
-    
-    def create_musicxml(self, output_filepath, sheet_music_title=None):
-        """Generate MusicXML"""
-        if not self.notes:
+    def create_musicxml(self, output_filepath, sheet_music_title=None, indent="  ", ly_filepath=None,
+                        compact=False):
+        """
+        Generate MusicXML, streaming measures to the output file as they are built
+
+        With ly_filepath, the same measures are also written as LilyPond
+        source, so the PDF can be engraved without going through musicxml2ly.
+        With compact, silent stretches become multi-measure rests and
+        repeated bars are marked as measure repeats (see _compact_measures).
+        """
+        if len(self.notes) == 0:
             return
-            
-        # Quantize all notes
-        for note in self.notes:
-            note['start_time'] = self._quantize_time(note['start_time'])
-            note['duration'] = max(self._quantize_time(note['duration']), 
-                                 self.ticks_per_quarter // 16)
-
-        # Sort notes by start time
-        self.notes.sort(key=lambda x: x['start_time'])
-        
-        # Create timeline of chord start events only
-        chord_starts = defaultdict(list)
-        for note in self.notes:
-            chord_starts[note['start_time']].append(note)
-        
-        # Create musical moments based on chord starts
-        musical_moments = []
-        chord_times = sorted(chord_starts.keys())
-        
-        for i, chord_time in enumerate(chord_times):
-            chord_notes = chord_starts[chord_time]
-            
-            # Determine duration until next chord or end of longest note
-            if i + 1 < len(chord_times):
-                next_chord_time = chord_times[i + 1]
-                # Duration is until next chord starts
-                duration = next_chord_time - chord_time
-            else:
-                # Last chord - duration is length of longest note
-                duration = max(note['duration'] for note in chord_notes)
-            
-            musical_moments.append({
-                'time': chord_time,
-                'duration': duration,
-                'notes': chord_notes
-            })
-        
-        # Create XML structure
-        root = ET.Element('score-partwise', version="3.1")
 
+        musical_moments = self._build_musical_moments()
+        
         # Add work element
-        work = ET.SubElement(root, 'work')
+        work = ET.Element('work')
         work_title = ET.SubElement(work, 'work-title')
         work_title.text = sheet_music_title if sheet_music_title else "Untitled"
         
         # Part list
-        part_list = ET.SubElement(root, 'part-list')
+        part_list = ET.Element('part-list')
         
         # Treble part
         score_part1 = ET.SubElement(part_list, 'score-part', id="P1")
@@ -278,21 +127,95 @@ class MidiToMusicXML:
         ET.SubElement(score_part2, 'part-name', attrib={"print-object": "no"}).text = ""
         ET.SubElement(score_part2, 'part-abbreviation', attrib={"print-object": "no"}).text = ""
         
-        # Treble part
-        treble_part = ET.SubElement(root, 'part', id="P1")
-        
-        # Bass part
-        bass_part = ET.SubElement(root, 'part', id="P2")
-        
-        # Generate measures
+        with ExitStack() as stack:
+            f = stack.enter_context(open(output_filepath, 'w', encoding='utf-8'))
+            ly_writer = None
+            if ly_filepath:
+                ly_writer = stack.enter_context(
+                    LilyPondWriter(open(ly_filepath, 'w', encoding='utf-8'), sheet_music_title))
+
+            writer = MusicXMLWriter(f, indent=indent)
+            writer.start('score-partwise', {'version': '3.1'})
+            writer.element(work)
+            writer.element(part_list)
+
+            # Measures are written as soon as they are built. The bass part's
+            # go to a spool since the whole treble part has to come first.
+            writer.start('part', {'id': 'P1'})
+            measures = self._generate_measures(musical_moments)
+            if compact:
+                measures = self._compact_measures(measures)
+
+            with writer.deferred() as bass_writer:
+                for treble_measure, bass_measure in measures:
+                    writer.element(treble_measure)
+                    bass_writer.element(bass_measure)
+                    if ly_writer:
+                        ly_writer.measure(treble_measure, bass_measure)
+                writer.end()
+
+                writer.start('part', {'id': 'P2'})
+                writer.splice(bass_writer)
+                writer.end()
+            writer.end()
+
+    def _build_musical_moments(self):
+        """
+        Quantize notes and group them into chords ("musical moments")
+
+        Each moment lasts until the next chord starts; the last one lasts as
+        long as its longest note. Notes keep their parse order within a chord.
+        """
+        grid = max(self.ticks_per_quarter // 16, 1)
+
+        # Quantize to the grid; np.rint rounds half to even like round()
+        starts = (np.rint(self.notes['onset'] / grid) * grid).astype(np.int64)
+        durations = np.maximum((np.rint(self.notes['duration'] / grid) * grid).astype(np.int64), grid)
+
+        # Stable sort by start time, then one group per distinct start
+        order = np.argsort(starts, kind='stable')
+        starts = starts[order]
+        durations = durations[order]
+        pitches = self.notes['pitch'][order]
+
+        chord_times, chord_starts = np.unique(starts, return_index=True)
+        chord_ends = np.append(chord_starts[1:], len(starts))
+
+        # Duration is until the next chord starts; the last chord gets its longest note
+        moment_durations = np.append(np.diff(chord_times), durations[chord_starts[-1]:].max())
+
+        pitch_info = [self._midi_to_pitch(midi_note) for midi_note in range(128)]
+        notes = [
+            {
+                'midi_note': midi_note,
+                'start_time': start_time,
+                'duration': duration,
+                'pitch': pitch_info[midi_note]
+            }
+            for midi_note, start_time, duration in zip(pitches.tolist(), starts.tolist(), durations.tolist())
+        ]
+
+        return [
+            {
+                'time': chord_time,
+                'duration': duration,
+                'notes': notes[chord_start:chord_end]
+            }
+            for chord_time, duration, chord_start, chord_end in zip(
+                chord_times.tolist(), moment_durations.tolist(), chord_starts.tolist(), chord_ends.tolist()
+            )
+        ]
+
+    def _generate_measures(self, musical_moments):
+        """Yield (treble, bass) measure elements in order"""
         measure_length = self.ticks_per_quarter * 4  # 4/4 time
         current_time = 0
         measure_num = 1
         moment_index = 0
         
         while moment_index < len(musical_moments):
-            treble_measure = ET.SubElement(treble_part, 'measure', number=str(measure_num))
-            bass_measure = ET.SubElement(bass_part, 'measure', number=str(measure_num))
+            treble_measure = ET.Element('measure', number=str(measure_num))
+            bass_measure = ET.Element('measure', number=str(measure_num))
             measure_end = current_time + measure_length
             
             # Add attributes to first measure
@@ -338,83 +261,10 @@ class MidiToMusicXML:
                 # Calculate actual duration (clip to measure boundary)
                 actual_duration = min(moment['duration'], measure_end - moment_time)
                 
-                # Step 1: split obvious notes
-                treble_notes = [n for n in moment['notes'] if n['midi_note'] > 66]
-                bass_notes = [n for n in moment['notes'] if n['midi_note'] < 54]
-
-                # Step 2: remaining notes
-                obvious_set = set(id(n) for n in treble_notes + bass_notes)
-                middle_notes = [n for n in moment['notes'] if id(n) not in obvious_set]
-
-                # Step 3: compute averages of obvious notes
-                avg_treble = sum(n['midi_note'] for n in treble_notes) / len(treble_notes) if treble_notes else 66
-                avg_bass = sum(n['midi_note'] for n in bass_notes) / len(bass_notes) if bass_notes else 54
-
-                # Step 4: assign middle notes based on proximity
-                for n in middle_notes:
-                    dist_to_treble = abs(n['midi_note'] - avg_treble)
-                    dist_to_bass = abs(n['midi_note'] - avg_bass)
-                    
-                    if dist_to_treble <= dist_to_bass:
-                        treble_notes.append(n)
-                    else:
-                        bass_notes.append(n)
-                
-                # Step 5: enforce 9-note (=14 semitone) range per hand
-                MAX_RANGE = 14
-                MAX_ITER = 20  # prevent infinite loops
-
-                def get_range(notes):
-                    if not notes:
-                        return 0
-                    notes_sorted = sorted(notes, key=lambda n: n['midi_note'])
-                    return notes_sorted[-1]['midi_note'] - notes_sorted[0]['midi_note']
-
-                def average_pitch(notes, default):
-                    return sum(n['midi_note'] for n in notes) / len(notes) if notes else default
-
-                def enforce_range(treble_notes, bass_notes):
-                    iteration = 0
-
-                    while iteration < MAX_ITER:
-                        iteration += 1
-                        changed = False
-
-                        avg_treble = average_pitch(treble_notes, 66)
-                        avg_bass = average_pitch(bass_notes, 54)
-
-                        # Treble too wide?
-                        if get_range(treble_notes) > MAX_RANGE:
-                            center = avg_treble
-                            farthest = max(treble_notes, key=lambda n: abs(n['midi_note'] - center))
-                            # Move only if it makes bass more balanced
-                            if abs(farthest['midi_note'] - avg_bass) < abs(farthest['midi_note'] - avg_treble):
-                                treble_notes.remove(farthest)
-                                bass_notes.append(farthest)
-                                changed = True
-                            else:
-                                # Otherwise, just drop it or break to avoid looping
-                                treble_notes.remove(farthest)
-                                break
-
-                        # Bass too wide?
-                        if get_range(bass_notes) > MAX_RANGE:
-                            center = avg_bass
-                            farthest = max(bass_notes, key=lambda n: abs(n['midi_note'] - center))
-                            if abs(farthest['midi_note'] - avg_treble) < abs(farthest['midi_note'] - avg_bass):
-                                bass_notes.remove(farthest)
-                                treble_notes.append(farthest)
-                                changed = True
-                            else:
-                                bass_notes.remove(farthest)
-                                break
-
-                        if not changed:
-                            break
-
-                    return treble_notes, bass_notes
-
-                treble_notes, bass_notes = enforce_range(treble_notes, bass_notes)
+                # Split the chord between the hands (at most 14 semitones each)
+                treble_indices, bass_indices = split_hands([n['midi_note'] for n in moment['notes']])
+                treble_notes = [moment['notes'][i] for i in treble_indices]
+                bass_notes = [moment['notes'][i] for i in bass_indices]
                 
                 # Handle treble part
                 if treble_notes:
@@ -485,12 +335,87 @@ class MidiToMusicXML:
                 self._add_rest(treble_measure, rest_duration, last_treble_rest)
                 self._add_rest(bass_measure, rest_duration, last_bass_rest)
             
+            yield treble_measure, bass_measure
+
             current_time = measure_end
             measure_num += 1
-        
-        # Write XML file
-        self._write_xml(root, output_filepath)
     
+    def _compact_measures(self, measures):
+        """
+        Post-pass over (treble, bass) measures that marks silences and repeats
+
+        A run of two or more measures with nothing but rests in both staves
+        gets a <multiple-rest> on its first measure, and each of its measures
+        is reduced to a single whole-measure rest. A measure whose notes are
+        an exact copy of the previous measure's in the same staff starts a
+        <measure-repeat>, which stops at the next measure that isn't a copy.
+        Every measure is still written, as MusicXML requires; only a silent
+        run is held back until its length is known.
+        """
+        silent_run = []
+        previous = [None, None]  # notes of the last measure in each staff
+        repeating = [False, False]
+
+        def release_run():
+            if len(silent_run) > 1:
+                for staff in (0, 1):
+                    self._add_measure_style(silent_run[0][staff], 'multiple-rest', text=str(len(silent_run)))
+            for pair in silent_run:
+                for measure in pair:
+                    self._reduce_to_measure_rest(measure)
+            released = list(silent_run)
+            silent_run.clear()
+            return released
+
+        for pair in measures:
+            contents = [self._measure_notes(measure) for measure in pair]
+            silent = all(self._is_silent(measure) for measure in pair)
+
+            for staff in (0, 1):
+                is_copy = not silent and contents[staff] == previous[staff]
+                if repeating[staff] and not is_copy:
+                    self._add_measure_style(pair[staff], 'measure-repeat', {'type': 'stop'})
+                    repeating[staff] = False
+                elif is_copy and not repeating[staff]:
+                    self._add_measure_style(pair[staff], 'measure-repeat', {'type': 'start', 'slashes': '1'}, '1')
+                    repeating[staff] = True
+                previous[staff] = None if silent else contents[staff]
+
+            if silent:
+                silent_run.append(pair)
+                continue
+
+            yield from release_run()
+            yield pair
+
+        yield from release_run()
+
+    def _measure_notes(self, measure):
+        """A measure's notes serialized, for comparing measures"""
+        return b"".join(ET.tostring(note) for note in measure.findall('note'))
+
+    def _is_silent(self, measure):
+        return all(note.find('rest') is not None for note in measure.findall('note'))
+
+    def _reduce_to_measure_rest(self, measure):
+        """Replace a silent measure's rests with one whole-measure rest"""
+        notes = list(measure.findall('note'))
+        length = sum(int(note.find('duration').text) for note in notes)
+        for note in notes:
+            measure.remove(note)
+        note = ET.SubElement(measure, 'note')
+        ET.SubElement(note, 'rest', measure="yes")
+        ET.SubElement(note, 'duration').text = str(length)
+
+    def _add_measure_style(self, measure, tag, attrib=None, text=None):
+        """Add a <measure-style> child to the measure's attributes, creating them if needed"""
+        attributes = measure.find('attributes')
+        if attributes is None:
+            attributes = ET.Element('attributes')
+            measure.insert(0, attributes)
+        measure_style = ET.SubElement(attributes, 'measure-style')
+        ET.SubElement(measure_style, tag, attrib or {}).text = text
+
     def _add_measure_attributes(self, measure, clef_type="treble"):
         """Add measure attributes (time signature, key, clef)"""
         attributes = ET.SubElement(measure, 'attributes')
@@ -552,27 +477,17 @@ class MidiToMusicXML:
             note_type.text = self._get_note_type(duration)
             
             return note
-    
-    def _write_xml(self, root, filepath):
-        """Write XML to file with formatting"""
-        xml_str = ET.tostring(root, encoding='unicode')
-        dom = minidom.parseString(xml_str)
-        pretty_xml = dom.toprettyxml(indent="  ")
-        
-        # Remove empty lines
-        lines = [line for line in pretty_xml.split('\n') if line.strip()]
-        
-        with open(filepath, 'w', encoding='utf-8') as f:
-            f.write('\n'.join(lines))
 
-def convert_midi_to_musicxml(midi_file, output_file, sheet_music_title=None):
-    """Convert MIDI file to MusicXML"""
+def convert_midi_to_musicxml(midi_file, output_file, sheet_music_title=None, midi_data=None, ly_file=None,
+                             compact=False):
+    """Convert MIDI file to MusicXML (and optionally LilyPond source)"""
     converter = MidiToMusicXML()
-    converter.parse_midi_file(midi_file)
-    converter.create_musicxml(output_file, sheet_music_title)
+    converter.parse_midi_file(midi_file, midi_data)
+    converter.create_musicxml(output_file, sheet_music_title, ly_filepath=ly_file, compact=compact)
     print(f"Converted {midi_file} to {output_file}")
 
-def convert_midi_to_xml(midi_file_path, output_path, job_id=None, sheet_music_title=None):
+def convert_midi_to_xml(midi_file_path, output_path, job_id=None, sheet_music_title=None, midi_data=None, ly_path=None,
+                        compact=False):
     """
     Convert MIDI file to MusicXML format
     
@@ -580,6 +495,10 @@ def convert_midi_to_xml(midi_file_path, output_path, job_id=None, sheet_music_ti
         midi_file_path: Path to the input MIDI file
         output_path: Path where the XML file should be saved
         job_id: Optional job ID for logging
+        midi_data: Already parsed MIDI (MidiData); the file is parsed if None
+        ly_path: Optional path to also write the score as LilyPond source
+        compact: Collapse silent stretches into multi-measure rests and mark
+            repeated bars as measure repeats
     
     Returns:
         str: Path to the generated XML file
@@ -593,7 +512,7 @@ def convert_midi_to_xml(midi_file_path, output_path, job_id=None, sheet_music_ti
         else:
             logging.info(f"Converting MIDI {midi_file_path} to MusicXML")
     
-        convert_midi_to_musicxml(midi_file_path, output_path, sheet_music_title)
+        convert_midi_to_musicxml(midi_file_path, output_path, sheet_music_title, midi_data, ly_path, compact)
         
         # Verify the file was created
         if not Path(output_path).exists():
@@ -1,12 +1,109 @@
-import os
+import json
 import subprocess
 import sys
-import uuid
+import tempfile
 import logging
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, wait
 import shutil
 
-def convert_musicxml_to_pdf(input_path, output_path=None, remove_tagline=True):
+# Per-page output for the web viewer: one SVG per page plus a small PNG
+# thumbnail, listed in a manifest
+THUMBNAIL_DPI = 40
+THUMBNAIL_PROCESSES = 4
+PAGE_MANIFEST = "manifest.json"
+
+def _engrave(ly_path, pdf_path, remove_tagline, renderer=None, svg_path=None):
+    """
+    Run LilyPond on a .ly file, through the shared renderer if there is one
+
+    With svg_path, the SVG pages are engraved at the same time as the PDF
+    (a second LilyPond run, since a run has a single backend).
+    """
+    # Remove LilyPond watermark (if requested)
+    if remove_tagline:
+        with open(ly_path, "a", encoding="utf-8") as f:
+            f.write("\n\\paper { tagline = ##f }\n")
+
+    # Generate PDF (and SVG pages)
+    outputs = [(pdf_path, "pdf")] + ([(svg_path, "svg")] if svg_path else [])
+    if renderer:
+        futures = [renderer.submit(ly_path, path, backend) for path, backend in outputs]
+        wait(futures)
+        for (_, backend), future in zip(outputs, futures):
+            logging.info(f"Engraved {Path(ly_path).name} to {backend.upper()} in {future.result():.2f}s")
+    else:
+        cmds = [
+            ["lilypond", *(["-dbackend=svg"] if backend == "svg" else []),
+             "-o", str(Path(path).with_suffix("")), str(ly_path)]
+            for path, backend in outputs
+        ]
+        processes = [subprocess.Popen(cmd) for cmd in cmds]
+        for process, cmd in zip(processes, cmds):
+            if process.wait() != 0:
+                raise subprocess.CalledProcessError(process.returncode, cmd)
+
+def _page_number(svg_path):
+    """Page of an SVG LilyPond wrote; a one-page score has no number"""
+    stem = svg_path.stem
+    _, _, number = stem.rpartition("-")
+    return int(number) if number.isdigit() else 1
+
+def _thumbnail(pdf_path, page, png_path):
+    """Rasterize one PDF page to a low-resolution PNG with Ghostscript"""
+    subprocess.run([
+        "gs", "-q", "-dSAFER", "-dBATCH", "-dNOPAUSE", "-sDEVICE=png16m", f"-r{THUMBNAIL_DPI}",
+        "-dTextAlphaBits=4", "-dGraphicsAlphaBits=4", f"-dFirstPage={page}", f"-dLastPage={page}",
+        f"-sOutputFile={png_path}", str(pdf_path),
+    ], check=True, capture_output=True)
+
+def _write_pages(svg_path, pdf_path, pages_dir):
+    """
+    Collect the engraved SVG pages into pages_dir as page_NNN.svg, render
+    thumb_NNN.png for every page in parallel and write the page manifest.
+    Thumbnails are best effort; a page without one has "thumbnail": null.
+    """
+    pages_dir = Path(pages_dir)
+    pages_dir.mkdir(parents=True, exist_ok=True)
+    svg_path = Path(svg_path)
+    svgs = sorted(svg_path.parent.glob(f"{svg_path.stem}*.svg"), key=_page_number)
+
+    pages = []
+    for svg in svgs:
+        page = _page_number(svg)
+        page_svg = pages_dir / f"page_{page:03d}.svg"
+        shutil.move(str(svg), str(page_svg))
+        pages.append({"page": page, "svg": page_svg.name, "thumbnail": f"thumb_{page:03d}.png"})
+
+    if shutil.which("gs") is None:
+        logging.warning("Ghostscript not found in PATH; score pages have no thumbnails")
+        for entry in pages:
+            entry["thumbnail"] = None
+    elif pages:
+        with ThreadPoolExecutor(max_workers=min(THUMBNAIL_PROCESSES, len(pages))) as pool:
+            futures = [
+                pool.submit(_thumbnail, pdf_path, entry["page"], pages_dir / entry["thumbnail"])
+                for entry in pages
+            ]
+            for entry, future in zip(pages, futures):
+                try:
+                    future.result()
+                except subprocess.CalledProcessError as e:
+                    logging.warning(f"Could not render thumbnail for page {entry['page']}: {e}")
+                    entry["thumbnail"] = None
+
+    manifest = {
+        "page_count": len(pages),
+        "svg_media_type": "image/svg+xml",
+        "thumbnail_media_type": "image/png",
+        "pages": pages,
+    }
+    with open(pages_dir / PAGE_MANIFEST, "w") as f:
+        json.dump(manifest, f)
+    return manifest
+
+def convert_musicxml_to_pdf(input_path, output_path=None, remove_tagline=True, ly_path=None, renderer=None,
+                            work_dir=None, pages_dir=None):
     """
     Convert a MusicXML file to PDF using LilyPond.
     
@@ -14,6 +111,15 @@ def convert_musicxml_to_pdf(input_path, output_path=None, remove_tagline=True):
         input_path (str): Path to input .xml or .musicxml file.
         output_path (str): Optional path for output PDF (default: same dir as input).
         remove_tagline (bool): Whether to remove LilyPond's footer watermark.
+        ly_path (str): Optional LilyPond source written alongside the MusicXML
+            (see lyWriter). It is engraved directly; musicxml2ly is only run
+            if it is missing or LilyPond fails on it.
+        renderer (LilyPondRenderer): Optional shared renderer that batches
+            LilyPond runs across jobs; LilyPond is started directly if None.
+        work_dir (str): Directory for intermediate files (default: the system
+            temp directory); they are removed when the conversion ends.
+        pages_dir (str): Optional directory to also write every page to as
+            SVG, with a PNG thumbnail per page and a manifest listing them.
 
     Returns:
         str: Path to generated PDF file.
@@ -23,39 +129,47 @@ def convert_musicxml_to_pdf(input_path, output_path=None, remove_tagline=True):
     """
     try:
         # Ensure required tools exist
-        for cmd in ["musicxml2ly", "lilypond"]:
-            if shutil.which(cmd) is None:
-                raise FileNotFoundError(f"Required tool '{cmd}' not found in PATH.")
+        if shutil.which("lilypond") is None:
+            raise FileNotFoundError("Required tool 'lilypond' not found in PATH.")
         
         input_path = Path(input_path)
         if not input_path.exists():
             raise FileNotFoundError(f"Input file not found: {input_path}")
 
-        # Prepare working directory
-        work_dir = Path(os.getcwd()) / "uploads"
-        work_dir.mkdir(parents=True, exist_ok=True)
+        final_path = Path(output_path) if output_path else input_path.with_suffix(".pdf")
+
+        # Intermediate files go in a private directory that is always removed
+        with tempfile.TemporaryDirectory(prefix="xmlToPdf_", dir=work_dir) as tmp_dir:
+            pdf_path = Path(tmp_dir) / "score.pdf"
+            svg_path = Path(tmp_dir) / "page.svg" if pages_dir else None
 
-        # Temporary IDs for intermediate files
-        job_id = str(uuid.uuid4())[:8]
-        ly_path = work_dir / f"{job_id}.ly"
-        pdf_path = work_dir / f"{job_id}.pdf"
+            engraved = False
+            if ly_path and Path(ly_path).exists():
+                try:
+                    _engrave(ly_path, pdf_path, remove_tagline, renderer, svg_path)
+                    engraved = True
+                except subprocess.CalledProcessError as e:
+                    logging.warning(f"LilyPond failed on {ly_path}, falling back to musicxml2ly: {e}")
+                    for stale in Path(tmp_dir).glob("page*.svg"):
+                        stale.unlink()
 
-        # Step 1: Convert MusicXML → LilyPond (.ly)
-        subprocess.run(["musicxml2ly", str(input_path), "-o", str(ly_path)], check=True)
+            if not engraved:
+                if shutil.which("musicxml2ly") is None:
+                    raise FileNotFoundError("Required tool 'musicxml2ly' not found in PATH.")
 
-        # Step 2: Remove LilyPond watermark (if requested)
-        if remove_tagline:
-            with open(ly_path, "a", encoding="utf-8") as f:
-                f.write("\n\\paper { tagline = ##f }\n")
+                # Step 1: Convert MusicXML → LilyPond (.ly)
+                xml_ly_path = Path(tmp_dir) / "score.ly"
+                subprocess.run(["musicxml2ly", str(input_path), "-o", str(xml_ly_path)], check=True)
+                _engrave(xml_ly_path, pdf_path, remove_tagline, renderer, svg_path)
 
-        # Step 3: Generate PDF
-        subprocess.run(["lilypond", "-o", str(work_dir / job_id), str(ly_path)], check=True)
+            if pages_dir:
+                manifest = _write_pages(svg_path, pdf_path, pages_dir)
+                logging.info(f"Wrote {manifest['page_count']} score page(s) to {pages_dir}")
 
-        # Step 4: Rename final PDF
-        final_path = Path(output_path) if output_path else (work_dir / "test.pdf")
-        if final_path.exists():
-            final_path.unlink()
-        shutil.move(str(pdf_path), str(final_path))
+            # Step 4: Move final PDF into place
+            if final_path.exists():
+                final_path.unlink()
+            shutil.move(str(pdf_path), str(final_path))
 
         logging.info(f"Successfully converted {input_path.name} to {final_path.name}")
         return str(final_path)
@@ -0,0 +1,121 @@
+import tempfile
+
+
+def _escape(data):
+    """Escape text and attribute values the way minidom does"""
+    return data.replace("&", "&amp;").replace("<", "&lt;").replace("\"", "&quot;").replace(">", "&gt;")
+
+
+def _attributes(attrib):
+    if not attrib:
+        return ""
+    return "".join(f' {name}="{_escape(str(value))}"' for name, value in attrib.items())
+
+
+class MusicXMLWriter:
+    """
+    Streams MusicXML to a file handle one element at a time
+
+    Containers (score-partwise, part) are opened and closed explicitly and
+    small subtrees such as a measure are built with ElementTree and written
+    as soon as they are finished, so the whole score never sits in memory.
+
+    With indent="  " the output is byte-for-byte what the old
+    ET.tostring -> minidom.toprettyxml -> drop-blank-lines pipeline produced
+    (no trailing newline). indent=None writes everything on one line.
+    """
+
+    def __init__(self, fh, indent="  ", xml_declaration=True):
+        self.fh = fh
+        self.indent = indent or ""
+        self._newline = "" if indent is None else "\n"
+        self._depth = 0
+        self._open_tags = []
+        self._pending = False  # last start tag is still missing its '>'
+        self._started = False
+        if xml_declaration:
+            self._line('<?xml version="1.0" ?>', 0)
+
+    def _line(self, text, depth):
+        if self._started:
+            self.fh.write(self._newline)
+        self.fh.write(self.indent * depth + text)
+        self._started = True
+
+    def _close_pending(self):
+        if self._pending:
+            self.fh.write(">")
+            self._pending = False
+
+    def start(self, tag, attrib=None):
+        """Open a container element"""
+        self._close_pending()
+        self._line(f"<{tag}{_attributes(attrib)}", self._depth)
+        self._pending = True
+        self._open_tags.append(tag)
+        self._depth += 1
+
+    def end(self):
+        """Close the innermost open container"""
+        tag = self._open_tags.pop()
+        self._depth -= 1
+        if self._pending:
+            # Nothing was written inside it
+            self.fh.write("/>")
+            self._pending = False
+        else:
+            self._line(f"</{tag}>", self._depth)
+
+    def element(self, elem):
+        """Write a complete ElementTree subtree at the current position"""
+        self._close_pending()
+        self._write_element(elem, self._depth)
+
+    def _write_element(self, elem, depth):
+        attrib = _attributes(elem.attrib)
+        if len(elem):
+            self._line(f"<{elem.tag}{attrib}>", depth)
+            for child in elem:
+                self._write_element(child, depth + 1)
+            self._line(f"</{elem.tag}>", depth)
+        elif elem.text:
+            self._line(f"<{elem.tag}{attrib}>{_escape(elem.text)}</{elem.tag}>", depth)
+        else:
+            self._line(f"<{elem.tag}{attrib}/>", depth)
+
+    def deferred(self):
+        """
+        Writer for content that belongs at the current depth but is
+        produced before it can be placed (e.g. the second part's measures,
+        generated alongside the first part's). Spooled to a temporary file
+        and copied in with splice().
+        """
+        writer = MusicXMLWriter(
+            tempfile.TemporaryFile("w+", encoding="utf-8"),
+            indent=self.indent if self._newline else None,
+            xml_declaration=False,
+        )
+        writer._depth = self._depth
+        # Every line it writes follows something already in this document
+        writer._started = True
+        return writer
+
+    def splice(self, deferred, chunk_size=1024 * 1024):
+        """Copy a deferred writer's content in at the current position"""
+        deferred.fh.seek(0)
+        chunk = deferred.fh.read(chunk_size)
+        if chunk:
+            self._close_pending()
+        while chunk:
+            self.fh.write(chunk)
+            chunk = deferred.fh.read(chunk_size)
+        self._started = True
+
+    def close(self):
+        self.fh.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
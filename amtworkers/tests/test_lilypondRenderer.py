@@ -0,0 +1,72 @@
+import pytest
+
+from amtworkers.tasks.lilypondRenderer import _is_error
+
+# A file that engraves fine despite internal diagnostics (LilyPond exits 0)
+PROGRAMMING_ERROR_LOG = """\
+Processing `/tmp/lilypond_x/score_000.ly'
+Parsing...
+Interpreting music...[8][16]
+Preprocessing graphical objects...
+programming error: Improbable offset for stencil: -inf staff space
+continuing, cross fingers
+/tmp/lilypond_x/score_000.ly:42:7: programming error: no heads for note column
+Finding the ideal number of pages...
+Fitting music on 2 pages...
+Drawing systems...
+Converting to `score_000.pdf'...
+Success: compilation successfully completed
+"""
+
+# A file with a real error; LilyPond may still leave a partial PDF behind
+SYNTAX_ERROR_LOG = """\
+Processing `/tmp/lilypond_x/score_001.ly'
+Parsing...
+/tmp/lilypond_x/score_001.ly:3:1: error: unknown escaped string: `\\foo'
+
+\\foo
+/tmp/lilypond_x/score_001.ly:3:1: error: syntax error, unexpected STRING
+Interpreting music...
+Converting to `score_001.pdf'...
+"""
+
+FATAL_ERROR_LOG = """\
+Processing `/tmp/lilypond_x/score_002.ly'
+Parsing...
+/tmp/lilypond_x/score_002.ly:1: fatal error: cannot open file: `missing.ily'
+"""
+
+WARNING_LOG = """\
+Processing `/tmp/lilypond_x/score_003.ly'
+Parsing...
+/tmp/lilypond_x/score_003.ly:9:5: warning: barcheck failed at: 1/4
+Converting to `score_003.pdf'...
+Success: compilation successfully completed
+"""
+
+
+def has_error(log):
+    return any(_is_error(line) for line in log.splitlines(keepends=True))
+
+
+@pytest.mark.parametrize("log, expected", [
+    (PROGRAMMING_ERROR_LOG, False),
+    (WARNING_LOG, False),
+    (SYNTAX_ERROR_LOG, True),
+    (FATAL_ERROR_LOG, True),
+    (PROGRAMMING_ERROR_LOG + SYNTAX_ERROR_LOG, True),
+])
+def test_log_has_error(log, expected):
+    assert has_error(log) == expected
+
+
+@pytest.mark.parametrize("line, expected", [
+    ("error: failed files: \"score_001.ly\"\n", True),
+    ("fatal error: failed files: \"score_001.ly\"\n", True),
+    ("score.ly:3:1: error: unknown escaped string\n", True),
+    ("programming error: Improbable offset for stencil\n", False),
+    ("score.ly:42:7: programming error: no heads for note column\n", False),
+    ("Success: compilation successfully completed\n", False),
+])
+def test_is_error(line, expected):
+    assert _is_error(line) == expected
@@ -0,0 +1,121 @@
+import os
+import time
+import socket
+import hashlib
+import logging
+import threading
+
+# Move an item from a processing list back onto the consumed end of the
+# queue, but only if it is still there (so two reapers can't both requeue it)
+REQUEUE_SCRIPT = """
+if redis.call('LREM', KEYS[1], 1, ARGV[1]) == 1 then
+    redis.call('RPUSH', KEYS[2], ARGV[1])
+    return 1
+end
+return 0
+"""
+
+class ReliableQueue:
+    """
+    Lease-based consumer for a Redis list queue
+
+    Jobs are taken with BLMOVE into a per-worker processing list instead of
+    being popped, so a crashed container never loses them. Every in-flight job
+    holds a lease key that a heartbeat thread keeps alive; a reaper returns
+    items whose lease has expired to the queue. Jobs leave the processing list
+    only when they are acked (done/error) or explicitly requeued.
+    """
+
+    def __init__(self, r, queue_name, worker_id=None, lease_seconds=120, heartbeat_seconds=30, reap_seconds=60):
+        self.r = r
+        self.queue_name = queue_name
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.processing_list = f"{queue_name}:processing:{self.worker_id}"
+        self.lease_seconds = lease_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self.reap_seconds = reap_seconds
+
+        self._requeue = r.register_script(REQUEUE_SCRIPT)
+        self._in_flight = set()
+        self._in_flight_lock = threading.Lock()
+        self._reap_candidates = set()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _lease_key(self, raw):
+        return f"{self.queue_name}:lease:{hashlib.sha1(raw.encode('utf-8')).hexdigest()}"
+
+    def start(self):
+        """Start the heartbeat/reaper thread"""
+        self._thread = threading.Thread(target=self._maintain, name="queue-lease", daemon=True)
+        self._thread.start()
+        logging.info(f"Reliable queue consumer {self.worker_id} on {self.queue_name}")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def pop(self, timeout=5):
+        """Block for the next job and lease it to this worker; None on timeout"""
+        raw = self.r.blmove(self.queue_name, self.processing_list, timeout, "RIGHT", "LEFT")
+        if raw is None:
+            return None
+
+        self.r.set(self._lease_key(raw), self.worker_id, ex=self.lease_seconds)
+        with self._in_flight_lock:
+            self._in_flight.add(raw)
+        return raw
+
+    def ack(self, raw):
+        """Drop a finished job (done or error) from the processing list"""
+        with self._in_flight_lock:
+            self._in_flight.discard(raw)
+        pipe = self.r.pipeline()
+        pipe.lrem(self.processing_list, 1, raw)
+        pipe.delete(self._lease_key(raw))
+        pipe.execute()
+
+    def requeue(self, raw):
+        """Hand a job back to the queue so it is the next one delivered"""
+        with self._in_flight_lock:
+            self._in_flight.discard(raw)
+        self._requeue(keys=[self.processing_list, self.queue_name], args=[raw])
+        self.r.delete(self._lease_key(raw))
+
+    def _maintain(self):
+        last_reap = 0
+        while not self._stop.wait(self.heartbeat_seconds):
+            try:
+                self._heartbeat()
+                if time.time() - last_reap >= self.reap_seconds:
+                    self._reap()
+                    last_reap = time.time()
+            except Exception:
+                logging.exception("Error maintaining queue leases; will retry.")
+
+    def _heartbeat(self):
+        with self._in_flight_lock:
+            in_flight = list(self._in_flight)
+        for raw in in_flight:
+            self.r.set(self._lease_key(raw), self.worker_id, ex=self.lease_seconds)
+
+    def _reap(self):
+        """
+        Requeue items in any processing list whose lease has expired
+
+        An item must be seen without a lease on two consecutive passes, which
+        covers the short window between BLMOVE and the lease being written.
+        """
+        candidates = set()
+        for processing_list in self.r.scan_iter(match=f"{self.queue_name}:processing:*"):
+            for raw in self.r.lrange(processing_list, 0, -1):
+                if self.r.exists(self._lease_key(raw)):
+                    continue
+                candidate = (processing_list, raw)
+                if candidate in self._reap_candidates:
+                    if self._requeue(keys=[processing_list, self.queue_name], args=[raw]):
+                        logging.warning(f"Lease expired in {processing_list}; requeued job {raw}")
+                else:
+                    candidates.add(candidate)
+        self._reap_candidates = candidates
@@ -0,0 +1,50 @@
+import os
+import shutil
+import logging
+import tempfile
+from pathlib import Path
+
+class ScratchDir:
+    """
+    Private directory for one job's intermediate files
+
+    Created under root, which can be a RAM-backed tmpfs mount (e.g. /dev/shm)
+    to keep intermediate files off disk, or under the system temp directory
+    if root is empty or unusable. Used as a context manager; the directory
+    and everything in it is removed on exit however the job ends, after
+    logging how much space the job's files took.
+    """
+
+    def __init__(self, job_id, root=None):
+        self.job_id = job_id
+        self.root = root
+        self.path = None
+
+    def __enter__(self):
+        root = None
+        if self.root:
+            try:
+                Path(self.root).mkdir(parents=True, exist_ok=True)
+                root = self.root
+            except OSError as e:
+                logging.warning(f"Scratch root {self.root} is unusable, using the temp directory: {e}")
+        self.path = Path(tempfile.mkdtemp(prefix=f"job_{self.job_id}_", dir=root))
+        return self
+
+    def __exit__(self, *exc):
+        try:
+            used = self.usage()
+            logging.info(f"Job {self.job_id} used {used / 1e6:.1f} MB of scratch space in {self.path}")
+        finally:
+            shutil.rmtree(self.path, ignore_errors=True)
+
+    def usage(self):
+        """Bytes currently held by files in the directory"""
+        total = 0
+        for dirpath, _, filenames in os.walk(self.path):
+            for filename in filenames:
+                try:
+                    total += os.lstat(os.path.join(dirpath, filename)).st_size
+                except OSError:
+                    pass  # removed while walking
+        return total
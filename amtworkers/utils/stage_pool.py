@@ -0,0 +1,52 @@
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+class StagePool:
+    """
+    Process pool for the post-transcription stages (XML, PDF, audio)
+
+    Created at worker startup, before any models are loaded or job threads
+    are running, so forked children stay small. It is never rebuilt, since
+    forking again later would copy a multithreaded, model-heavy process. If
+    a child dies (e.g. OOM) the pool is broken and every submit raises
+    BrokenProcessPool; the worker then hands its jobs back to the queue,
+    stops taking new ones and exits so its container is restarted with a
+    fresh pool.
+    initializer(*initargs) runs once in every child to set up state the
+    stages reuse across jobs.
+    """
+
+    def __init__(self, max_workers, initializer=None, initargs=()):
+        self.max_workers = max_workers
+        self._pool = ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=multiprocessing.get_context("fork"),
+            initializer=initializer,
+            initargs=initargs,
+        )
+        # Start the children now rather than on first use from a job thread
+        for future in [self._pool.submit(int) for _ in range(max_workers)]:
+            future.result()
+        logging.info(f"Stage pool started with {max_workers} processes")
+
+    @property
+    def broken(self):
+        """
+        Whether one of the pool's own children died. Read off the executor,
+        which flags itself before failing its pending futures; a task can
+        also fail with BrokenProcessPool from a pool of its own (the audio
+        segment renderer), which says nothing about this one.
+        """
+        return bool(self._pool._broken)
+
+    def submit(self, fn, *args, **kwargs):
+        try:
+            return self._pool.submit(fn, *args, **kwargs)
+        except BrokenProcessPool:
+            logging.error("The stage pool is broken; the worker will exit")
+            raise
+
+    def shutdown(self):
+        self._pool.shutdown(wait=True)
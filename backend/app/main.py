@@ -4,7 +4,7 @@ import os
 from pathlib import Path
 import time
 from fastapi import FastAPI, UploadFile, File, BackgroundTasks, HTTPException, Form
-from app.routers import uploadUrl, createJob, getUserJobs, createSheetMusic, createCheckoutSession, webhooks, getDashboardMetrics, updateProfile, deleteJob, updateJob, updateSubscription  # , transcription, midi_ops
+from app.routers import uploadUrl, createJob, getUserJobs, createSheetMusic, createCheckoutSession, webhooks, getDashboardMetrics, updateProfile, deleteJob, updateJob, updateSubscription, getResultCacheMetrics  # , transcription, midi_ops
 from fastapi.middleware.cors import CORSMiddleware
 from app.config_loader import Config
 
@@ -44,6 +44,7 @@ app.include_router(createSheetMusic.router, prefix="", tags=["createSheetMusic"]
 app.include_router(createCheckoutSession.router, prefix="", tags=["createCheckoutSession"])
 app.include_router(webhooks.router, prefix="", tags=["webhooks"])
 app.include_router(getDashboardMetrics.router, prefix="", tags=["getDashboardMetrics"])
+app.include_router(getResultCacheMetrics.router, prefix="", tags=["getResultCacheMetrics"])
 app.include_router(updateProfile.router, prefix="", tags=["updateProfile"])
 app.include_router(deleteJob.router, prefix="", tags=["deleteJob"])
 app.include_router(updateJob.router, prefix="", tags=["updateJob"])
@@ -419,4 +419,58 @@ def count_model_usage_since_date(
         "start_date": start_date
     })
     
-    return result.scalar()
\ No newline at end of file
+    return result.scalar()
+
+# ========================================
+# Functions for the result cache
+# ========================================
+
+def delete_result_cache_entries(db: Session, job_id: str) -> int:
+    """
+    Evict result cache entries that point at a job's artifacts.
+    Called when a job is deleted, since its artifacts are no longer retained.
+    
+    Args:
+        db: Database session
+        job_id: Job ID whose cache entries should be removed
+    
+    Returns:
+        Number of entries removed
+    """
+    from sqlalchemy import text
+    
+    logger.info(f"Evicting result cache entries for job {job_id}")
+    
+    sql = text("DELETE FROM result_cache WHERE job_id = :job_id")
+    result = db.execute(sql, {"job_id": job_id})
+    return result.rowcount
+
+
+def get_result_cache_stats_since_date(db: Session, start_date) -> List[Dict[str, Any]]:
+    """
+    Count finished jobs and result cache hits per model since a given date.
+    
+    Args:
+        db: Database session
+        start_date: Start date for the count
+    
+    Returns:
+        List of dicts with model, total and hits
+    """
+    from sqlalchemy import text
+    
+    logger.info(f"Counting result cache hits since {start_date}")
+    
+    sql = text("""
+        SELECT model, COUNT(*) AS total, COUNT(*) FILTER (WHERE cache_hit) AS hits
+        FROM jobs
+        WHERE status = 'done'
+        AND finished_at >= :start_date
+        GROUP BY model
+    """)
+    
+    result = db.execute(sql, {"start_date": start_date})
+    return [
+        {"model": row.model, "total": row.total, "hits": row.hits}
+        for row in result.fetchall()
+    ]
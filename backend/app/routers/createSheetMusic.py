@@ -1,5 +1,5 @@
 import uuid
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Header, Query
 from fastapi.responses import FileResponse
 from pydantic import BaseModel
 import boto3
@@ -7,7 +7,7 @@ from botocore.exceptions import ClientError
 from pathlib import Path
 from sqlalchemy import text
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 import subprocess
 import os
 import logging
@@ -140,33 +140,42 @@ async def get_midi_endpoint(
 @router.get("/getAudio/{job_id}")
 async def get_audio_endpoint(
     job_id: str,
+    audio_format: Optional[str] = Query(None, alias="format"),
+    accept: Optional[str] = Header(None),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Download processed audio file for a completed transcription job."""
+    """
+    Download processed audio file for a completed transcription job.
+    
+    The rendition (mp3, m4a or opus) is picked from ?format= or, failing
+    that, from the Accept header; MP3 by default.
+    """
     try:
         from fastapi.responses import Response
         from app.services import sheet_music_service
         import json
         
         # Call service layer
-        audio_content, audio_metadata = sheet_music_service.get_audio_file(
+        audio_content, audio_metadata, served_format = sheet_music_service.get_audio_file(
             job_id=job_id,
             user_id=current_user.id,
             db=db,
             s3_client=s3_client,
-            aws_creds=aws_creds
+            aws_creds=aws_creds,
+            audio_format=sheet_music_service.choose_audio_format(audio_format, accept)
         )
         
         # Return audio with metadata in headers
         headers = {
-            'Content-Disposition': f'attachment; filename="{job_id}.mp3"',
-            'X-Audio-Metadata': json.dumps(audio_metadata) if audio_metadata else '{}'
+            'Content-Disposition': f'attachment; filename="{job_id}.{served_format}"',
+            'X-Audio-Metadata': json.dumps(audio_metadata) if audio_metadata else '{}',
+            'Vary': 'Accept'
         }
         
         return Response(
             content=audio_content,
-            media_type='audio/wav',
+            media_type=sheet_music_service.AUDIO_FORMATS[served_format],
             headers=headers,
         )
         
@@ -181,7 +190,195 @@ async def get_audio_endpoint(
     except Exception as e:
         logger.exception(f"Error in get_audio_endpoint: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/getAudioManifest/{job_id}")
+async def get_audio_manifest_endpoint(
+    job_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Get the measure-aligned chunk manifest for a completed job's audio."""
+    try:
+        from app.services import sheet_music_service
+        
+        # Call service layer
+        return sheet_music_service.get_audio_manifest(
+            job_id=job_id,
+            user_id=current_user.id,
+            db=db,
+            s3_client=s3_client,
+            aws_creds=aws_creds
+        )
+        
+    except PermissionError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    except Exception as e:
+        logger.exception(f"Error in get_audio_manifest_endpoint: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/getAudioChunk/{job_id}/{index}")
+async def get_audio_chunk_endpoint(
+    job_id: str,
+    index: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Download one measure-aligned MP3 chunk of a completed job's audio."""
+    try:
+        from fastapi.responses import Response
+        from app.services import sheet_music_service
+        
+        # Call service layer
+        chunk_content = sheet_music_service.get_audio_chunk(
+            job_id=job_id,
+            index=index,
+            user_id=current_user.id,
+            db=db,
+            s3_client=s3_client,
+            aws_creds=aws_creds
+        )
+        
+        return Response(
+            content=chunk_content,
+            media_type='audio/mpeg',
+            headers={
+                'Content-Disposition': f'inline; filename="{job_id}_{index:04d}.mp3"'
+            }
+        )
+        
+    except PermissionError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    except Exception as e:
+        logger.exception(f"Error in get_audio_chunk_endpoint: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/getAudioPeaks/{job_id}")
+async def get_audio_peaks_endpoint(
+    job_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Download precomputed waveform peaks for a completed transcription job."""
+    try:
+        from fastapi.responses import Response
+        from app.services import sheet_music_service
+        
+        # Call service layer
+        peaks_content = sheet_music_service.get_audio_peaks(
+            job_id=job_id,
+            user_id=current_user.id,
+            db=db,
+            s3_client=s3_client,
+            aws_creds=aws_creds
+        )
+        
+        return Response(
+            content=peaks_content,
+            media_type='application/octet-stream',
+            headers={
+                'Content-Disposition': f'attachment; filename="{job_id}.peaks"'
+            }
+        )
+        
+    except PermissionError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    except Exception as e:
+        logger.exception(f"Error in get_audio_peaks_endpoint: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
     
+@router.get("/getScoreManifest/{job_id}")
+async def get_score_manifest_endpoint(
+    job_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Get the page manifest (per-page SVGs and thumbnails) for a completed job's score."""
+    try:
+        from app.services import sheet_music_service
+        
+        # Call service layer
+        return sheet_music_service.get_score_manifest(
+            job_id=job_id,
+            user_id=current_user.id,
+            db=db,
+            s3_client=s3_client,
+            aws_creds=aws_creds
+        )
+        
+    except PermissionError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    except Exception as e:
+        logger.exception(f"Error in get_score_manifest_endpoint: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/getScorePage/{job_id}/{page}")
+async def get_score_page_endpoint(
+    job_id: str,
+    page: int,
+    page_format: str = Query("svg", alias="format"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Download one page of a completed job's score as SVG, or its PNG thumbnail with ?format=png."""
+    try:
+        from fastapi.responses import Response
+        from app.services import sheet_music_service
+        
+        # Call service layer
+        page_content, media_type = sheet_music_service.get_score_page(
+            job_id=job_id,
+            page=page,
+            user_id=current_user.id,
+            db=db,
+            s3_client=s3_client,
+            aws_creds=aws_creds,
+            page_format=page_format
+        )
+        
+        return Response(
+            content=page_content,
+            media_type=media_type,
+            headers={
+                'Content-Disposition': f'inline; filename="{job_id}_{page:03d}.{page_format}"'
+            }
+        )
+        
+    except PermissionError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    except Exception as e:
+        logger.exception(f"Error in get_score_page_endpoint: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.get("/getPDF/{job_id}")
 async def get_pdf_endpoint(
     job_id: str,
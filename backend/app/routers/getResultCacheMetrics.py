@@ -0,0 +1,29 @@
+from fastapi import APIRouter, HTTPException, Depends, Query
+from sqlalchemy.orm import Session
+from app.config_loader import Config
+from app.auth import get_current_user
+from app.schemas.user import User
+from app.schemas.getResultCacheMetrics import ResultCacheMetrics
+from app.database import get_db
+from app.services import analytics_service
+from app.repositories import job_repository
+
+router = APIRouter()
+
+@router.get("/getResultCacheMetrics", response_model=ResultCacheMetrics)
+async def get_result_cache_metrics(
+    days: int = Query(30, ge=1, le=365),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Result cache hit rates across all users over the last `days` days (admins only)"""
+    if current_user.email.lower() not in Config.ADMIN_EMAILS:
+        raise HTTPException(status_code=403, detail="Not allowed to view service metrics")
+
+    result = analytics_service.get_result_cache_metrics(
+        db=db,
+        job_repository=job_repository,
+        days=days
+    )
+    
+    return ResultCacheMetrics(**result)
\ No newline at end of file
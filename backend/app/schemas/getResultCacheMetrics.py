@@ -0,0 +1,13 @@
+from pydantic import BaseModel
+from typing import Dict
+
+class ModelCacheMetrics(BaseModel):
+    hits: int
+    total: int
+    hit_rate: float
+
+class ResultCacheMetrics(BaseModel):
+    hits: int
+    total: int
+    hit_rate: float
+    by_model: Dict[str, ModelCacheMetrics]
\ No newline at end of file
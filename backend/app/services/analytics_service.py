@@ -2,7 +2,7 @@
 Analytics Service - Handles metrics and analytics calculations.
 
 Functions for dashboard metrics, usage statistics, and reporting.
-Serves routers: getDashboardMetrics
+Serves routers: getDashboardMetrics, getResultCacheMetrics
 """
 
 from typing import Dict, Any, Optional, List
@@ -78,3 +78,50 @@ def get_dashboard_metrics(
         "transcriptions_left": transcriptions_left  # None means unlimited
         # "picogen_usage_count": picogen_usage_count
     }
+
+
+def get_result_cache_metrics(
+    db,
+    job_repository,
+    days: int = 30
+) -> Dict[str, Any]:
+    """
+    Get result cache hit rates over the last few days.
+    
+    A hit is a job that was finished by copying the artifacts of an earlier
+    job with the same source audio, model and level.
+    
+    Args:
+        db: Database session
+        job_repository: Repository for job data
+        days: Size of the window in days
+    
+    Returns:
+        Dict containing:
+        - hits: Jobs served from the cache
+        - total: Finished jobs
+        - hit_rate: hits / total (0.0 when there are no jobs)
+        - by_model: The same counts per model
+    """
+    logger.info(f"Calculating result cache metrics for the last {days} days")
+    
+    start_date = datetime.now() - timedelta(days=days)
+    stats = job_repository.get_result_cache_stats_since_date(db, start_date)
+    
+    by_model = {
+        row["model"]: {
+            "hits": row["hits"],
+            "total": row["total"],
+            "hit_rate": row["hits"] / row["total"] if row["total"] else 0.0
+        }
+        for row in stats
+    }
+    hits = sum(row["hits"] for row in stats)
+    total = sum(row["total"] for row in stats)
+    
+    return {
+        "hits": hits,
+        "total": total,
+        "hit_rate": hits / total if total else 0.0,
+        "by_model": by_model
+    }
@@ -110,7 +110,8 @@ def delete_job(job_id: str, user_id: str, db) -> Dict[str, Any]:
     
     Business logic:
     1. Verify ownership and delete job (atomic operation in repository)
-    2. Return success message
+    2. Evict result cache entries pointing at the job's artifacts
+    3. Return success message
     
     Args:
         job_id: ID of the job to delete
@@ -133,6 +134,10 @@ def delete_job(job_id: str, user_id: str, db) -> Dict[str, Any]:
     if not deleted_job_id:
         raise PermissionError("Job not found or access denied")
     
+    # Deleted jobs don't keep their artifacts, so identical uploads can no
+    # longer be served from them
+    job_repository.delete_result_cache_entries(db, deleted_job_id)
+    
     return {
         "message": "Job successfully deleted",
         "jobId": deleted_job_id
@@ -132,15 +132,83 @@ def get_midi_file(job_id: str, user_id: str, db, s3_client, aws_creds) -> bytes:
             raise RuntimeError(f"S3 download failed: {str(e)}")
 
 
-def get_audio_file(job_id: str, user_id: str, db, s3_client, aws_creds) -> tuple[bytes, dict]:
+# Audio renditions the workers produce, by file extension, with their media
+# types. MP3 is the default and the only one older jobs have.
+AUDIO_FORMATS = {
+    'mp3': 'audio/mpeg',
+    'm4a': 'audio/mp4',
+    'opus': 'audio/ogg',
+}
+DEFAULT_AUDIO_FORMAT = 'mp3'
+
+# Media types a client may list in Accept, mapped to the rendition they select
+_ACCEPT_AUDIO_FORMATS = {
+    'audio/mpeg': 'mp3',
+    'audio/mp3': 'mp3',
+    'audio/mp4': 'm4a',
+    'audio/aac': 'm4a',
+    'audio/x-m4a': 'm4a',
+    'audio/ogg': 'opus',
+    'audio/opus': 'opus',
+}
+
+
+def choose_audio_format(requested_format: Optional[str], accept: Optional[str]) -> str:
+    """
+    Pick the audio rendition to serve.
+    
+    An explicit format (query parameter) wins. Otherwise the Accept header is
+    used: the supported media type with the highest q-value, ties going to
+    the one listed first. Anything else, including */*, gets the MP3.
+    
+    Args:
+        requested_format: Format asked for by name (mp3, m4a, opus), if any
+        accept: Value of the Accept header, if any
+    
+    Returns:
+        File extension of the rendition to serve
+    
+    Raises:
+        ValueError: Unknown format requested by name
+    """
+    if requested_format:
+        requested_format = requested_format.lower()
+        if requested_format not in AUDIO_FORMATS:
+            raise ValueError(
+                f"Unsupported audio format '{requested_format}'. Use one of: {', '.join(AUDIO_FORMATS)}"
+            )
+        return requested_format
+    
+    best_format, best_quality = DEFAULT_AUDIO_FORMAT, 0.0
+    for media_range in (accept or '').split(','):
+        media_type, *params = [part.strip() for part in media_range.split(';')]
+        audio_format = _ACCEPT_AUDIO_FORMATS.get(media_type.lower())
+        if not audio_format:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality > best_quality:
+            best_format, best_quality = audio_format, quality
+    return best_format
+
+
+def get_audio_file(job_id: str, user_id: str, db, s3_client, aws_creds,
+                   audio_format: str = DEFAULT_AUDIO_FORMAT) -> tuple[bytes, dict, str]:
     """
     Download processed audio file for a completed job.
     
     Business logic:
     1. Check job exists and belongs to user
     2. Check job status is 'done'
-    3. Download audio file from S3
-    4. Return audio bytes and metadata
+    3. Download the requested rendition from S3, falling back to the MP3
+       for jobs processed before other renditions existed
+    4. Return audio bytes, metadata and the format served
     
     Args:
         job_id: Job ID
@@ -148,9 +216,10 @@ def get_audio_file(job_id: str, user_id: str, db, s3_client, aws_creds) -> tuple
         db: Database session
         s3_client: Boto3 S3 client
         aws_creds: AWS credentials dict
+        audio_format: Rendition to serve (see AUDIO_FORMATS)
     
     Returns:
-        Tuple of (audio_bytes, audio_metadata)
+        Tuple of (audio_bytes, audio_metadata, audio_format)
     
     Raises:
         PermissionError: Job not found or access denied
@@ -175,22 +244,310 @@ def get_audio_file(job_id: str, user_id: str, db, s3_client, aws_creds) -> tuple
         raise ValueError(f"Job not completed. Current status: {status}")
     
     # 2. Download from S3
-    s3_key = f"processed_audio/{job_id}.mp3"
+    s3_key = f"processed_audio/{job_id}.{audio_format}"
     
     try:
         response = s3_client.get_object(
             Bucket=aws_creds["s3_bucket"],
             Key=s3_key
         )
-        return response['Body'].read(), audio_metadata
+        return response['Body'].read(), audio_metadata, audio_format
     except ClientError as e:
         if e.response['Error']['Code'] == 'NoSuchKey':
+            if audio_format != DEFAULT_AUDIO_FORMAT:
+                logger.info(f"No {audio_format} rendition for job {job_id}; serving {DEFAULT_AUDIO_FORMAT}")
+                return get_audio_file(job_id, user_id, db, s3_client, aws_creds, DEFAULT_AUDIO_FORMAT)
             logger.error(f"Audio file not found in S3: {s3_key}")
             raise FileNotFoundError("Audio file not found in S3")
         else:
             logger.error(f"S3 download failed: {str(e)}")
             raise RuntimeError(f"S3 download failed: {str(e)}")
 
+def get_audio_manifest(job_id: str, user_id: str, db, s3_client, aws_creds) -> dict:
+    """
+    Download the manifest of a completed job's chunked audio.
+    
+    The manifest lists MP3 chunks cut on bar lines, each with its start and
+    end time and the measures it holds, so a player can start any measure
+    after fetching only the chunk that contains it.
+    
+    Args:
+        job_id: Job ID
+        user_id: User ID for permission check
+        db: Database session
+        s3_client: Boto3 S3 client
+        aws_creds: AWS credentials dict
+    
+    Returns:
+        Manifest dict
+    
+    Raises:
+        PermissionError: Job not found or access denied
+        ValueError: Job not completed
+        FileNotFoundError: Manifest not found in S3 (job predates chunked audio)
+        RuntimeError: S3 download failed
+    """
+    from app.repositories import job_repository
+    from botocore.exceptions import ClientError
+    import json
+    
+    logger.info(f"Getting audio manifest for job {job_id}, user {user_id}")
+    
+    # 1. Check job status
+    status = job_repository.get_job_status_for_user(db, job_id, user_id)
+    
+    if not status:
+        raise PermissionError("Job not found or access denied")
+    
+    if status != 'done':
+        raise ValueError(f"Job not completed. Current status: {status}")
+    
+    # 2. Download from S3
+    s3_key = f"processed_audio/{job_id}/manifest.json"
+    
+    try:
+        response = s3_client.get_object(
+            Bucket=aws_creds["s3_bucket"],
+            Key=s3_key
+        )
+        return json.loads(response['Body'].read())
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'NoSuchKey':
+            logger.error(f"Audio manifest not found in S3: {s3_key}")
+            raise FileNotFoundError("Audio manifest not found in S3")
+        else:
+            logger.error(f"S3 download failed: {str(e)}")
+            raise RuntimeError(f"S3 download failed: {str(e)}")
+
+
+def get_audio_chunk(job_id: str, index: int, user_id: str, db, s3_client, aws_creds) -> bytes:
+    """
+    Download one chunk of a completed job's chunked audio.
+    
+    Args:
+        job_id: Job ID
+        index: Chunk index, as listed in the manifest
+        user_id: User ID for permission check
+        db: Database session
+        s3_client: Boto3 S3 client
+        aws_creds: AWS credentials dict
+    
+    Returns:
+        MP3 chunk bytes
+    
+    Raises:
+        PermissionError: Job not found or access denied
+        ValueError: Job not completed or invalid chunk index
+        FileNotFoundError: Chunk not found in S3
+        RuntimeError: S3 download failed
+    """
+    from app.repositories import job_repository
+    from botocore.exceptions import ClientError
+    
+    if index < 0:
+        raise ValueError("Chunk index must not be negative")
+    
+    # 1. Check job status
+    status = job_repository.get_job_status_for_user(db, job_id, user_id)
+    
+    if not status:
+        raise PermissionError("Job not found or access denied")
+    
+    if status != 'done':
+        raise ValueError(f"Job not completed. Current status: {status}")
+    
+    # 2. Download from S3
+    s3_key = f"processed_audio/{job_id}/chunk_{index:04d}.mp3"
+    
+    try:
+        response = s3_client.get_object(
+            Bucket=aws_creds["s3_bucket"],
+            Key=s3_key
+        )
+        return response['Body'].read()
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'NoSuchKey':
+            logger.error(f"Audio chunk not found in S3: {s3_key}")
+            raise FileNotFoundError("Audio chunk not found in S3")
+        else:
+            logger.error(f"S3 download failed: {str(e)}")
+            raise RuntimeError(f"S3 download failed: {str(e)}")
+
+def get_audio_peaks(job_id: str, user_id: str, db, s3_client, aws_creds) -> bytes:
+    """
+    Download precomputed waveform peaks for a completed job.
+    
+    The file holds min/max peak pairs at several zoom levels (256, 1024 and
+    4096 samples per pixel); see waveformPeaks.py in the workers for the
+    layout.
+    
+    Args:
+        job_id: Job ID
+        user_id: User ID for permission check
+        db: Database session
+        s3_client: Boto3 S3 client
+        aws_creds: AWS credentials dict
+    
+    Returns:
+        Peaks file bytes
+    
+    Raises:
+        PermissionError: Job not found or access denied
+        ValueError: Job not completed
+        FileNotFoundError: Peaks not found in S3 (job predates peaks)
+        RuntimeError: S3 download failed
+    """
+    from app.repositories import job_repository
+    from botocore.exceptions import ClientError
+    
+    logger.info(f"Getting waveform peaks for job {job_id}, user {user_id}")
+    
+    # 1. Check job status
+    status = job_repository.get_job_status_for_user(db, job_id, user_id)
+    
+    if not status:
+        raise PermissionError("Job not found or access denied")
+    
+    if status != 'done':
+        raise ValueError(f"Job not completed. Current status: {status}")
+    
+    # 2. Download from S3
+    s3_key = f"processed_audio/{job_id}.peaks"
+    
+    try:
+        response = s3_client.get_object(
+            Bucket=aws_creds["s3_bucket"],
+            Key=s3_key
+        )
+        return response['Body'].read()
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'NoSuchKey':
+            logger.error(f"Waveform peaks not found in S3: {s3_key}")
+            raise FileNotFoundError("Waveform peaks not found in S3")
+        else:
+            logger.error(f"S3 download failed: {str(e)}")
+            raise RuntimeError(f"S3 download failed: {str(e)}")
+
+# Per-page images of the score, keyed by the format name used in the API
+SCORE_PAGE_FORMATS = {
+    'svg': ('page', 'svg', 'image/svg+xml'),
+    'png': ('thumb', 'png', 'image/png'),
+}
+
+def get_score_manifest(job_id: str, user_id: str, db, s3_client, aws_creds) -> dict:
+    """
+    Download the page manifest of a completed job's score.
+    
+    The manifest lists every page of the engraved score with its SVG and
+    low-resolution PNG thumbnail, so a viewer can show page 1 as soon as it
+    arrives and load the rest lazily.
+    
+    Args:
+        job_id: Job ID
+        user_id: User ID for permission check
+        db: Database session
+        s3_client: Boto3 S3 client
+        aws_creds: AWS credentials dict
+    
+    Returns:
+        Manifest dict
+    
+    Raises:
+        PermissionError: Job not found or access denied
+        ValueError: Job not completed
+        FileNotFoundError: Manifest not found in S3 (job predates score pages)
+        RuntimeError: S3 download failed
+    """
+    from app.repositories import job_repository
+    from botocore.exceptions import ClientError
+    import json
+    
+    logger.info(f"Getting score page manifest for job {job_id}, user {user_id}")
+    
+    # 1. Check job status
+    status = job_repository.get_job_status_for_user(db, job_id, user_id)
+    
+    if not status:
+        raise PermissionError("Job not found or access denied")
+    
+    if status != 'done':
+        raise ValueError(f"Job not completed. Current status: {status}")
+    
+    # 2. Download from S3
+    s3_key = f"pdf/{job_id}/manifest.json"
+    
+    try:
+        response = s3_client.get_object(
+            Bucket=aws_creds["s3_bucket"],
+            Key=s3_key
+        )
+        return json.loads(response['Body'].read())
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'NoSuchKey':
+            logger.error(f"Score page manifest not found in S3: {s3_key}")
+            raise FileNotFoundError("Score page manifest not found in S3")
+        else:
+            logger.error(f"S3 download failed: {str(e)}")
+            raise RuntimeError(f"S3 download failed: {str(e)}")
+
+def get_score_page(job_id: str, page: int, user_id: str, db, s3_client, aws_creds,
+                   page_format: str = 'svg') -> tuple[bytes, str]:
+    """
+    Download one page of a completed job's score as SVG or PNG thumbnail.
+    
+    Args:
+        job_id: Job ID
+        page: Page number (1-based), as listed in the manifest
+        user_id: User ID for permission check
+        db: Database session
+        s3_client: Boto3 S3 client
+        aws_creds: AWS credentials dict
+        page_format: 'svg' for the full page, 'png' for its thumbnail
+    
+    Returns:
+        Tuple of (page bytes, media type)
+    
+    Raises:
+        PermissionError: Job not found or access denied
+        ValueError: Job not completed, invalid page number or format
+        FileNotFoundError: Page not found in S3
+        RuntimeError: S3 download failed
+    """
+    from app.repositories import job_repository
+    from botocore.exceptions import ClientError
+    
+    if page < 1:
+        raise ValueError("Page numbers start at 1")
+    if page_format not in SCORE_PAGE_FORMATS:
+        raise ValueError(f"Unsupported page format: {page_format}")
+    
+    # 1. Check job status
+    status = job_repository.get_job_status_for_user(db, job_id, user_id)
+    
+    if not status:
+        raise PermissionError("Job not found or access denied")
+    
+    if status != 'done':
+        raise ValueError(f"Job not completed. Current status: {status}")
+    
+    # 2. Download from S3
+    prefix, extension, media_type = SCORE_PAGE_FORMATS[page_format]
+    s3_key = f"pdf/{job_id}/{prefix}_{page:03d}.{extension}"
+    
+    try:
+        response = s3_client.get_object(
+            Bucket=aws_creds["s3_bucket"],
+            Key=s3_key
+        )
+        return response['Body'].read(), media_type
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'NoSuchKey':
+            logger.error(f"Score page not found in S3: {s3_key}")
+            raise FileNotFoundError("Score page not found in S3")
+        else:
+            logger.error(f"S3 download failed: {str(e)}")
+            raise RuntimeError(f"S3 download failed: {str(e)}")
+
 def get_pdf_file(job_id: str, user_id: str, db, s3_client, aws_creds) -> bytes:
     """
     Download PDF file for a completed job.
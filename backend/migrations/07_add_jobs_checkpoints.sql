@@ -0,0 +1,4 @@
+-- Per-stage artifact checkpoints written by the workers so a redelivered
+-- job can skip stages whose outputs already exist.
+-- Shape: {"<stage>": {"key": "<storage key>", "sha256": "<hex>", "params": {...}}}
+ALTER TABLE public.jobs ADD COLUMN checkpoints jsonb;
@@ -0,0 +1,26 @@
+-- Content-addressed result cache (depends on jobs)
+-- One entry per (source audio hash, model, level), pointing at the most recent
+-- job whose artifacts can be copied to satisfy an identical upload.
+CREATE TABLE public.result_cache (
+  source_sha256 text NOT NULL,
+  model text NOT NULL,
+  level integer NOT NULL DEFAULT 0,
+  job_id uuid NOT NULL,
+  result_key text NOT NULL,
+  xml_key text NOT NULL,
+  pdf_key text NOT NULL,
+  audio_key text NOT NULL,
+  audio_metadata jsonb,
+  hit_count integer NOT NULL DEFAULT 0,
+  created_at timestamp with time zone NOT NULL DEFAULT now(),
+  last_used_at timestamp with time zone NOT NULL DEFAULT now(),
+  CONSTRAINT result_cache_pkey PRIMARY KEY (source_sha256, model, level),
+  CONSTRAINT result_cache_job_id_fkey FOREIGN KEY (job_id) REFERENCES public.jobs(job_id) ON DELETE CASCADE
+);
+
+CREATE INDEX idx_result_cache_job_id ON public.result_cache(job_id);
+CREATE INDEX idx_result_cache_last_used_at ON public.result_cache(last_used_at);
+
+-- Per-job cache bookkeeping, used for hit-rate metrics
+ALTER TABLE public.jobs ADD COLUMN source_sha256 text;
+ALTER TABLE public.jobs ADD COLUMN cache_hit boolean NOT NULL DEFAULT false;
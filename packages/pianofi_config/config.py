@@ -185,6 +185,84 @@ def get_stripe_keys() -> str:
     except Exception as e:
         raise Exception(f"Failed to get Stripe keys from Parameter Store: {e}")
 
+@lru_cache()
+def get_worker_concurrency() -> int:
+    """Get number of concurrent job slots per worker process"""
+    try:
+        return max(1, int(os.getenv("WORKER_CONCURRENCY", "1")))
+    except ValueError:
+        return 1
+
+@lru_cache()
+def get_reliable_queue() -> str:
+    """Get whether workers consume jobs with leases and acks (true, false)"""
+    return os.getenv("RELIABLE_QUEUE", "false")
+
+@lru_cache()
+def get_result_cache() -> str:
+    """Get whether workers reuse results for identical uploads (true, false)"""
+    return os.getenv("RESULT_CACHE", "true")
+
+@lru_cache()
+def get_result_cache_retention_days() -> int:
+    """Get how many days an unused result cache entry is kept"""
+    try:
+        return max(1, int(os.getenv("RESULT_CACHE_RETENTION_DAYS", "30")))
+    except ValueError:
+        return 30
+
+@lru_cache()
+def get_soundfont_path() -> str:
+    """Get the soundfont workers render audio with (empty to search the default locations)"""
+    return os.getenv("SOUNDFONT_PATH", "")
+
+@lru_cache()
+def get_audio_render_segments() -> int:
+    """Get how many processes a long piece's audio is rendered in (1 renders it in one piece)"""
+    try:
+        return max(1, int(os.getenv("AUDIO_RENDER_SEGMENTS", "1")))
+    except ValueError:
+        return 1
+
+@lru_cache()
+def get_lilypond_processes() -> int:
+    """Get how many LilyPond processes a worker runs at once"""
+    try:
+        return max(1, int(os.getenv("LILYPOND_PROCESSES", "2")))
+    except ValueError:
+        return 2
+
+@lru_cache()
+def get_lilypond_batch_window() -> float:
+    """Get how many seconds a score waits for others to share its LilyPond run"""
+    try:
+        return max(0.0, float(os.getenv("LILYPOND_BATCH_WINDOW", "0.5")))
+    except ValueError:
+        return 0.5
+
+@lru_cache()
+def get_lilypond_batch_size() -> int:
+    """Get the most scores engraved by one LilyPond run"""
+    try:
+        return max(1, int(os.getenv("LILYPOND_BATCH_SIZE", "8")))
+    except ValueError:
+        return 8
+
+@lru_cache()
+def get_scratch_dir() -> str:
+    """Get where workers keep per-job intermediate files, e.g. a tmpfs like /dev/shm (empty for the temp directory)"""
+    return os.getenv("SCRATCH_DIR", "")
+
+@lru_cache()
+def get_musicxml_compact() -> str:
+    """Get whether scores use multi-measure rests and measure repeats (true, false)"""
+    return os.getenv("MUSICXML_COMPACT", "false")
+
+@lru_cache()
+def get_admin_emails() -> list:
+    """Get the emails of users allowed to see service-wide metrics (comma separated)"""
+    return [email.strip().lower() for email in os.getenv("ADMIN_EMAILS", "").split(",") if email.strip()]
+
 # Configuration class for easy access
 class Config:
     DATABASE_URL = get_database_url()
@@ -195,4 +273,16 @@ class Config:
     SUPABASE_CONFIG = get_supabase_config()
     BACKEND_BASE_URL = get_backend_base_url()
     USE_LOCAL_STORAGE = get_storage()
-    STRIPE_KEYS = get_stripe_keys()
\ No newline at end of file
+    STRIPE_KEYS = get_stripe_keys()
+    WORKER_CONCURRENCY = get_worker_concurrency()
+    RELIABLE_QUEUE = get_reliable_queue()
+    RESULT_CACHE = get_result_cache()
+    RESULT_CACHE_RETENTION_DAYS = get_result_cache_retention_days()
+    SOUNDFONT_PATH = get_soundfont_path()
+    AUDIO_RENDER_SEGMENTS = get_audio_render_segments()
+    LILYPOND_PROCESSES = get_lilypond_processes()
+    LILYPOND_BATCH_WINDOW = get_lilypond_batch_window()
+    LILYPOND_BATCH_SIZE = get_lilypond_batch_size()
+    SCRATCH_DIR = get_scratch_dir()
+    MUSICXML_COMPACT = get_musicxml_compact()
+    ADMIN_EMAILS = get_admin_emails()
\ No newline at end of file
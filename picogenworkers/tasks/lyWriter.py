@@ -0,0 +1,224 @@
+import tempfile
+from fractions import Fraction
+
+LILYPOND_VERSION = "2.22.0"
+
+# Shortest note value a duration is spelled with; anything finer is scaled
+SHORTEST_NOTE = 128
+MAX_DOTS = 2
+
+CLEFS = {('G', '2'): 'treble', ('F', '4'): 'bass', ('C', '3'): 'alto'}
+# Major keys by number of fifths
+KEYS = ['ces', 'ges', 'des', 'aes', 'ees', 'bes', 'f', 'c', 'g', 'd', 'a', 'e', 'b', 'fis', 'cis']
+ALTERATIONS = {-2: 'eses', -1: 'es', 0: '', 1: 'is', 2: 'isis'}
+
+
+def _string(text):
+    """Quote text as a LilyPond string"""
+    return '"' + text.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def _pitch(pitch):
+    """LilyPond name of a MusicXML <pitch> in absolute octaves (c' is middle C)"""
+    alter = pitch.find('alter')
+    octave = int(pitch.find('octave').text) - 3
+    return (pitch.find('step').text.lower()
+            + ALTERATIONS[int(alter.text) if alter is not None else 0]
+            + ("'" * octave if octave > 0 else "," * -octave))
+
+
+def _durations(length):
+    """
+    Spell a length (in whole notes) as tied note values, longest first
+
+    Powers of two are taken greedily and merged into dotted values. A
+    remainder shorter than SHORTEST_NOTE (only possible with tick
+    resolutions that aren't a multiple of 32) is scaled onto the last value.
+    """
+    durations = []
+    remaining = length
+    value = 1
+    while remaining > 0 and value <= SHORTEST_NOTE:
+        if remaining >= Fraction(1, value):
+            remaining -= Fraction(1, value)
+            dots = 0
+            while dots < MAX_DOTS and remaining >= Fraction(1, value * 2 ** (dots + 1)):
+                dots += 1
+                remaining -= Fraction(1, value * 2 ** dots)
+            durations.append(f"{value}{'.' * dots}")
+        value *= 2
+
+    if remaining > 0:
+        if durations:
+            # Scale the last value up by what is left over
+            last = durations.pop()
+            value = int(last.rstrip('.'))
+            dots = len(last) - len(str(value))
+            base = Fraction(1, value) * (2 - Fraction(1, 2 ** dots))
+            scale = (base + remaining) / base
+        else:
+            last = str(SHORTEST_NOTE)
+            scale = remaining * SHORTEST_NOTE
+        durations.append(f"{last}*{scale.numerator}/{scale.denominator}")
+    return durations
+
+
+def _measure_length(length):
+    """A whole-measure length (in whole notes) as a duration multiplier of 1"""
+    if length == 1:
+        return "1"
+    return f"1*{length.numerator}" + (f"/{length.denominator}" if length.denominator != 1 else "")
+
+
+class LilyPondWriter:
+    """
+    Streams a two-staff score to a LilyPond (.ly) file one measure at a time
+
+    Takes the same treble/bass measure elements that MidiToMusicXML hands to
+    the MusicXML writer, so LilyPond can engrave the score without the
+    musicxml2ly round trip. Only what the generator produces is understood:
+    clef, key, time and tempo on the first measure, then notes, chords, rests
+    and single-level beams. Notes longer than one note value are tied.
+    Measures marked with a <multiple-rest> are written as one compressed
+    multi-measure rest, and measures inside a <measure-repeat> as percent
+    repeat signs.
+
+    Each staff is a sequential music expression, so the bass staff's
+    measures are spooled to a temporary file and copied in after the treble
+    staff when the writer is closed. Every measure ends with a bar check.
+    """
+
+    def __init__(self, fh, title=None):
+        self.fh = fh
+        self._bass = tempfile.TemporaryFile("w+", encoding="utf-8")
+        self._divisions = 1
+        # Per staff: measures still covered by a multi-measure rest, and
+        # whether a measure repeat is running
+        self._rest_measures = [0, 0]
+        self._repeating = [False, False]
+        self._finished = False
+
+        fh.write(f'\\version "{LILYPOND_VERSION}"\n\n')
+        fh.write(f'\\header {{\n  title = {_string(title if title else "Untitled")}\n}}\n\n')
+        fh.write('\\score {\n  <<\n    \\new Staff {\n')
+
+    def measure(self, treble, bass):
+        """Write the next pair of measures"""
+        # Divisions are set on the first measure; both staves share them
+        for measure in (treble, bass):
+            divisions = measure.find('attributes/divisions')
+            if divisions is not None:
+                self._divisions = int(divisions.text)
+
+        self.fh.write(self._staff_measure(treble, 0))
+        self._bass.write(self._staff_measure(bass, 1))
+
+    def _staff_measure(self, measure, staff):
+        """One measure of one staff as a line of LilyPond"""
+        if self._rest_measures[staff]:
+            # Already written as part of a multi-measure rest
+            self._rest_measures[staff] -= 1
+            return ""
+
+        items = []
+
+        attributes = measure.find('attributes')
+        if attributes is not None:
+            clef = attributes.find('clef')
+            if clef is not None:
+                items.append([f"\\clef {CLEFS.get((clef.findtext('sign'), clef.findtext('line')), 'treble')}"])
+            key = attributes.find('key/fifths')
+            if key is not None:
+                items.append([f"\\key {KEYS[int(key.text) + 7]} \\major"])
+            time = attributes.find('time')
+            if time is not None:
+                items.append([f"\\time {time.findtext('beats')}/{time.findtext('beat-type')}"])
+
+        for metronome in measure.iterfind('direction/direction-type/metronome'):
+            items.append([f"\\tempo 4 = {round(float(metronome.findtext('per-minute')))}"])
+
+        for repeat in measure.iterfind('attributes/measure-style/measure-repeat'):
+            self._repeating[staff] = repeat.get('type') == 'start'
+        multiple_rest = measure.findtext('attributes/measure-style/multiple-rest')
+
+        if multiple_rest or self._repeating[staff]:
+            length = Fraction(sum(int(note.findtext('duration')) for note in measure.iterfind('note')
+                                  if note.find('chord') is None), 4 * self._divisions)
+            if multiple_rest:
+                self._rest_measures[staff] = int(multiple_rest) - 1
+                items.append([f"\\compressMMRests R{_measure_length(length)}*{multiple_rest}"])
+            else:
+                items.append([f"\\makePercent s{_measure_length(length)}"])
+            return "      " + " ".join(pieces[0] for pieces in items) + " |\n"
+
+        # Manual beams: '[' after the first note of a group, ']' after its last
+        beam_first = None
+        beam_last = None
+
+        def close_beam():
+            nonlocal beam_first, beam_last
+            if beam_first is not None and beam_last is not beam_first:
+                beam_first[0] += "["
+                beam_last[-1] += "]"
+            beam_first = beam_last = None
+
+        notes = measure.findall('note')
+        index = 0
+        while index < len(notes):
+            note = notes[index]
+            # Following <chord/> notes sound with this one
+            chord = [note]
+            index += 1
+            while index < len(notes) and notes[index].find('chord') is not None:
+                chord.append(notes[index])
+                index += 1
+
+            length = Fraction(int(note.findtext('duration')), 4 * self._divisions)
+            durations = _durations(length)
+
+            if note.find('rest') is not None:
+                close_beam()
+                items.append([" ".join(f"r{duration}" for duration in durations)])
+                continue
+
+            pitches = [_pitch(n.find('pitch')) for n in chord]
+            name = pitches[0] if len(pitches) == 1 else f"<{' '.join(pitches)}>"
+            pieces = [f"{name}{duration}" for duration in durations]
+            items.append(pieces)
+
+            beam = note.findtext('beam')
+            if beam in ('begin', 'continue', 'end') and (beam != 'end' or beam_first is not None):
+                if beam_first is None:
+                    beam_first = pieces
+                beam_last = pieces
+            if beam not in ('begin', 'continue'):
+                close_beam()
+        close_beam()
+
+        # Values of one note are tied together
+        return "      " + " ".join(" ~ ".join(pieces) for pieces in items) + " |\n"
+
+    def finish(self):
+        """Copy in the bass staff and close the score"""
+        if self._finished:
+            return
+        self.fh.write('    }\n    \\new Staff {\n')
+        self._bass.seek(0)
+        chunk = self._bass.read(1024 * 1024)
+        while chunk:
+            self.fh.write(chunk)
+            chunk = self._bass.read(1024 * 1024)
+        self.fh.write('    }\n  >>\n  \\layout { }\n}\n')
+        self._finished = True
+
+    def close(self):
+        self._bass.close()
+        self.fh.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.finish()
+        self.close()
@@ -1,13 +1,75 @@
 import logging
 import os
-import struct
 import json
 from pathlib import Path
 import subprocess
-from midi2audio import FluidSynth
+import tempfile
+import shutil
+from bisect import bisect_right
+import numpy as np
+from picogenworkers.tasks.midiParser import parse_midi
+from picogenworkers.tasks.synthesizer import get_synthesizer, SAMPLE_RATE, CHANNELS
+from picogenworkers.tasks.segmentRender import render_segmented
+from picogenworkers.tasks.waveformPeaks import WaveformPeaks
 
 logging.basicConfig(level=logging.INFO)
 
+# Shortest piece of audio worth rendering in its own process
+MIN_SEGMENT_SECONDS = 20.0
+
+# Renditions encoded from the same PCM in one ffmpeg run, by file extension.
+# The MP3 comes first and stays the default download.
+AUDIO_RENDITIONS = {
+    'mp3': ['-c:a', 'libmp3lame', '-b:a', '128k'],
+    'm4a': ['-c:a', 'aac', '-b:a', '96k', '-movflags', '+faststart'],
+    'opus': ['-c:a', 'libopus', '-b:a', '48k', '-ar', '48000'],
+}
+
+# Seekable rendition: MP3 chunks that start on bar lines, about this long,
+# so a player can start any measure after fetching a single chunk
+CHUNK_SECONDS = 10.0
+CHUNK_CODEC_ARGS = ['-c:a', 'libmp3lame', '-b:a', '128k']
+CHUNK_MANIFEST = 'manifest.json'
+
+class TempoMap:
+    """
+    Tick to seconds conversion from a list of tempo changes
+
+    The seconds elapsed at every tempo change are precomputed, so a lookup
+    is a bisect plus one multiply-add instead of a walk over every change.
+    Results match the old per-call walk exactly (same additions, same order).
+    """
+
+    def __init__(self, tempo_changes, ticks_per_quarter):
+        # Changes are in tick order; of several at the same tick the last wins
+        by_tick = {}
+        for change in sorted(tempo_changes, key=lambda change: change['tick']):
+            by_tick[change['tick']] = change['tempo']
+
+        self.ticks = list(by_tick)
+        self.seconds_per_tick = [tempo / (1000000 * ticks_per_quarter) for tempo in by_tick.values()]
+
+        # Seconds elapsed when each tempo change takes effect
+        self.start_seconds = [0.0]
+        for i in range(1, len(self.ticks)):
+            elapsed = (self.ticks[i] - self.ticks[i - 1]) * self.seconds_per_tick[i - 1]
+            self.start_seconds.append(self.start_seconds[-1] + elapsed)
+
+        self._ticks = np.array(self.ticks, dtype=np.int64)
+        self._seconds_per_tick = np.array(self.seconds_per_tick)
+        self._start_seconds = np.array(self.start_seconds)
+
+    def seconds(self, tick):
+        """Seconds at a single tick"""
+        i = max(bisect_right(self.ticks, tick) - 1, 0)
+        return self.start_seconds[i] + (tick - self.ticks[i]) * self.seconds_per_tick[i]
+
+    def seconds_array(self, ticks):
+        """Seconds at every tick in an array (measure boundaries, note onsets, ...) in one call"""
+        ticks = np.asarray(ticks, dtype=np.int64)
+        i = np.maximum(np.searchsorted(self._ticks, ticks, side='right') - 1, 0)
+        return self._start_seconds[i] + (ticks - self._ticks[i]) * self._seconds_per_tick[i]
+
 class MidiToAudio:
     def __init__(self):
         self.ticks_per_quarter = 480
@@ -15,13 +77,16 @@ class MidiToAudio:
         self.time_signature_changes = []
         self.measures = {}
         self.total_duration = 0
+        self.tempo_map = None
+        # Add note event tracking
+        self.max_note_tick = 0
 
     
-    def process_midi_file(self, midi_file, job_id):
+    def process_midi_file(self, midi_file, job_id, midi_data=None):
         try:
             logging.info(f"Processing MIDI file: {midi_file} for job {job_id}")
             
-            self._parse_midi_timing(midi_file)
+            self._parse_midi_timing(midi_file, midi_data)
             self._calculate_measures()
             
             metadata = self._create_metadata()
@@ -33,190 +98,130 @@ class MidiToAudio:
             logging.error(f"Error processing MIDI file: {e}")
             raise e
 
-    def _parse_midi_timing(self, midi_file_path):
+    def _parse_midi_timing(self, midi_file_path, midi_data=None):
         """
-        Parse MIDI file to extract timing information
-        Reuses logic from midiToXml.py but focuses on timing data
+        Extract timing information (tempo and time signature changes, last note event)
+        from the shared single-pass MIDI parser
         """
         logging.info("Parsing MIDI timing information...")
         
-        with open(midi_file_path, 'rb') as f:
-            data = f.read()
-        
-        # Read MIDI header to get ticks per quarter
-        offset = 8
-        _, _, self.ticks_per_quarter = struct.unpack('>HHH', data[offset:offset+6])
-        offset = 14
+        if midi_data is None:
+            midi_data = parse_midi(midi_file_path)
         
+        self.ticks_per_quarter = midi_data.ticks_per_quarter
         logging.info(f"MIDI timing resolution: {self.ticks_per_quarter} ticks per quarter note")
         
-        # Initialize with defaults
+        # Defaults first, then the changes found in the file
         self.tempo_changes = [{'tick': 0, 'tempo': 500000, 'bpm': 120.0}]
+        self.tempo_changes += [
+            {'tick': tick, 'tempo': tempo, 'bpm': round(60000000 / tempo, 2)}
+            for tick, tempo in midi_data.tempos.tolist()
+        ]
         self.time_signature_changes = [{'tick': 0, 'numerator': 4, 'denominator': 4}]
+        self.time_signature_changes += [
+            {'tick': tick, 'numerator': numerator, 'denominator': denominator}
+            for tick, numerator, denominator in midi_data.time_signatures.tolist()
+        ]
         
-        # Parse all tracks for timing events
-        while offset < len(data):
-            if data[offset:offset+4] == b'MTrk':
-                offset += 8 
-                offset = self._parse_track_timing(data, offset)
-            else:
-                offset += 1
+        self.max_note_tick = midi_data.max_note_tick
+        self.tempo_map = TempoMap(self.tempo_changes, self.ticks_per_quarter)
         
         logging.info(f"Found {len(self.tempo_changes)} tempo changes")
         logging.info(f"Found {len(self.time_signature_changes)} time signature changes")
+        logging.info(f"Latest note event at tick: {self.max_note_tick}")
 
-
-    def _parse_track_timing(self, data, offset):
-        """
-        Parse single track looking for timing events only
-        Based on midiToXml.py but focused on tempo and time signature changes
-        """
-        track_end = offset + struct.unpack('>I', data[offset-4:offset])[0]
-        current_time = 0
-        running_status = 0
-        
-        while offset < track_end:
-            # Read delta time
-            delta_time, offset = self._read_varint(data, offset)
-            current_time += delta_time
-            
-            # Read event
-            if data[offset] & 0x80:
-                running_status = data[offset]
-                offset += 1
-            
-            status = running_status & 0xF0
-            
-            # Skip note events, we only care about timing meta events
-            if status == 0x90:  # Note on
-                offset += 2
-            elif status == 0x80:  # Note off  
-                offset += 2
-            elif status in [0xA0, 0xB0, 0xE0]:  # 2-byte events
-                offset += 2
-            elif status in [0xC0, 0xD0]:  # 1-byte events
-                offset += 1
-            elif data[offset-1] == 0xFF:  # Meta event - THIS IS WHAT WE WANT
-                meta_type = data[offset]
-                offset += 1
-                length, offset = self._read_varint(data, offset)
-                
-                if meta_type == 0x51 and length == 3:
-                    # Set Tempo event (microseconds per quarter note)
-                    tempo_bytes = data[offset:offset+3]
-                    microseconds_per_quarter = int.from_bytes(tempo_bytes, byteorder='big')
-                    bpm = round(60000000 / microseconds_per_quarter, 2)
-                    
-                    self.tempo_changes.append({
-                        'tick': current_time,
-                        'tempo': microseconds_per_quarter,
-                        'bpm': bpm
-                    })
-                    logging.info(f"Found tempo change at tick {current_time}: {bpm} BPM")
-                    
-                elif meta_type == 0x58 and length == 4:
-                    # Time Signature event
-                    numerator = data[offset]
-                    denominator = 2 ** data[offset + 1]  # Stored as power of 2
-                    
-                    self.time_signature_changes.append({
-                        'tick': current_time,
-                        'numerator': numerator,
-                        'denominator': denominator
-                    })
-                    logging.info(f"Found time signature at tick {current_time}: {numerator}/{denominator}")
-                
-                offset += length
-            else:
-                offset += 1
-                
-        return offset
-
-    def _read_varint(self, data, offset):
-        """Read MIDI variable length integer"""
-        value = 0
-        while True:
-            byte = data[offset]
-            offset += 1
-            value = (value << 7) | (byte & 0x7F)
-            if not (byte & 0x80):
-                break
-        return value, offset
-    
     def _ticks_to_seconds(self, target_tick):
         """Convert MIDI ticks to real seconds using tempo changes"""
-        seconds = 0.0
-        current_tick = 0
-        
-        for i, tempo_change in enumerate(self.tempo_changes):
-            next_tempo_tick = self.tempo_changes[i + 1]['tick'] if i + 1 < len(self.tempo_changes) else target_tick
-            
-            if target_tick <= tempo_change['tick']:
-                break
-                
-            tick_range_end = min(next_tempo_tick, target_tick)
-            ticks_in_range = tick_range_end - current_tick
-            
-            if ticks_in_range > 0:
-                microseconds_per_quarter = tempo_change['tempo']
-                seconds_per_tick = microseconds_per_quarter / (1000000 * self.ticks_per_quarter)
-                seconds += ticks_in_range * seconds_per_tick
-            
-            current_tick = tick_range_end
-            
-        return round(seconds, 3)
+        return round(self.tempo_map.seconds(target_tick), 3)
 
     def _calculate_measures(self):
         """Calculate measure boundaries in seconds"""
         logging.info("Calculating measure boundaries...")
         
         # Find the last tick with any event
-        last_tick = max([tc['tick'] for tc in self.tempo_changes] + 
-                       [ts['tick'] for ts in self.time_signature_changes])
+        tempo_last_tick = max([tc['tick'] for tc in self.tempo_changes]) if self.tempo_changes else 0
+        time_sig_last_tick = max([ts['tick'] for ts in self.time_signature_changes]) if self.time_signature_changes else 0
         
-        current_tick = 0
-        measure_num = 1
-        current_time_sig = self.time_signature_changes[0]
+        logging.info(f"Last tempo change tick: {tempo_last_tick}")
+        logging.info(f"Last time signature change tick: {time_sig_last_tick}")
+        logging.info(f"Last note event tick: {self.max_note_tick}")
+        
+        # Use the maximum of tempo, time signature, and note events to determine file length
+        last_tick = max(tempo_last_tick, time_sig_last_tick, self.max_note_tick)
+        logging.info(f"Calculated last_tick from all events: {last_tick}")
+        
+        # If still no events found, create a default minimal duration
+        if last_tick == 0:
+            logging.warning("No events found beyond tick 0, using default duration")
+            last_tick = self.ticks_per_quarter * 4  # Default to 1 measure
+        
+        start_ticks, end_ticks = self._measure_boundaries(last_tick)
+        
+        # Convert every boundary in one call, rounded like _ticks_to_seconds
+        start_seconds = [round(seconds, 3) for seconds in self.tempo_map.seconds_array(start_ticks).tolist()]
+        end_seconds = [round(seconds, 3) for seconds in self.tempo_map.seconds_array(end_ticks).tolist()]
+        
+        self.measures = {
+            measure_num: {
+                'start_tick': start_tick,
+                'end_tick': end_tick,
+                'start_seconds': start,
+                'end_seconds': end,
+                'duration': round(end - start, 3)
+            }
+            for measure_num, (start_tick, end_tick, start, end) in enumerate(
+                zip(start_ticks.tolist(), end_ticks.tolist(), start_seconds, end_seconds), start=1
+            )
+        }
+        
+        self.total_duration = self._ticks_to_seconds(last_tick)
+        logging.info(f"Calculated {len(self.measures)} measures, total duration: {self.total_duration:.2f} seconds")
+
+    def _ticks_per_measure(self, time_signature):
+        quarter_notes_per_measure = time_signature['numerator'] * (4 / time_signature['denominator'])
+        return int(quarter_notes_per_measure * self.ticks_per_quarter)
+
+    def _measure_boundaries(self, last_tick):
+        """
+        Start and end tick of every measure that starts before last_tick
+
+        A time signature change takes effect at the first bar line at or after
+        its tick, so each stretch between changes is a single np.arange.
+        Time signatures that give empty measures are ignored.
+        """
+        segments = []
+        ticks_per_measure = self._ticks_per_measure(self.time_signature_changes[0])
+        if ticks_per_measure <= 0:
+            ticks_per_measure = self.ticks_per_quarter * 4
         time_sig_index = 0
+        current_tick = 0
         
         while current_tick < last_tick:
             # Check for time signature changes
             while (time_sig_index + 1 < len(self.time_signature_changes) and 
                    self.time_signature_changes[time_sig_index + 1]['tick'] <= current_tick):
                 time_sig_index += 1
-                current_time_sig = self.time_signature_changes[time_sig_index]
-            
-            # Calculate ticks per measure
-            beats_per_measure = current_time_sig['numerator']
-            beat_unit = current_time_sig['denominator']
-            quarter_notes_per_measure = beats_per_measure * (4 / beat_unit)
-            ticks_per_measure = int(quarter_notes_per_measure * self.ticks_per_quarter)
-            
-            measure_start_tick = current_tick
-            measure_end_tick = current_tick + ticks_per_measure
+                new_ticks_per_measure = self._ticks_per_measure(self.time_signature_changes[time_sig_index])
+                if new_ticks_per_measure > 0:
+                    ticks_per_measure = new_ticks_per_measure
+                else:
+                    logging.warning(f"Ignoring invalid time signature {self.time_signature_changes[time_sig_index]}")
             
-            # Convert to seconds
-            start_seconds = self._ticks_to_seconds(measure_start_tick)
-            end_seconds = self._ticks_to_seconds(measure_end_tick)
-            
-            self.measures[measure_num] = {
-                'start_tick': measure_start_tick,
-                'end_tick': measure_end_tick,
-                'start_seconds': start_seconds,
-                'end_seconds': end_seconds,
-                'duration': round(end_seconds - start_seconds, 3)
-            }
+            # Measures up to the next time signature change (or the end)
+            segment_end = last_tick
+            if time_sig_index + 1 < len(self.time_signature_changes):
+                segment_end = min(segment_end, self.time_signature_changes[time_sig_index + 1]['tick'])
             
-            current_tick = measure_end_tick
-            measure_num += 1
-            
-            # Safety check
-            if measure_num > 1000:
-                logging.warning("Stopping at 1000 measures to prevent infinite loop")
-                break
+            starts = np.arange(current_tick, segment_end, ticks_per_measure, dtype=np.int64)
+            segments.append((starts, starts + ticks_per_measure))
+            current_tick = int(starts[-1]) + ticks_per_measure
         
-        self.total_duration = self._ticks_to_seconds(last_tick)
-        logging.info(f"Calculated {len(self.measures)} measures, total duration: {self.total_duration:.2f} seconds")
+        if not segments:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        return (
+            np.concatenate([starts for starts, _ in segments]),
+            np.concatenate([ends for _, ends in segments])
+        )
 
     def _create_metadata(self):
         """Create measure timing metadata for frontend"""
@@ -234,57 +239,193 @@ class MidiToAudio:
             }
         }
 
-    def _synthesize_audio(self, midi_file_path, output_file, job_id):
-        """Generate audio using midi2audio library with explicit soundfont"""
+    def _segment_starts(self, segments):
+        """
+        Where to split the audio for parallel rendering: up to `segments`
+        pieces of roughly equal length, each starting on a bar line and
+        lasting at least MIN_SEGMENT_SECONDS
+
+        Returns:
+            list: (tick, seconds) of each segment's start, beginning at (0, 0.0)
+        """
+        segments = min(segments, int(self.total_duration // MIN_SEGMENT_SECONDS))
+        starts = [(0, 0.0)]
+        if segments <= 1 or len(self.measures) < 2:
+            return starts
+        
+        measure_ticks = np.array([data['start_tick'] for data in self.measures.values()], dtype=np.int64)
+        measure_seconds = self.tempo_map.seconds_array(measure_ticks)
+        for k in range(1, segments):
+            target = self.total_duration * k / segments
+            index = int(np.argmin(np.abs(measure_seconds - target)))
+            tick = int(measure_ticks[index])
+            if tick > starts[-1][0]:
+                starts.append((tick, float(measure_seconds[index])))
+        return starts
+
+    def _chunk_starts(self, chunk_seconds=CHUNK_SECONDS):
+        """
+        Measures the chunked rendition is cut before: the first bar line at
+        least chunk_seconds after the previous cut
+
+        Returns:
+            list: (measure number, seconds) of each chunk's first measure
+        """
+        measure_numbers = list(self.measures)
+        measure_ticks = np.array([data['start_tick'] for data in self.measures.values()], dtype=np.int64)
+        measure_seconds = self.tempo_map.seconds_array(measure_ticks).tolist()
+        
+        starts = [(measure_numbers[0], 0.0)] if measure_numbers else [(1, 0.0)]
+        for number, seconds in zip(measure_numbers, measure_seconds):
+            if seconds - starts[-1][1] >= chunk_seconds:
+                starts.append((number, seconds))
+        return starts
+
+    def _write_chunk_manifest(self, chunk_dir, chunk_starts, segment_list):
+        """
+        Describe the chunks ffmpeg wrote: their files, exact start and end
+        times (from its segment list) and the measures each one holds
+        """
+        with open(segment_list) as f:
+            rows = [line.strip().split(',') for line in f if line.strip()]
+        
+        last_measure = max(self.measures) if self.measures else 1
+        chunks = []
+        for index, (filename, start, end) in enumerate(rows):
+            first = chunk_starts[min(index, len(chunk_starts) - 1)][0]
+            last = chunk_starts[index + 1][0] - 1 if index + 1 < len(chunk_starts) else last_measure
+            chunks.append({
+                'index': index,
+                'file': filename,
+                'start': round(float(start), 3),
+                'end': round(float(end), 3),
+                'first_measure': first,
+                'last_measure': max(first, last),
+            })
+        
+        manifest = {
+            'format': 'mp3',
+            'media_type': 'audio/mpeg',
+            'duration': chunks[-1]['end'] if chunks else 0.0,
+            'chunks': chunks,
+        }
+        with open(chunk_dir / CHUNK_MANIFEST, 'w') as f:
+            json.dump(manifest, f)
+        return manifest
+
+    def _synthesize_audio(self, midi_file_path, output_file, job_id, render_segments=1):
+        """
+        Render the MIDI file with this process's resident synthesizer and
+        encode it to every rendition in AUDIO_RENDITIONS
+
+        PCM blocks go straight into ffmpeg's stdin as they are rendered, so
+        no intermediate WAV is written and encoding overlaps synthesis.
+        With render_segments > 1 a long piece is split on bar lines and the
+        segments are rendered in parallel processes, then joined.
+
+        The same pass also cuts a chunked MP3 on bar lines (see
+        CHUNK_SECONDS) into a directory next to the output, together with a
+        manifest mapping measures to chunks. Waveform peaks are taken from
+        the PCM on its way to ffmpeg and saved next to the output as .peaks.
+
+        Returns:
+            dict: Path of each rendition and of the peaks, by file
+            extension, and of the chunk directory under 'chunks'
+        """
         
-        audio_file = output_file
-        audio_file.parent.mkdir(parents=True, exist_ok=True)
+        audio_files = {extension: output_file.with_suffix(f'.{extension}') for extension in AUDIO_RENDITIONS}
+        output_file.parent.mkdir(parents=True, exist_ok=True)
         
-        # Try to find a soundfont
-        soundfont_paths = [
-            "./FluidR3_GM.sf2",  # Downloaded file
-            "./FluidR3_GM.sf3", 
-            "./Piano.sf2",
-            "/usr/share/soundfonts/FluidR3_GM.sf2",
-            "/opt/homebrew/share/soundfonts/FluidR3_GM.sf2"
+        chunk_dir = output_file.parent / f"{output_file.stem}_chunks"
+        shutil.rmtree(chunk_dir, ignore_errors=True)
+        chunk_dir.mkdir()
+        chunk_starts = self._chunk_starts()
+        segment_list = chunk_dir / 'segments.csv'
+        
+        # One input, one output per rendition: the PCM is read once and fanned
+        # out to every encoder
+        encode_cmd = [
+            'ffmpeg', '-hide_banner', '-loglevel', 'error',
+            '-f', 's16le', '-ar', str(SAMPLE_RATE), '-ac', str(CHANNELS), '-i', 'pipe:0',
         ]
+        for extension, codec_args in AUDIO_RENDITIONS.items():
+            encode_cmd += ['-map', '0:a', *codec_args, '-y', str(audio_files[extension])]
         
-        soundfont = None
-        for path in soundfont_paths:
-            if Path(path).exists():
-                soundfont = path
-                break
+        # Cut points are requested as times; ffmpeg cuts at the first frame
+        # at or after each one and reports the real boundaries in its list
+        encode_cmd += ['-map', '0:a', *CHUNK_CODEC_ARGS, '-f', 'segment', '-reset_timestamps', '1']
+        if len(chunk_starts) > 1:
+            encode_cmd += ['-segment_times', ','.join(f'{seconds:.6f}' for _, seconds in chunk_starts[1:])]
+        else:
+            encode_cmd += ['-segment_time', str(10 ** 6)]
+        encode_cmd += [
+            '-segment_list', str(segment_list), '-segment_list_type', 'csv',
+            '-y', str(chunk_dir / 'chunk_%04d.mp3')
+        ]
         
         try:
-            if soundfont:
-                logging.info(f"Using soundfont: {soundfont}")
-                fs = FluidSynth(sound_font=soundfont)
-            else:
-                logging.warning("No soundfont found, using default (may be silent)")
-                fs = FluidSynth()
+            segment_starts = self._segment_starts(render_segments)
+            peaks = WaveformPeaks(SAMPLE_RATE, CHANNELS)
             
-            fs.midi_to_audio(str(midi_file_path), str(audio_file))
+            with tempfile.TemporaryFile() as encode_log:
+                # Unbuffered, so closing stdin never has to flush into a dead pipe
+                encoder = subprocess.Popen(encode_cmd, stdin=subprocess.PIPE, stderr=encode_log, bufsize=0)
+                
+                def write(pcm):
+                    peaks.add(pcm)
+                    encoder.stdin.write(pcm)
+                
+                try:
+                    if len(segment_starts) > 1:
+                        # Segment PCM is spooled next to the output (the job's scratch directory)
+                        frames = render_segmented(midi_file_path, segment_starts, write,
+                                                  work_dir=Path(output_file).parent)
+                    else:
+                        frames = get_synthesizer().render(midi_file_path, write)
+                except BrokenPipeError:
+                    # ffmpeg exited early; its own error is reported below
+                    frames = 0
+                finally:
+                    encoder.stdin.close()
+                    encoder.wait()
+                
+                if encoder.returncode != 0:
+                    encode_log.seek(0)
+                    raise RuntimeError(f"ffmpeg exited with {encoder.returncode}: "
+                                       f"{encode_log.read().decode(errors='replace').strip()}")
             
-            logging.info(f"Audio synthesis complete: {audio_file}")
-            return str(audio_file)
+            manifest = self._write_chunk_manifest(chunk_dir, chunk_starts, segment_list)
+            segment_list.unlink()
+            peaks_file = peaks.save(output_file.with_suffix('.peaks'))
+            
+            sizes = ", ".join(
+                f"{extension} {path.stat().st_size / (1024*1024):.1f} MB" for extension, path in audio_files.items()
+            )
+            logging.info(f"Audio synthesis complete: {output_file.with_suffix('')} ({frames / SAMPLE_RATE:.1f}s; {sizes}; "
+                         f"{len(manifest['chunks'])} chunks)")
+            return {
+                **{extension: str(path) for extension, path in audio_files.items()},
+                'peaks': str(peaks_file),
+                'chunks': str(chunk_dir),
+            }
             
         except Exception as e:
             logging.error(f"MIDI to audio conversion failed: {e}")
             raise Exception(f"MIDI to audio conversion failed: {e}")
 
-def convert_midi_to_audio(midi_file, output_file, job_id):
+def convert_midi_to_audio(midi_file, output_file, job_id, midi_data=None, render_segments=1):
     converter = MidiToAudio()
     
-    metadata = converter.process_midi_file(midi_file, job_id)
+    metadata = converter.process_midi_file(midi_file, job_id, midi_data)
 
-    audio_path = converter._synthesize_audio(midi_file, output_file, job_id)
+    audio_paths = converter._synthesize_audio(midi_file, output_file, job_id, render_segments)
     
-    return audio_path, metadata
+    return audio_paths, metadata
 
 if __name__ == "__main__":
     job_id = "09eded96-ed54-4aab-81f2-6fdb97d32afa"
     midi_file = Path(f"uploads/{job_id}.mid")
     output_file = Path(f"uploads/{job_id}.mp3")
     
-    audio_path, metadata = convert_midi_to_audio(midi_file, output_file, job_id)
+    audio_paths, metadata = convert_midi_to_audio(midi_file, output_file, job_id)
     print(metadata)
\ No newline at end of file
@@ -1,24 +1,110 @@
+import time
+import wave
+import threading
+import array
+import logging
+import tempfile
 from pathlib import Path
 
 
 from mirtoolkit import beat_this, sheetsage
 import picogen2
 
-def run_picogen(audio_file, output_dir):
+
+class PiCoGenModels:
+    """
+    PiCoGen2 components loaded once per worker and reused by every job
+
+    Holds the decoder and tokenizer, and primes beat_this and sheetsage with a
+    warm-up run so their weights are resident before the first real job.
+    """
+
+    def __init__(self, device="cuda"):
+        self.device = device
+        self.tokenizer = None
+        self.model = None
+        self.load_seconds = None
+        # Serialises GPU inference between concurrent job slots
+        self.lock = threading.Lock()
+
+    def load(self):
+        """Load the decoder and tokenizer and warm up the whole pipeline"""
+        start = time.time()
+
+        self.tokenizer = picogen2.Tokenizer()
+        self.model = picogen2.PiCoGenDecoder.from_pretrained(device=self.device)
+        self.model.eval()
+        logging.info(f"Loaded PiCoGen2 decoder and tokenizer in {time.time() - start:.2f}s")
+
+        self.warmup()
+
+        self.load_seconds = time.time() - start
+        logging.info(f"PiCoGen2 models ready (load + warm-up: {self.load_seconds:.2f}s)")
+        return self
+
+    def warmup(self, seconds=8):
+        """Run beat_this, sheetsage and the decoder once on a short click track"""
+        warmup_start = time.time()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            click_path = Path(tmp_dir) / "warmup.wav"
+            _write_click_track(click_path, seconds)
+            try:
+                run_picogen(str(click_path), tmp_dir, models=self)
+            except Exception as e:
+                # Weights are loaded at this point; a failed warm-up only means
+                # the first job pays for whatever didn't get initialised
+                logging.warning(f"PiCoGen2 warm-up failed: {e}")
+                return
+        logging.info(f"PiCoGen2 warm-up finished in {time.time() - warmup_start:.2f}s")
+
+
+def _write_click_track(path, seconds, sample_rate=22050, bpm=120):
+    """Write a mono 16-bit WAV with a short click on every beat"""
+    samples = array.array('h', bytes(2 * sample_rate * seconds))
+    beat_samples = int(sample_rate * 60 / bpm)
+    click_samples = sample_rate // 100
+    for beat_start in range(0, len(samples), beat_samples):
+        for i in range(beat_start, min(beat_start + click_samples, len(samples))):
+            samples[i] = 16000 if (i // 20) % 2 == 0 else -16000
+
+    with wave.open(str(path), "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(samples.tobytes())
+
+
+def run_picogen(audio_file, output_dir, models=None):
     audio_file = audio_file # input file
     output_path = Path(output_dir)
     output_path.mkdir(parents=True, exist_ok=True)
 
-    tokenizer = picogen2.Tokenizer()
-    model = picogen2.PiCoGenDecoder.from_pretrained(device="cuda")
+    if models is None:
+        logging.warning("No preloaded PiCoGen2 models given; loading them for this job")
+        models = PiCoGenModels()
+        models.tokenizer = picogen2.Tokenizer()
+        models.model = picogen2.PiCoGenDecoder.from_pretrained(device="cuda")
+
+    with models.lock:
+        return _infer(audio_file, output_path, models)
+
 
+def _infer(audio_file, output_path, models):
+    tokenizer = models.tokenizer
+    model = models.model
+
+    start = time.time()
     beats, downbeats = beat_this.detect(audio_file)
     beat_information = {"beats": beats.tolist(), "downbeats": downbeats.tolist()}
+    beat_seconds = time.time() - start
 
     # extract feature
+    start = time.time()
     sheetsage_output = sheetsage.infer(audio_path=audio_file, beat_information=beat_information)
+    feature_seconds = time.time() - start
 
     # generate piano cover
+    start = time.time()
     out_events = picogen2.decode(
         model=model,
         tokenizer=tokenizer,
@@ -26,10 +112,16 @@ def run_picogen(audio_file, output_dir):
         melody_last_embs=sheetsage_output["melody_last_hidden_state"],
         harmony_last_embs=sheetsage_output["harmony_last_hidden_state"],
     )
+    decode_seconds = time.time() - start
+
+    logging.info(
+        f"PiCoGen2 inference: beats {beat_seconds:.2f}s, features {feature_seconds:.2f}s, "
+        f"decode {decode_seconds:.2f}s, total {beat_seconds + feature_seconds + decode_seconds:.2f}s"
+    )
 
     (output_path / "piano.txt").write_text("\n".join(map(str, out_events)))
-    
+
     midi_file_path = output_path / "piano.mid"
     tokenizer.events_to_midi(out_events).dump(midi_file_path)
 
-    return midi_file_path
\ No newline at end of file
+    return midi_file_path
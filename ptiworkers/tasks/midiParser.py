@@ -0,0 +1,242 @@
+import logging
+import time
+import numpy as np
+
+# One row per note; onset and duration are in ticks
+NOTE_DTYPE = np.dtype([
+    ('pitch', np.uint8),
+    ('onset', np.int64),
+    ('duration', np.int64),
+    ('velocity', np.uint8),
+    ('track', np.uint16),
+])
+TEMPO_DTYPE = np.dtype([
+    ('tick', np.int64),
+    ('tempo', np.int64),  # microseconds per quarter note
+])
+TIME_SIGNATURE_DTYPE = np.dtype([
+    ('tick', np.int64),
+    ('numerator', np.int64),
+    ('denominator', np.int64),
+])
+
+
+class MidiData:
+    """
+    Everything the post-processing stages need from a MIDI file
+
+    notes is a NOTE_DTYPE array in the order notes end (track by track),
+    tempos and time_signatures are sorted by tick and only contain events
+    present in the file.
+    """
+
+    def __init__(self, ticks_per_quarter, notes, tempos, time_signatures, max_note_tick):
+        self.ticks_per_quarter = ticks_per_quarter
+        self.notes = notes
+        self.tempos = tempos
+        self.time_signatures = time_signatures
+        self.max_note_tick = max_note_tick
+
+    def initial_bpm(self, default=120):
+        """BPM of the first tempo event, rounded to a whole number"""
+        if len(self.tempos) == 0:
+            return default
+        return round(60000000 / int(self.tempos['tempo'][0]))
+
+
+def parse_midi(source):
+    """
+    Parse a MIDI file in a single pass
+
+    Args:
+        source: Path to a MIDI file, or its contents as bytes
+
+    Returns:
+        MidiData: Notes, tempo map and time signature map
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        raw = bytes(source)
+    else:
+        with open(source, 'rb') as f:
+            raw = f.read()
+
+    if len(raw) < 14 or raw[:4] != b'MThd':
+        raise ValueError("Not a MIDI file: missing MThd header")
+
+    data = memoryview(raw)
+    ticks_per_quarter = int.from_bytes(data[12:14], 'big')
+
+    pitches, onsets, durations, velocities, tracks = [], [], [], [], []
+    tempos = []
+    time_signatures = []
+    max_note_tick = 0
+
+    track_index = 0
+    offset = raw.find(b'MTrk', 14)
+    while offset != -1:
+        track_start = offset + 8
+        track_end = min(track_start + int.from_bytes(data[offset + 4:track_start], 'big'), len(data))
+        offset = track_start
+
+        tick = 0
+        running_status = 0
+        last_note_tick = 0
+        note_ons = {}
+
+        try:
+            while offset < track_end:
+                # Delta time (variable length quantity)
+                byte = data[offset]
+                offset += 1
+                delta = byte & 0x7F
+                while byte & 0x80:
+                    byte = data[offset]
+                    offset += 1
+                    delta = (delta << 7) | (byte & 0x7F)
+                tick += delta
+
+                status = data[offset]
+                if status & 0x80:
+                    offset += 1
+                    if status < 0xF0:
+                        running_status = status
+                else:
+                    status = running_status
+
+                kind = status & 0xF0
+                if kind == 0x90 or kind == 0x80:
+                    pitch = data[offset]
+                    velocity = data[offset + 1]
+                    offset += 2
+                    last_note_tick = tick
+                    if kind == 0x90 and velocity > 0:
+                        note_ons[pitch] = (tick, velocity)
+                    elif pitch in note_ons:
+                        # Note off, or note on with velocity 0
+                        start, on_velocity = note_ons.pop(pitch)
+                        pitches.append(pitch)
+                        onsets.append(start)
+                        durations.append(tick - start)
+                        velocities.append(on_velocity)
+                        tracks.append(track_index)
+                elif kind == 0xA0 or kind == 0xB0 or kind == 0xE0:
+                    offset += 2
+                elif kind == 0xC0 or kind == 0xD0:
+                    offset += 1
+                elif status == 0xFF:
+                    meta_type = data[offset]
+                    offset += 1
+                    byte = data[offset]
+                    offset += 1
+                    length = byte & 0x7F
+                    while byte & 0x80:
+                        byte = data[offset]
+                        offset += 1
+                        length = (length << 7) | (byte & 0x7F)
+
+                    if meta_type == 0x51 and length == 3:
+                        tempos.append((tick, int.from_bytes(data[offset:offset + 3], 'big')))
+                    elif meta_type == 0x58 and length == 4:
+                        time_signatures.append((tick, data[offset], 2 ** data[offset + 1]))
+                    offset += length
+                elif status == 0xF0 or status == 0xF7:
+                    # SysEx: skip the payload
+                    byte = data[offset]
+                    offset += 1
+                    length = byte & 0x7F
+                    while byte & 0x80:
+                        byte = data[offset]
+                        offset += 1
+                        length = (length << 7) | (byte & 0x7F)
+                    offset += length
+                else:
+                    offset += 1
+        except IndexError:
+            logging.warning(f"MIDI track {track_index} is truncated; keeping the events read so far")
+
+        max_note_tick = max(max_note_tick, last_note_tick)
+        track_index += 1
+        offset = raw.find(b'MTrk', max(offset, track_end))
+
+    notes = np.empty(len(pitches), dtype=NOTE_DTYPE)
+    notes['pitch'] = pitches
+    notes['onset'] = onsets
+    notes['duration'] = durations
+    notes['velocity'] = velocities
+    notes['track'] = tracks
+
+    tempo_map = np.array(tempos, dtype=TEMPO_DTYPE)
+    tempo_map = tempo_map[np.argsort(tempo_map['tick'], kind='stable')]
+    time_signature_map = np.array(time_signatures, dtype=TIME_SIGNATURE_DTYPE)
+    time_signature_map = time_signature_map[np.argsort(time_signature_map['tick'], kind='stable')]
+
+    return MidiData(ticks_per_quarter, notes, tempo_map, time_signature_map, max_note_tick)
+
+
+def _synthetic_transcription(num_notes, ticks_per_quarter=480, seed=0):
+    """Build a dense piano-roll style MIDI file in memory for benchmarking"""
+    rng = np.random.default_rng(seed)
+    step = ticks_per_quarter // 4
+    onsets = np.sort(rng.integers(0, num_notes // 3, num_notes)) * step
+    offsets = onsets + rng.integers(1, 8, num_notes) * step
+    pitches = rng.integers(21, 109, num_notes)
+    velocities = rng.integers(30, 110, num_notes)
+
+    events = [(int(t), 1, bytes([0x90, int(p), int(v)])) for t, p, v in zip(onsets, pitches, velocities)]
+    events += [(int(t), 0, bytes([0x80, int(p), 0])) for t, p in zip(offsets, pitches)]
+    events.sort(key=lambda e: (e[0], e[1]))
+
+    def varint(value):
+        out = [value & 0x7F]
+        value >>= 7
+        while value:
+            out.append((value & 0x7F) | 0x80)
+            value >>= 7
+        return bytes(reversed(out))
+
+    track = bytearray(b'\x00\xff\x51\x03' + (500000).to_bytes(3, 'big'))
+    track += b'\x00\xff\x58\x04\x04\x02\x18\x08'
+    last_tick = 0
+    for tick, _, message in events:
+        track += varint(tick - last_tick) + message
+        last_tick = tick
+    track += b'\x00\xff\x2f\x00'
+
+    header = b'MThd' + (6).to_bytes(4, 'big') + (0).to_bytes(2, 'big') + (1).to_bytes(2, 'big')
+    header += ticks_per_quarter.to_bytes(2, 'big')
+    return header + b'MTrk' + len(track).to_bytes(4, 'big') + bytes(track)
+
+
+if __name__ == "__main__":
+    import io
+    import sys
+    import mido
+
+    # Usage: python midiParser.py [<midi_file> | <number_of_notes>] [<repeat>]
+    arg = sys.argv[1] if len(sys.argv) > 1 else "50000"
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    if arg.isdigit():
+        raw = _synthetic_transcription(int(arg))
+        print(f"Synthetic transcription with {arg} notes ({len(raw) / 1024:.0f} KB)")
+    else:
+        with open(arg, 'rb') as f:
+            raw = f.read()
+        print(f"{arg} ({len(raw) / 1024:.0f} KB)")
+
+    def best_of(fn):
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - start)
+        return best
+
+    parsed = parse_midi(raw)
+    single_pass = best_of(lambda: parse_midi(raw))
+    mido_parse = best_of(lambda: mido.MidiFile(file=io.BytesIO(raw)))
+
+    print(f"notes: {len(parsed.notes)}, tempo events: {len(parsed.tempos)}, "
+          f"time signatures: {len(parsed.time_signatures)}")
+    print(f"parse_midi (single pass):   {single_pass * 1000:8.1f} ms")
+    print(f"mido.MidiFile (parse only): {mido_parse * 1000:8.1f} ms  ({mido_parse / single_pass:.1f}x slower)")
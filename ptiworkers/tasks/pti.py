@@ -1,18 +1,53 @@
 import os
+import time
 import logging
+import threading
 from pathlib import Path
 
 import librosa
+import numpy as np
 import pretty_midi
 from piano_transcription_inference import PianoTranscription, sample_rate
 
-def run_pti(audio_file, output_file):
+# One inference at a time on the shared model; concurrent job slots overlap
+# their I/O-bound stages with it instead of fighting over the CPU
+_inference_lock = threading.Lock()
+
+def load_pti_model(device='cpu', checkpoint_path=None, warmup_seconds=1.0):
+    """
+    Load the PianoTranscription model once and warm it up
+
+    The worker keeps the returned transcriptor for its whole lifetime so each
+    job skips the checkpoint load and torch graph setup.
+
+    Args:
+        device (str): Torch device to run inference on
+        checkpoint_path (str): Optional checkpoint path (None downloads/uses the default)
+        warmup_seconds (float): Length of the silent buffer used for the warm-up pass
+    Returns:
+        PianoTranscription: Loaded transcriptor ready for run_pti
+    """
+    start = time.time()
+    transcriptor = PianoTranscription(device=device, checkpoint_path=checkpoint_path)
+    logging.info(f"Loaded PianoTranscription on {device} in {time.time() - start:.2f}s")
+
+    # Warm-up inference on a short silent buffer so the first real job
+    # doesn't pay for lazy allocations inside torch
+    warmup_start = time.time()
+    silence = np.zeros(int(sample_rate * warmup_seconds), dtype=np.float32)
+    transcriptor.transcribe(silence, None)
+    logging.info(f"PianoTranscription warm-up finished in {time.time() - warmup_start:.2f}s")
+
+    return transcriptor
+
+def run_pti(audio_file, output_file, transcriptor=None):
     """
     Process audio file with piano_transcription_inference and generate MIDI file
     
     Args:
         audio_file (str): Path to the input audio file
         output_file (str): Path to output MIDI file (e.g., "/tmp/job123.midi")
+        transcriptor (PianoTranscription): Model loaded by load_pti_model; loaded on demand if None
     Returns:
         Path: Path to the generated MIDI file
     """
@@ -26,11 +61,14 @@ def run_pti(audio_file, output_file):
         # Load audio with librosa at the required sample rate
         audio, _ = librosa.load(str(audio_file), sr=sample_rate, mono=True)
         
-        # Create transcriptor with CPU
-        transcriptor = PianoTranscription(device='cpu', checkpoint_path=None)
+        # Fall back to a one-off model when the worker didn't hand one in
+        if transcriptor is None:
+            logging.warning("No preloaded PianoTranscription model given; loading one for this job")
+            transcriptor = PianoTranscription(device='cpu', checkpoint_path=None)
         
         # Transcribe and write out to MIDI file
-        transcriptor.transcribe(audio, str(output_file))
+        with _inference_lock:
+            transcriptor.transcribe(audio, str(output_file))
         
         logging.info(f"Transcription output saved to {output_file}")
         
@@ -0,0 +1,237 @@
+import os
+import logging
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import mido
+import numpy as np
+from ptiworkers.tasks.synthesizer import get_synthesizer, SAMPLE_RATE, CHANNELS
+
+# Rendered past the end of every segment but the last, so notes that are
+# still ringing at the split fade out before the next segment takes over
+SEGMENT_TAIL_SECONDS = 3.0
+
+def _absolute_messages(midi_file_path):
+    """All messages of a MIDI file in playback order, with absolute tick times"""
+    midi = mido.MidiFile(midi_file_path)
+    messages = []
+    tick = 0
+    for message in mido.merge_tracks(midi.tracks):
+        tick += message.time
+        messages.append((tick, message))
+    # merge_tracks leaves a single end_of_track, at the end of the longest track
+    return midi.ticks_per_beat, messages
+
+def _state_key(message):
+    """Key of the channel state a message sets, or None if it sets none"""
+    if message.type == 'control_change':
+        return (message.type, message.channel, message.control)
+    if message.type in ('program_change', 'pitchwheel', 'aftertouch'):
+        return (message.type, message.channel)
+    if message.type == 'set_tempo':
+        return (message.type,)
+    return None
+
+def split_midi(midi_file_path, start_ticks, output_dir):
+    """
+    Split a MIDI file into one file per segment, each starting at tick 0
+
+    A note belongs to the segment its note-on falls in and keeps its note-off
+    even when that lies past the split. Each segment file opens with the tempo
+    and channel state (programs, controllers, pitch bend) in effect at its start
+    and carries every controller change until its last note has been released,
+    including a sustain pedal that is still down. The last segment runs to the
+    end of the original file, so the joined audio has the same length.
+
+    Args:
+        midi_file_path: MIDI file to split
+        start_ticks: Ascending start tick of each segment; the first must be 0
+        output_dir: Directory the segment files are written to
+
+    Returns:
+        list: Path of each segment's MIDI file
+    """
+    ticks_per_beat, messages = _absolute_messages(midi_file_path)
+    end_tick = messages[-1][0] if messages else 0
+
+    # Pair every note-on with its note-off (first on, first off per key)
+    segment_of = {}
+    note_end = {}
+    sounding = {}
+    segment = 0
+    for index, (tick, message) in enumerate(messages):
+        while segment + 1 < len(start_ticks) and tick >= start_ticks[segment + 1]:
+            segment += 1
+        if message.type == 'note_on' and message.velocity > 0:
+            sounding.setdefault((message.channel, message.note), []).append(index)
+            segment_of[index] = segment
+            note_end[index] = tick
+        elif message.type in ('note_on', 'note_off'):
+            ons = sounding.get((message.channel, message.note))
+            if ons:
+                on_index = ons.pop(0)
+                segment_of[index] = segment_of[on_index]
+                note_end[on_index] = tick
+
+    # Notes never switched off ring until the end, like in the full render
+    for ons in sounding.values():
+        for on_index in ons:
+            note_end[on_index] = end_tick
+
+    last_release = [0] * len(start_ticks)
+    for on_index, tick in note_end.items():
+        last_release[segment_of[on_index]] = max(last_release[segment_of[on_index]], tick)
+
+    paths = []
+    state = {}
+    position = 0
+    for segment, start_tick in enumerate(start_ticks):
+        # Channel state in effect at the split, in the order it was set
+        while position < len(messages) and messages[position][0] < start_tick:
+            key = _state_key(messages[position][1])
+            if key is not None:
+                state.pop(key, None)
+                state[key] = messages[position][1]
+            position += 1
+
+        is_last = segment == len(start_ticks) - 1
+        if is_last:
+            stop_tick = end_tick
+        else:
+            stop_tick = max(last_release[segment], start_ticks[segment + 1])
+            stop_tick = _sustain_released(messages, position, stop_tick, state)
+
+        track = mido.MidiTrack()
+        for message in state.values():
+            track.append(message.copy(time=0))
+
+        previous = start_tick
+        for index in range(position, len(messages)):
+            tick, message = messages[index]
+            if tick > stop_tick:
+                break
+            if message.type in ('note_on', 'note_off'):
+                if segment_of.get(index) != segment:
+                    continue
+            elif message.type == 'end_of_track':
+                continue
+            track.append(message.copy(time=tick - previous))
+            previous = tick
+        track.append(mido.MetaMessage('end_of_track', time=stop_tick - previous))
+
+        path = os.path.join(output_dir, f"segment_{segment:03d}.mid")
+        mido.MidiFile(type=0, ticks_per_beat=ticks_per_beat, tracks=[track]).save(path)
+        paths.append(path)
+
+    return paths
+
+def _sustain_released(messages, position, stop_tick, state):
+    """First tick at or after stop_tick at which no channel holds the sustain pedal down"""
+    held = {
+        key[1] for key, message in state.items()
+        if key[0] == 'control_change' and key[2] == 64 and message.value >= 64
+    }
+    for tick, message in messages[position:]:
+        if tick > stop_tick and not held:
+            break
+        if message.type == 'control_change' and message.control == 64:
+            if message.value >= 64:
+                held.add(message.channel)
+            else:
+                held.discard(message.channel)
+            if tick >= stop_tick and not held:
+                return tick
+    return max(stop_tick, messages[-1][0]) if held else stop_tick
+
+def _render_segment(midi_file_path, pcm_path, tail_frames):
+    """Render one segment to a raw PCM file; runs in a segment process"""
+    with open(pcm_path, 'wb') as f:
+        return get_synthesizer().render(midi_file_path, f.write, tail_frames=tail_frames)
+
+class _Mixer:
+    """Sums overlapping segments and writes finished audio as s16le PCM"""
+
+    def __init__(self, write):
+        self.write = write
+        self.position = 0  # frame the pending buffer starts at
+        self.pending = np.zeros((0, CHANNELS), dtype=np.int32)
+
+    def _flush(self, until):
+        frames = until - self.position
+        if frames <= 0:
+            return
+        if frames > len(self.pending):
+            self.pending = np.concatenate(
+                [self.pending, np.zeros((frames - len(self.pending), CHANNELS), dtype=np.int32)])
+        done = np.clip(self.pending[:frames], -32768, 32767).astype('<i2')
+        self.write(done.tobytes())
+        self.pending = self.pending[frames:]
+        self.position = until
+
+    def add(self, offset, pcm):
+        """Mix in a segment starting at frame offset; offsets must not decrease"""
+        self._flush(offset)
+        start = offset - self.position
+        if start + len(pcm) > len(self.pending):
+            self.pending = np.concatenate(
+                [self.pending, np.zeros((start + len(pcm) - len(self.pending), CHANNELS), dtype=np.int32)])
+        self.pending[start:start + len(pcm)] += pcm
+
+    def finish(self, end):
+        """Write everything up to frame end; anything past it is dropped"""
+        self._flush(end)
+
+def render_segmented(midi_file_path, segment_starts, write, tail_seconds=SEGMENT_TAIL_SECONDS, work_dir=None):
+    """
+    Render a MIDI file as independent segments in parallel and join them
+
+    Every segment is rendered in its own process by a synthesizer forked from
+    this process's resident one, so the soundfont is not loaded again. The
+    segments are then summed back together at their exact sample offsets
+    (synthesis is additive, so overlapping tails mix the same way they would
+    in one render) and written out in order as s16le stereo PCM.
+
+    Args:
+        midi_file_path: MIDI file to render
+        segment_starts: (tick, seconds) where each segment starts; the first
+            must be (0, 0.0)
+        write: Called with each block of joined PCM bytes, in order
+        work_dir: Directory the segment files are spooled in (default: the
+            system temp directory)
+
+    Returns:
+        int: Number of frames written
+    """
+    tail_frames = int(tail_seconds * SAMPLE_RATE)
+    offsets = [round(seconds * SAMPLE_RATE) for _, seconds in segment_starts]
+    # Loaded before forking, so every segment process shares it
+    get_synthesizer()
+
+    with tempfile.TemporaryDirectory(prefix="segments_", dir=work_dir) as segment_dir:
+        midi_paths = split_midi(midi_file_path, [tick for tick, _ in segment_starts], segment_dir)
+        pcm_paths = [path[:-len(".mid")] + ".pcm" for path in midi_paths]
+        tails = [tail_frames] * (len(midi_paths) - 1) + [0]
+
+        with ProcessPoolExecutor(max_workers=len(midi_paths),
+                                 mp_context=multiprocessing.get_context("fork")) as pool:
+            futures = [
+                pool.submit(_render_segment, midi_path, pcm_path, tail)
+                for midi_path, pcm_path, tail in zip(midi_paths, pcm_paths, tails)
+            ]
+
+            # Segments are joined in order as they finish, so encoding
+            # overlaps with the segments still rendering
+            mixer = _Mixer(write)
+            frames = 0
+            for offset, future, pcm_path in zip(offsets, futures, pcm_paths):
+                future.result()
+                pcm = np.fromfile(pcm_path, dtype='<i2').reshape(-1, CHANNELS).astype(np.int32)
+                os.remove(pcm_path)
+                mixer.add(offset, pcm)
+                frames = offset + len(pcm)
+
+        # The last segment has no tail, so it marks where the full render ends
+        mixer.finish(frames)
+
+    logging.info(f"Rendered {len(midi_paths)} segments in parallel ({frames / SAMPLE_RATE:.1f}s)")
+    return frames
@@ -0,0 +1,130 @@
+import logging
+import threading
+from pathlib import Path
+import fluidsynth
+
+# The synthesizer renders 16-bit stereo PCM
+SAMPLE_RATE = 44100
+CHANNELS = 2
+# Frames rendered per call; one block is 16 KB of PCM
+BLOCK_FRAMES = 4096
+
+# Searched in order when SOUNDFONT_PATH is not set
+DEFAULT_SOUNDFONT_PATHS = [
+    "/app/FluidR3_GM.sf3",
+    "/app/FluidR3Mono_GM.sf3",
+    "./FluidR3_GM.sf2",
+    "./FluidR3_GM.sf3",
+    "./Piano.sf2",
+    "/usr/share/soundfonts/FluidR3_GM.sf2",
+    "/opt/homebrew/share/soundfonts/FluidR3_GM.sf2"
+]
+
+def resolve_soundfont(configured_path=None):
+    """
+    Pick the soundfont a worker renders with
+
+    A configured path must exist; otherwise the first default that exists
+    is used. Returns None when nothing is found (FluidSynth then renders
+    silence).
+    """
+    if configured_path:
+        if not Path(configured_path).is_file():
+            raise FileNotFoundError(f"Soundfont not found: {configured_path}")
+        return str(Path(configured_path).resolve())
+
+    for path in DEFAULT_SOUNDFONT_PATHS:
+        if Path(path).is_file():
+            return str(Path(path).resolve())
+
+    logging.warning("No soundfont found, using default (may be silent)")
+    return None
+
+class Synthesizer:
+    """
+    A FluidSynth instance with the soundfont loaded once, reused across jobs
+
+    Each render plays one MIDI file through a player clocked by the samples
+    being rendered (the same loop as `fluidsynth -F`), so it runs as fast as
+    the CPU allows. Sample data is loaded on demand, so only the presets a
+    piece actually uses are read from the soundfont. The synthesizer is
+    reset after every render so no state leaks into the next job.
+    """
+
+    def __init__(self, soundfont, sample_rate=SAMPLE_RATE):
+        self.soundfont = soundfont
+        self.sample_rate = sample_rate
+        self._lock = threading.Lock()
+        self._synth = fluidsynth.Synth(samplerate=sample_rate, **{
+            "synth.dynamic-sample-loading": 1,
+        })
+        # Advance the MIDI player by rendered samples rather than wall time
+        self._synth.setting("player.timing-source", "sample")
+
+        if soundfont:
+            if self._synth.sfload(soundfont) == fluidsynth.FLUID_FAILED:
+                self._synth.delete()
+                raise RuntimeError(f"FluidSynth could not load soundfont {soundfont}")
+            logging.info(f"Loaded soundfont: {soundfont}")
+
+    def render(self, midi_file_path, write, block_frames=BLOCK_FRAMES, tail_frames=0):
+        """
+        Render a MIDI file to interleaved s16le stereo PCM
+
+        Args:
+            midi_file_path: MIDI file to play
+            write: Called with each block of PCM bytes, in order
+            block_frames: Frames rendered per block
+            tail_frames: Frames to keep rendering after the last event, so
+                released notes can ring out
+
+        Returns:
+            int: Number of frames rendered
+        """
+        with self._lock:
+            synth = self._synth
+            if synth.play_midi_file(str(midi_file_path)) == fluidsynth.FLUID_FAILED:
+                raise RuntimeError(f"FluidSynth could not play {midi_file_path}")
+
+            frames = 0
+            try:
+                while fluidsynth.fluid_player_get_status(synth.player) == fluidsynth.FLUID_PLAYER_PLAYING:
+                    write(fluidsynth.raw_audio_string(synth.get_samples(block_frames)))
+                    frames += block_frames
+                while tail_frames > 0:
+                    block = min(block_frames, tail_frames)
+                    write(fluidsynth.raw_audio_string(synth.get_samples(block)))
+                    frames += block
+                    tail_frames -= block
+            finally:
+                synth.play_midi_stop()
+                synth.system_reset()
+            return frames
+
+# One resident synthesizer per process
+_synthesizer = None
+_soundfont = None
+_synthesizer_lock = threading.Lock()
+
+def start_synthesizer(soundfont):
+    """
+    Load this process's synthesizer; used as the stage pool initializer so
+    every stage process pays for the soundfont once, at startup
+    """
+    global _synthesizer, _soundfont
+    with _synthesizer_lock:
+        _soundfont = soundfont
+        if _synthesizer is None:
+            try:
+                _synthesizer = Synthesizer(soundfont)
+            except Exception as e:
+                # Retried on first use, where the error reaches the job
+                logging.error(f"Failed to start synthesizer: {e}")
+
+def get_synthesizer():
+    """This process's synthesizer, started on first use if it isn't running yet"""
+    global _synthesizer
+    with _synthesizer_lock:
+        if _synthesizer is None:
+            _synthesizer = Synthesizer(_soundfont or resolve_soundfont())
+        return _synthesizer
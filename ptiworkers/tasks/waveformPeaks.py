@@ -0,0 +1,82 @@
+import struct
+import numpy as np
+
+# Zoom levels, in audio frames per waveform pixel; each must be a multiple
+# of the first, which is the only one computed from the PCM itself
+SAMPLES_PER_PIXEL = (256, 1024, 4096)
+
+PEAKS_MAGIC = b'PKS1'
+
+class WaveformPeaks:
+    """
+    Min/max waveform peaks built from PCM as it is rendered
+
+    Fed the same s16le interleaved blocks that go to the encoder. Only the
+    finest level is computed from samples (channels are folded together, so
+    the waveform is mono); coarser levels are reduced from it on save, which
+    gives exactly the same peaks as computing them from the samples.
+
+    File layout (little endian):
+        'PKS1', uint32 sample_rate, uint8 bits (8 or 16), uint8 level count
+        then per level: uint32 samples_per_pixel, uint32 pixel count,
+        followed by (min, max) pairs of int8/int16, one pair per pixel
+    """
+
+    def __init__(self, sample_rate, channels, samples_per_pixel=SAMPLES_PER_PIXEL):
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.samples_per_pixel = samples_per_pixel
+        self._carry = np.zeros(0, dtype=np.int16)
+        self._mins = []
+        self._maxs = []
+
+    def add(self, pcm):
+        """Take the next block of s16le interleaved PCM"""
+        samples = np.frombuffer(pcm, dtype='<i2')
+        if len(self._carry):
+            samples = np.concatenate([self._carry, samples])
+        pixel = self.samples_per_pixel[0] * self.channels
+        whole = len(samples) - len(samples) % pixel
+        if whole:
+            pixels = samples[:whole].reshape(-1, pixel)
+            self._mins.append(pixels.min(axis=1))
+            self._maxs.append(pixels.max(axis=1))
+        self._carry = samples[whole:].copy()
+
+    def levels(self):
+        """(samples_per_pixel, mins, maxs) for every zoom level, finest first"""
+        mins = self._mins + ([self._carry.min(keepdims=True)] if len(self._carry) else [])
+        maxs = self._maxs + ([self._carry.max(keepdims=True)] if len(self._carry) else [])
+        mins = np.concatenate(mins) if mins else np.zeros(0, dtype=np.int16)
+        maxs = np.concatenate(maxs) if maxs else np.zeros(0, dtype=np.int16)
+
+        finest = self.samples_per_pixel[0]
+        levels = []
+        for samples_per_pixel in self.samples_per_pixel:
+            group = samples_per_pixel // finest
+            # A trailing partial pixel covers whatever audio is left
+            pad = -len(mins) % group
+            level_mins = np.concatenate([mins, np.full(pad, np.iinfo(np.int16).max, dtype=np.int16)])
+            level_maxs = np.concatenate([maxs, np.full(pad, np.iinfo(np.int16).min, dtype=np.int16)])
+            levels.append((
+                samples_per_pixel,
+                level_mins.reshape(-1, group).min(axis=1),
+                level_maxs.reshape(-1, group).max(axis=1),
+            ))
+        return levels
+
+    def save(self, path, bits=8):
+        """Write all zoom levels to path as int8 (bits=8) or int16 peaks"""
+        if bits not in (8, 16):
+            raise ValueError(f"Peaks are stored with 8 or 16 bits, not {bits}")
+        levels = self.levels()
+        with open(path, 'wb') as f:
+            f.write(PEAKS_MAGIC + struct.pack('<IBB', self.sample_rate, bits, len(levels)))
+            for samples_per_pixel, mins, maxs in levels:
+                pairs = np.stack([mins, maxs], axis=1)
+                if bits == 8:
+                    # Arithmetic shift keeps negative peaks negative
+                    pairs = (pairs >> 8).astype(np.int8)
+                f.write(struct.pack('<II', samples_per_pixel, len(pairs)))
+                f.write(pairs.astype(pairs.dtype.newbyteorder('<')).tobytes())
+        return path
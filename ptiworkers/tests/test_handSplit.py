@@ -0,0 +1,195 @@
+import random
+
+import pytest
+
+from ptiworkers.tasks.handSplit import split_hands
+
+
+def reference_split(pitches):
+    """
+    The per-moment hand split MidiToMusicXML used before split_hands,
+    kept as an oracle. Returns (treble, bass) as sorted lists of indices.
+    """
+    notes = [{'index': i, 'midi_note': pitch} for i, pitch in enumerate(pitches)]
+
+    treble_notes = [n for n in notes if n['midi_note'] > 66]
+    bass_notes = [n for n in notes if n['midi_note'] < 54]
+
+    obvious_set = set(id(n) for n in treble_notes + bass_notes)
+    middle_notes = [n for n in notes if id(n) not in obvious_set]
+
+    avg_treble = sum(n['midi_note'] for n in treble_notes) / len(treble_notes) if treble_notes else 66
+    avg_bass = sum(n['midi_note'] for n in bass_notes) / len(bass_notes) if bass_notes else 54
+
+    for n in middle_notes:
+        dist_to_treble = abs(n['midi_note'] - avg_treble)
+        dist_to_bass = abs(n['midi_note'] - avg_bass)
+
+        if dist_to_treble <= dist_to_bass:
+            treble_notes.append(n)
+        else:
+            bass_notes.append(n)
+
+    MAX_RANGE = 14
+    MAX_ITER = 20
+
+    def get_range(notes):
+        if not notes:
+            return 0
+        notes_sorted = sorted(notes, key=lambda n: n['midi_note'])
+        return notes_sorted[-1]['midi_note'] - notes_sorted[0]['midi_note']
+
+    def average_pitch(notes, default):
+        return sum(n['midi_note'] for n in notes) / len(notes) if notes else default
+
+    def enforce_range(treble_notes, bass_notes):
+        iteration = 0
+
+        while iteration < MAX_ITER:
+            iteration += 1
+            changed = False
+
+            avg_treble = average_pitch(treble_notes, 66)
+            avg_bass = average_pitch(bass_notes, 54)
+
+            if get_range(treble_notes) > MAX_RANGE:
+                center = avg_treble
+                farthest = max(treble_notes, key=lambda n: abs(n['midi_note'] - center))
+                if abs(farthest['midi_note'] - avg_bass) < abs(farthest['midi_note'] - avg_treble):
+                    treble_notes.remove(farthest)
+                    bass_notes.append(farthest)
+                    changed = True
+                else:
+                    treble_notes.remove(farthest)
+                    break
+
+            if get_range(bass_notes) > MAX_RANGE:
+                center = avg_bass
+                farthest = max(bass_notes, key=lambda n: abs(n['midi_note'] - center))
+                if abs(farthest['midi_note'] - avg_treble) < abs(farthest['midi_note'] - avg_bass):
+                    bass_notes.remove(farthest)
+                    treble_notes.append(farthest)
+                    changed = True
+                else:
+                    bass_notes.remove(farthest)
+                    break
+
+            if not changed:
+                break
+
+        return treble_notes, bass_notes
+
+    treble_notes, bass_notes = enforce_range(treble_notes, bass_notes)
+    return sorted(n['index'] for n in treble_notes), sorted(n['index'] for n in bass_notes)
+
+
+def split(pitches):
+    treble, bass = split_hands(pitches)
+    return sorted(treble), sorted(bass)
+
+
+def hand_pitches(pitches, hands):
+    return tuple([pitches[i] for i in hand] for hand in hands)
+
+
+def random_chord(rng):
+    """A chord spread over the keyboard, clustered around the split, or in two wide clusters"""
+    size = rng.choice([1, 2, 3, 4, 5, 6, 8, 10, 12, 16, 24, 40])
+    kind = rng.random()
+    if kind < 0.5:
+        return [rng.randint(21, 108) for _ in range(size)]
+    if kind < 0.8:
+        # Repeated pitches around the split region
+        return [rng.randint(48, 72) for _ in range(size)]
+    # Hands overflow, so notes move or drop
+    return [rng.choice([rng.randint(21, 45), rng.randint(75, 108)]) for _ in range(size)]
+
+
+def test_random_chords_match_reference():
+    # Equal pitches are interchangeable on the page, but the same notes
+    # (and so the same durations and velocities) should land in each hand
+    rng = random.Random(0)
+    for _ in range(10000):
+        chord = random_chord(rng)
+        assert split(chord) == reference_split(chord), chord
+
+
+def test_empty_chord():
+    assert split_hands([]) == ([], [])
+
+
+@pytest.mark.parametrize("pitch", [21, 53, 54, 60, 66, 67, 108])
+def test_single_note(pitch):
+    assert split([pitch]) == reference_split([pitch])
+    treble, bass = split_hands([pitch])
+    assert len(treble) + len(bass) == 1
+
+
+def test_notes_near_middle_c():
+    chord = [58, 60, 62, 60, 64, 55, 65]
+    assert split(chord) == reference_split(chord)
+    treble, bass = split_hands(chord)
+    # Nothing is dropped when everything fits in both hands' reach
+    assert sorted(treble + bass) == list(range(len(chord)))
+
+
+def test_wide_hand_drops_notes():
+    # The treble spans 67..100; the far note can't move to the bass
+    chord = [67, 72, 76, 100]
+    treble, bass = split(chord)
+    assert (treble, bass) == reference_split(chord)
+    kept = [chord[i] for i in treble + bass]
+    assert 100 not in kept
+
+    # Both hands too wide: the treble loses 70, then balancing stops with
+    # the bass still spanning 29 semitones, as it always has
+    chord = [21, 30, 40, 50, 70, 85, 100, 108]
+    assert split(chord) == reference_split(chord)
+    assert hand_pitches(chord, split(chord)) == ([85, 100, 108], [21, 30, 40, 50])
+
+
+def test_equal_distances_prefer_first_listed():
+    # 67 and 87 are equally far from the treble average of 77; the old
+    # loop's max() picked whichever came first in the chord
+    for chord in ([67, 87, 77], [87, 67, 77], [40, 60, 50, 50], [60, 40, 50, 50]):
+        assert split(chord) == reference_split(chord), chord
+
+    # Equal pitches: the earliest-listed one is the one moved or dropped
+    for chord in ([67, 90, 90, 78], [90, 67, 90, 78], [30, 30, 50, 40]):
+        assert split(chord) == reference_split(chord), chord
+
+
+class CountingPitch(int):
+    """A pitch that counts the comparisons and subtractions made with it"""
+    operations = 0
+
+    def _count(op):
+        def counted(self, other):
+            CountingPitch.operations += 1
+            return op(self, other)
+        return counted
+
+    __lt__ = _count(int.__lt__)
+    __le__ = _count(int.__le__)
+    __gt__ = _count(int.__gt__)
+    __ge__ = _count(int.__ge__)
+    __eq__ = _count(int.__eq__)
+    __sub__ = _count(int.__sub__)
+    __hash__ = int.__hash__
+
+
+def test_scales_near_linearly():
+    rng = random.Random(0)
+
+    def operations_per_note(size):
+        chords = [[CountingPitch(rng.randint(21, 108)) for _ in range(size)] for _ in range(max(1, 4096 // size))]
+        CountingPitch.operations = 0
+        for chord in chords:
+            split_hands(chord)
+        return CountingPitch.operations / (len(chords) * size)
+
+    small = operations_per_note(64)
+    large = operations_per_note(4096)
+    # One sort makes it n log n: per-note work grows by about
+    # log(4096) / log(64) = 2x; a per-step scan of the hand would not fit
+    assert large < small * 3, (small, large)
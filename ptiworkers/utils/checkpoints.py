@@ -0,0 +1,95 @@
+import json
+import shutil
+import hashlib
+import logging
+from pathlib import Path
+from sqlalchemy import text
+
+def file_sha256(path):
+    """SHA-256 of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def load_checkpoints(engine, job_id, params):
+    """
+    Load the stage checkpoints recorded for a job
+
+    Only checkpoints written with the same params (model/level) are returned,
+    so a job requeued with different settings starts from scratch.
+    """
+    with engine.connect() as db:
+        result = db.execute(
+            text("SELECT checkpoints FROM jobs WHERE job_id = :job_id"),
+            {"job_id": job_id}
+        )
+        checkpoints = result.scalar() or {}
+
+    if isinstance(checkpoints, str):
+        checkpoints = json.loads(checkpoints)
+
+    return {
+        stage: checkpoint for stage, checkpoint in checkpoints.items()
+        if checkpoint.get("params") == params
+    }
+
+def save_checkpoint(engine, job_id, stage, key, path, params):
+    """Record that a stage produced the artifact at path, stored under key"""
+    checkpoint = {"key": key, "sha256": file_sha256(path), "params": params}
+    with engine.connect() as db:
+        db.execute(text("""
+            UPDATE jobs
+            SET checkpoints = COALESCE(checkpoints, '{}'::jsonb) || jsonb_build_object(:stage, CAST(:checkpoint AS jsonb))
+            WHERE job_id = :job_id
+        """), {"stage": stage, "checkpoint": json.dumps(checkpoint), "job_id": job_id})
+        db.commit()
+    logging.info(f"Checkpointed stage '{stage}' for job {job_id} at {key}")
+    return checkpoint
+
+def restore_checkpoint(checkpoint, dest_path, s3_client, bucket, upload_dir=None):
+    """
+    Put a checkpointed artifact at dest_path and verify its hash
+
+    A matching file already at dest_path (left over from an earlier attempt in
+    this container) is used as is; otherwise it is fetched from the local
+    upload dir or S3. Returns False if the artifact is missing or changed.
+    """
+    if not checkpoint:
+        return False
+
+    dest_path = Path(dest_path)
+    try:
+        if dest_path.exists() and file_sha256(dest_path) == checkpoint["sha256"]:
+            return True
+
+        dest_path.parent.mkdir(parents=True, exist_ok=True)
+        if upload_dir is not None:
+            source = Path(upload_dir) / checkpoint["key"]
+            if not source.exists():
+                return False
+            if source.resolve() != dest_path.resolve():
+                shutil.copyfile(source, dest_path)
+        else:
+            s3_client.download_file(bucket, checkpoint["key"], str(dest_path))
+
+        if file_sha256(dest_path) != checkpoint["sha256"]:
+            logging.warning(f"Checkpoint {checkpoint['key']} does not match its recorded hash; recomputing")
+            return False
+        return True
+    except Exception as e:
+        logging.warning(f"Could not restore checkpoint {checkpoint.get('key')}: {e}")
+        return False
+
+def checkpoint_exists(checkpoint, s3_client, bucket, upload_dir=None):
+    """Check a checkpointed artifact is still in storage without fetching it"""
+    if not checkpoint:
+        return False
+    try:
+        if upload_dir is not None:
+            return (Path(upload_dir) / checkpoint["key"]).exists()
+        s3_client.head_object(Bucket=bucket, Key=checkpoint["key"])
+        return True
+    except Exception:
+        return False
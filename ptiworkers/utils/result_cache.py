@@ -0,0 +1,169 @@
+import json
+import shutil
+import logging
+from pathlib import Path
+from sqlalchemy import text
+
+def _artifact_keys(job_id):
+    """Storage keys a finished job's artifacts live under"""
+    return {
+        "result_key": f"midi/{job_id}.mid",
+        "xml_key": f"xml/{job_id}.musicxml",
+        "pdf_key": f"pdf/{job_id}.pdf",
+        "audio_key": f"processed_audio/{job_id}.mp3",
+    }
+
+# Other audio renditions and the waveform peaks, stored next to the MP3 (see
+# AUDIO_RENDITIONS in midiToAudio). Copied when present; entries cached
+# before they were produced only have the MP3.
+ALTERNATE_AUDIO_EXTENSIONS = ["m4a", "opus", "peaks"]
+
+def _alternate_audio_keys(audio_key):
+    return [str(Path(audio_key).with_suffix(f".{extension}")) for extension in ALTERNATE_AUDIO_EXTENSIONS]
+
+def _artifact_prefix(key):
+    """Directory an artifact's parts live under (audio chunks, score pages) with their manifest"""
+    return str(Path(key).with_suffix(""))
+
+def _artifact_exists(key, s3_client, bucket, upload_dir=None):
+    try:
+        if upload_dir is not None:
+            return (Path(upload_dir) / key).exists()
+        s3_client.head_object(Bucket=bucket, Key=key)
+        return True
+    except Exception:
+        return False
+
+def _copy_artifact(source_key, dest_key, s3_client, bucket, upload_dir=None):
+    """Server-side copy in S3, plain file copy for local storage"""
+    if upload_dir is not None:
+        dest = Path(upload_dir) / dest_key
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(Path(upload_dir) / source_key, dest)
+    else:
+        s3_client.copy_object(
+            Bucket=bucket,
+            Key=dest_key,
+            CopySource={"Bucket": bucket, "Key": source_key},
+        )
+
+def _copy_prefix(source_prefix, dest_prefix, s3_client, bucket, upload_dir=None):
+    """Copy every artifact under a key prefix (a directory locally); nothing if there are none"""
+    if upload_dir is not None:
+        source = Path(upload_dir) / source_prefix
+        if source.is_dir():
+            shutil.copytree(source, Path(upload_dir) / dest_prefix, dirs_exist_ok=True)
+        return
+
+    paginator = s3_client.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket, Prefix=f"{source_prefix}/"):
+        for item in page.get("Contents", []):
+            name = item["Key"][len(source_prefix) + 1:]
+            _copy_artifact(item["Key"], f"{dest_prefix}/{name}", s3_client, bucket)
+
+def serve_from_cache(engine, job_id, source_sha256, model, level, s3_client, bucket,
+                     retention_days, upload_dir=None):
+    """
+    Finish a job from an earlier job's results for the same audio and settings
+
+    Entries not used within retention_days are evicted first. On a hit every
+    artifact is copied to this job's keys, the job is marked done and the
+    entry is re-pointed at the new copies, so the cache always follows the
+    most recent (longest-retained) artifacts. Returns True on a hit.
+    """
+    with engine.connect() as db:
+        evicted = db.execute(text("""
+            DELETE FROM result_cache
+            WHERE last_used_at < NOW() - make_interval(days => :retention_days)
+        """), {"retention_days": retention_days}).rowcount
+        if evicted:
+            logging.info(f"Evicted {evicted} expired result cache entries")
+
+        entry = db.execute(text("""
+            SELECT job_id, result_key, xml_key, pdf_key, audio_key, audio_metadata
+            FROM result_cache
+            WHERE source_sha256 = :sha256 AND model = :model AND level = :level
+        """), {"sha256": source_sha256, "model": model, "level": level}).mappings().fetchone()
+        db.commit()
+
+    if not entry or str(entry["job_id"]) == str(job_id):
+        logging.info(f"Result cache miss for job {job_id} ({model}, level {level})")
+        return False
+
+    source_keys = {name: entry[name] for name in ["result_key", "xml_key", "pdf_key", "audio_key"]}
+    if not all(_artifact_exists(key, s3_client, bucket, upload_dir) for key in source_keys.values()):
+        # Artifacts were removed with their job; the entry is no longer usable
+        logging.info(f"Result cache entry for job {entry['job_id']} has missing artifacts; evicting it")
+        with engine.connect() as db:
+            db.execute(text("""
+                DELETE FROM result_cache
+                WHERE source_sha256 = :sha256 AND model = :model AND level = :level
+            """), {"sha256": source_sha256, "model": model, "level": level})
+            db.commit()
+        return False
+
+    dest_keys = _artifact_keys(job_id)
+    for name, source_key in source_keys.items():
+        _copy_artifact(source_key, dest_keys[name], s3_client, bucket, upload_dir)
+    for source_key, dest_key in zip(_alternate_audio_keys(source_keys["audio_key"]),
+                                    _alternate_audio_keys(dest_keys["audio_key"])):
+        if _artifact_exists(source_key, s3_client, bucket, upload_dir):
+            _copy_artifact(source_key, dest_key, s3_client, bucket, upload_dir)
+    for name in ["audio_key", "pdf_key"]:
+        _copy_prefix(_artifact_prefix(source_keys[name]), _artifact_prefix(dest_keys[name]),
+                     s3_client, bucket, upload_dir)
+
+    audio_metadata = entry["audio_metadata"]
+    if audio_metadata is not None and not isinstance(audio_metadata, str):
+        audio_metadata = json.dumps(audio_metadata)
+
+    with engine.connect() as db:
+        db.execute(text("""
+            UPDATE jobs
+            SET status='done',
+                finished_at=NOW(),
+                result_key=:result_key,
+                xml_key=:xml_key,
+                pdf_key=:pdf_key,
+                audio_metadata=CAST(:audio_metadata AS jsonb),
+                source_sha256=:sha256,
+                cache_hit=TRUE
+            WHERE job_id=:job_id
+        """), {**dest_keys, "audio_metadata": audio_metadata, "sha256": source_sha256, "job_id": job_id})
+        db.execute(text("""
+            UPDATE result_cache
+            SET job_id=:job_id,
+                result_key=:result_key,
+                xml_key=:xml_key,
+                pdf_key=:pdf_key,
+                audio_key=:audio_key,
+                hit_count=hit_count + 1,
+                last_used_at=NOW()
+            WHERE source_sha256 = :sha256 AND model = :model AND level = :level
+        """), {**dest_keys, "job_id": job_id, "sha256": source_sha256, "model": model, "level": level})
+        db.commit()
+
+    logging.info(f"Result cache hit for job {job_id}: reused results of job {entry['job_id']}")
+    return True
+
+def store_result(engine, job_id, source_sha256, model, level):
+    """Record a finished job's artifacts as the cached result for its audio"""
+    with engine.connect() as db:
+        db.execute(text("""
+            INSERT INTO result_cache (source_sha256, model, level, job_id, result_key, xml_key, pdf_key, audio_key, audio_metadata)
+            SELECT :sha256, :model, :level, job_id, :result_key, :xml_key, :pdf_key, :audio_key, audio_metadata
+            FROM jobs WHERE job_id = :job_id
+            ON CONFLICT (source_sha256, model, level) DO UPDATE
+            SET job_id = EXCLUDED.job_id,
+                result_key = EXCLUDED.result_key,
+                xml_key = EXCLUDED.xml_key,
+                pdf_key = EXCLUDED.pdf_key,
+                audio_key = EXCLUDED.audio_key,
+                audio_metadata = EXCLUDED.audio_metadata,
+                last_used_at = NOW()
+        """), {**_artifact_keys(job_id), "sha256": source_sha256, "model": model, "level": level, "job_id": job_id})
+        db.execute(text("""
+            UPDATE jobs SET source_sha256 = :sha256 WHERE job_id = :job_id
+        """), {"sha256": source_sha256, "job_id": job_id})
+        db.commit()
+    logging.info(f"Stored job {job_id} in the result cache ({model}, level {level})")
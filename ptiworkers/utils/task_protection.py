@@ -2,6 +2,7 @@ import boto3
 import os
 import requests
 import logging
+import threading
 
 ecs = boto3.client("ecs", region_name=os.environ.get("AWS_REGION", "us-east-1"))
 
@@ -65,3 +66,29 @@ def disable_task_protection(local=False):
     except Exception as e:
         logging.error(f"Could not clear task protection: {e}")
         raise
+
+# Jobs currently running in this worker; protection stays on while any are active
+_active_jobs = 0
+_active_jobs_lock = threading.Lock()
+
+def acquire_task_protection(local=False):
+    """Register a running job and (re)enable protection, refreshing its expiry"""
+    global _active_jobs
+    with _active_jobs_lock:
+        _active_jobs += 1
+        try:
+            enable_task_protection(local=local)
+        except Exception:
+            logging.exception("Error enabling task protection; continuing without it.")
+
+def release_task_protection(local=False):
+    """Unregister a finished job and clear protection once no jobs are left"""
+    global _active_jobs
+    with _active_jobs_lock:
+        _active_jobs = max(0, _active_jobs - 1)
+        if _active_jobs > 0:
+            return
+        try:
+            disable_task_protection(local=local)
+        except Exception:
+            logging.exception("Error disabling task protection; will continue.")
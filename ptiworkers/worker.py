@@ -6,15 +6,27 @@ from pathlib import Path
 from sqlalchemy import create_engine, text
 from packages.pianofi_config.config import Config 
 
-from ptiworkers.tasks.pti import run_pti
+from ptiworkers.tasks.pti import run_pti, load_pti_model
+from ptiworkers.tasks.midiParser import parse_midi
 from ptiworkers.tasks.midiToXml import convert_midi_to_xml
 from ptiworkers.tasks.midiToAudio import convert_midi_to_audio
 from ptiworkers.tasks.xmlToPdf import convert_musicxml_to_pdf
-from utils.task_protection import enable_task_protection, disable_task_protection
+from ptiworkers.tasks.lilypondRenderer import LilyPondRenderer
+from ptiworkers.tasks.synthesizer import resolve_soundfont, start_synthesizer
+from utils.task_protection import acquire_task_protection, release_task_protection
 from utils.error import mark_job_as_error
+from utils.stage_pool import StagePool
+from utils.scratch import ScratchDir
+from utils.reliable_queue import ReliableQueue
+from utils.checkpoints import load_checkpoints, save_checkpoint, restore_checkpoint, checkpoint_exists, file_sha256
+from utils.result_cache import serve_from_cache, store_result
 from mutagen import File
 import os
+import sys
 import signal
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
 shutdown_requested = False
 
 def signal_handler(sig, frame):
@@ -25,7 +37,14 @@ signal.signal(signal.SIGTERM, signal_handler)
 
 logging.info("Starting PTI worker...")
 
-def process_job(job, engine, s3_client, aws_creds, local):
+def process_job(job, engine, s3_client, aws_creds, local, transcriptor=None, stage_pool=None,
+                lilypond_renderer=None):
+    # Every intermediate file goes in the job's own scratch directory, which
+    # is removed however the job ends
+    with ScratchDir(job["jobId"], Config.SCRATCH_DIR) as scratch:
+        _process_job(job, engine, s3_client, aws_creds, local, transcriptor, stage_pool, lilypond_renderer, scratch)
+
+def _process_job(job, engine, s3_client, aws_creds, local, transcriptor, stage_pool, lilypond_renderer, scratch):
     job_id   = job["jobId"]
     file_key = job["fileKey"]
     user_id  = job["userId"]
@@ -38,6 +57,7 @@ def process_job(job, engine, s3_client, aws_creds, local):
             UPDATE jobs
             SET status='processing', started_at=NOW() 
             WHERE job_id=:jobId AND file_key=:fileKey AND user_id=:userId
+              AND status IN ('queued', 'processing')
         """)
 
         update_result = db.execute(update_sql, {"jobId":job_id, "fileKey":file_key, "userId":user_id})
@@ -47,189 +67,284 @@ def process_job(job, engine, s3_client, aws_creds, local):
             return
         db.commit()
     logging.info(f"Job {job_id} status updated to processing.")
-    # 2) Download raw audio
+    # Stage checkpoints from an earlier delivery of this job; only reused if
+    # the job was run with the same model settings
+    checkpoint_params = {"model": "pti"}
+    checkpoints = load_checkpoints(engine, job_id, checkpoint_params)
+
+    UPLOAD_DIR = Path(__file__).parent.parent / "uploads"
+    upload_dir = UPLOAD_DIR if local else None
+
+    if not local and not s3_client:
+        logging.error(f"S3 client not available for job {job_id}")
+        mark_job_as_error(engine, job_id, "S3 client not available")
+        return
+
+    midi_key = f"midi/{job_id}.mid"
+    midi_tmp = str(scratch.path / f"{job_id}.midi")
+    midi_path = Path(midi_tmp)
     if local:
-        # Local development - use a local file
-        UPLOAD_DIR = Path(__file__).parent.parent / "uploads"
         local_raw = UPLOAD_DIR / file_key  # Use original file_key path
-        if not local_raw.exists():
-            raise FileNotFoundError(f"Local file {local_raw} does not exist.")
-        logging.info(f"Using local file {local_raw} for job {job_id}")
     else:
-        # Production - download from S3
-        if not s3_client:
-            logging.error(f"S3 client not available for job {job_id}")
-            mark_job_as_error(engine, job_id, "S3 client not available")
-            return
-
         # Extract original extension from file_key
         file_extension = Path(file_key).suffix or '.mp3'
-        local_raw = Path(f"/tmp/{job_id}{file_extension}")
-        
-        logging.info(f"Downloading s3://{bucket}/{file_key} to {local_raw}")
-        s3_client.download_file(
-            bucket,
-            file_key,
-            str(local_raw)
-        )
-        logging.info(f"Downloaded {local_raw}")
+        local_raw = scratch.path / f"{job_id}{file_extension}"
 
-    # Extract audio duration
-    try:
-        # Load audio file to get duration
-        audio = File(local_raw)
-        duration = audio.info.length
-        
-        # Update job with file duration
-        with engine.connect() as db:
-            db.execute(text("""
-                UPDATE jobs 
-                SET file_duration = :duration 
-                WHERE job_id = :job_id
-            """), {"duration": duration, "job_id": job_id})
-            db.commit()
-    except Exception as e:
-        logging.warning(f"Could not extract duration for {job_id}: {e}")
-        mark_job_as_error(engine, job_id, f"Duration extraction error: {e}")
+    # Results are cached per (source audio hash, model, level)
+    result_cache = Config.RESULT_CACHE == "true"
+    cache_model, cache_level = "pti", 0
+    source_sha256 = checkpoints.get("download", {}).get("sha256")
 
-    # 3) pti processing
-    try:
-        logging.info(f"Running PTI for job {job_id} on {local_raw}")
-        midi_path = run_pti(str(local_raw), f"/tmp/{job_id}.midi")  
+    # A checkpointed MIDI means download and transcription already happened
+    if restore_checkpoint(checkpoints.get("midi"), midi_path, s3_client, bucket, upload_dir):
+        logging.info(f"Resuming job {job_id} from checkpointed MIDI {midi_key}; skipping download and transcription")
         final_mid = midi_path
-        logging.info(f"PTI generated MIDI file: {final_mid}")
-    except Exception as e:
-        logging.error(f"Error running PTI for job {job_id}: {e}")
-        mark_job_as_error(engine, job_id, f"PTI error: {e}")
-        return
-    # 4) Upload result
-    midi_key = f"midi/{job_id}.mid"
+    else:
+        # 2) Download raw audio
+        if local:
+            # Local development - use a local file
+            if not local_raw.exists():
+                raise FileNotFoundError(f"Local file {local_raw} does not exist.")
+            logging.info(f"Using local file {local_raw} for job {job_id}")
+        elif restore_checkpoint(checkpoints.get("download"), local_raw, s3_client, bucket):
+            logging.info(f"Reusing downloaded audio {local_raw} for job {job_id}")
+        else:
+            # Production - download from S3
+            logging.info(f"Downloading s3://{bucket}/{file_key} to {local_raw}")
+            s3_client.download_file(
+                bucket,
+                file_key,
+                str(local_raw)
+            )
+            logging.info(f"Downloaded {local_raw}")
+            save_checkpoint(engine, job_id, "download", file_key, local_raw, checkpoint_params)
 
-    if local:
-        UPLOAD_DIR = Path(__file__).parent.parent / "uploads"
-        final_mid = UPLOAD_DIR / midi_key
+        # Extract audio duration
+        try:
+            # Load audio file to get duration
+            audio = File(local_raw)
+            duration = audio.info.length
 
-        if not final_mid.parent.exists():
-            final_mid.parent.mkdir(parents=True, exist_ok=True)
-        logging.info(f"Saving result to local {final_mid}")
+            # Update job with file duration
+            with engine.connect() as db:
+                db.execute(text("""
+                    UPDATE jobs 
+                    SET file_duration = :duration 
+                    WHERE job_id = :job_id
+                """), {"duration": duration, "job_id": job_id})
+                db.commit()
+        except Exception as e:
+            logging.warning(f"Could not extract duration for {job_id}: {e}")
+            mark_job_as_error(engine, job_id, f"Duration extraction error: {e}")
 
-        # Save the MIDI file locally
-        with open(final_mid, "wb") as f:
-            with open(midi_path, "rb") as midi_file:
-                f.write(midi_file.read())
+        # Identical audio already transcribed with the same settings: reuse its results
+        source_sha256 = source_sha256 or file_sha256(local_raw)
+        if result_cache:
+            try:
+                if serve_from_cache(engine, job_id, source_sha256, cache_model, cache_level, s3_client, bucket,
+                                    Config.RESULT_CACHE_RETENTION_DAYS, upload_dir):
+                    return
+            except Exception as e:
+                logging.warning(f"Result cache lookup failed for job {job_id}; transcribing instead: {e}")
+
+        # 3) pti processing
+        try:
+            logging.info(f"Running PTI for job {job_id} on {local_raw}")
+            midi_path = run_pti(str(local_raw), midi_tmp, transcriptor=transcriptor)
+            final_mid = midi_path
+            logging.info(f"PTI generated MIDI file: {final_mid}")
+        except Exception as e:
+            logging.error(f"Error running PTI for job {job_id}: {e}")
+            mark_job_as_error(engine, job_id, f"PTI error: {e}")
+            return
 
-    else:
-        # Production - upload to S3
-        logging.info(f"Uploading result to s3://{bucket}/{midi_key}")
-        s3_client.upload_file(final_mid, bucket, midi_key)
+        # 4) Upload result
+        if local:
+            final_mid = UPLOAD_DIR / midi_key
 
-    # 5) Transform midi into xml
+            if not final_mid.parent.exists():
+                final_mid.parent.mkdir(parents=True, exist_ok=True)
+            logging.info(f"Saving result to local {final_mid}")
 
-    xml_path = f"/tmp/{job_id}.musicxml"
+            # Save the MIDI file locally
+            with open(final_mid, "wb") as f:
+                with open(midi_path, "rb") as midi_file:
+                    f.write(midi_file.read())
+
+        else:
+            # Production - upload to S3
+            logging.info(f"Uploading result to s3://{bucket}/{midi_key}")
+            s3_client.upload_file(final_mid, bucket, midi_key)
+
+        save_checkpoint(engine, job_id, "midi", midi_key, final_mid, checkpoint_params)
+
+    # 5) Post-processing runs as a small dependency graph in the stage pool:
+    #    MIDI → XML → PDF
+    #    MIDI → audio
+    # Branches whose artifacts are already checkpointed are skipped.
+    xml_path = str(scratch.path / f"{job_id}.musicxml")
     xml_key = f"xml/{job_id}.musicxml"
+    ly_path = str(scratch.path / f"{job_id}.ly")
+    pdf_path = str(scratch.path / f"{job_id}.pdf")
+    pdf_key = f"pdf/{job_id}.pdf"
+    pages_dir = scratch.path / "pages"
+    pages_prefix = f"pdf/{job_id}"
+    audio_path = str(scratch.path / f"{job_id}.mp3")
+    audio_key = f"processed_audio/{job_id}.mp3"
+    chunk_prefix = f"processed_audio/{job_id}"
 
-    try:
-        # Use the modular conversion function
-        with engine.connect() as db:
-            result = db.execute(
-                text("SELECT file_name FROM jobs WHERE job_id = :job_id"),
-                {"job_id": job_id}
-            )
-            sheet_music_title = result.scalar()
-            logging.info(f"Sheet music title from DB: {sheet_music_title}")
-            if sheet_music_title:
-                sheet_music_title = os.path.splitext(sheet_music_title)[0]
-                logging.info(f"Processed sheet music title: {sheet_music_title}")
+    pdf_done = checkpoint_exists(checkpoints.get("pdf"), s3_client, bucket, upload_dir)
+    audio_done = checkpoint_exists(checkpoints.get("audio"), s3_client, bucket, upload_dir)
+    if pdf_done:
+        xml_done = checkpoint_exists(checkpoints.get("xml"), s3_client, bucket, upload_dir)
+    else:
+        xml_done = restore_checkpoint(checkpoints.get("xml"), xml_path, s3_client, bucket, upload_dir)
+
+    skipped = [stage for stage, done in [("xml", xml_done), ("pdf", pdf_done), ("audio", audio_done)] if done]
+    if skipped:
+        logging.info(f"Job {job_id} resuming; skipping checkpointed stages: {', '.join(skipped)}")
+
+    midi_file_path = Path(final_mid)
+    xml_future = None
+    audio_future = None
 
+    try:
         logging.info(f"Converting MIDI file: {final_mid}")
-        if isinstance(final_mid, Path):
-            midi_file_path = final_mid
-        else:
-            midi_file_path = Path(final_mid)
-        
+
         if not midi_file_path.exists():
             logging.error(f"MIDI file does not exist: {midi_file_path}")
             return
-        
+
         file_size = midi_file_path.stat().st_size
         logging.info(f"MIDI file size: {file_size} bytes")
-        
+
         if file_size == 0:
             logging.error(f"MIDI file is empty: {midi_file_path}")
             return
 
-        convert_midi_to_xml(final_mid, xml_path, job_id, sheet_music_title)
-
-        if local:
-            xml_final = UPLOAD_DIR / f"xml/{job_id}.musicxml"
-            if not xml_final.parent.exists():
-                xml_final.parent.mkdir(parents=True, exist_ok=True)
-            with open(xml_final, "wb") as f:
-                with open(xml_path, "rb") as xml_file:
-                    f.write(xml_file.read())
-            xml_key = f"xml/{job_id}.musicxml"
-        else:
-            s3_client.upload_file(xml_path, bucket, xml_key)
-            xml_key = f"xml/{job_id}.musicxml"
-
-        logging.info(f"XML conversion completed for job {job_id}")
+        # Parse the MIDI once; both branches get the same note table and tempo map
+        if not (xml_done and audio_done):
+            midi_data = parse_midi(midi_file_path)
 
+        if not xml_done:
+            with engine.connect() as db:
+                result = db.execute(
+                    text("SELECT file_name FROM jobs WHERE job_id = :job_id"),
+                    {"job_id": job_id}
+                )
+                sheet_music_title = result.scalar()
+                logging.info(f"Sheet music title from DB: {sheet_music_title}")
+                if sheet_music_title:
+                    sheet_music_title = os.path.splitext(sheet_music_title)[0]
+                    logging.info(f"Processed sheet music title: {sheet_music_title}")
+
+            xml_future = stage_pool.submit(convert_midi_to_xml, midi_file_path, xml_path, job_id, sheet_music_title, midi_data,
+                                           ly_path, Config.MUSICXML_COMPACT == "true")
     except Exception as e:
+        if isinstance(e, BrokenProcessPool) and stage_pool.broken:
+            raise
         logging.error(f"Error in XML conversion step for job {job_id}: {e}")
         mark_job_as_error(engine, job_id, f"XML conversion error: {e}")
         return
 
-    # 6) Convert XML → PDF
-    pdf_path = f"/tmp/{job_id}.pdf"
-    pdf_key = f"pdf/{job_id}.pdf"
+    if not audio_done:
+        audio_future = stage_pool.submit(convert_midi_to_audio, midi_file_path, Path(audio_path), job_id, midi_data,
+                                         Config.AUDIO_RENDER_SEGMENTS)
 
+    # 5a) MIDI → XML
     try:
-        logging.info(f"Generating PDF for job {job_id} from {xml_path}")
-        convert_musicxml_to_pdf(xml_path, pdf_path)
+        if xml_future:
+            xml_future.result()
 
-        if local:
-            pdf_final = UPLOAD_DIR / pdf_key
-            pdf_final.parent.mkdir(parents=True, exist_ok=True)
-            with open(pdf_final, "wb") as f:
-                with open(pdf_path, "rb") as pdf_file:
-                    f.write(pdf_file.read())
-            logging.info(f"Saved PDF locally at {pdf_final}")
-        else:
-            logging.info(f"Uploading PDF to s3://{bucket}/{pdf_key}")
-            s3_client.upload_file(pdf_path, bucket, pdf_key)
-            logging.info(f"Uploaded PDF for job {job_id} to S3 at {pdf_key}")
+            if local:
+                xml_final = UPLOAD_DIR / xml_key
+                xml_final.parent.mkdir(parents=True, exist_ok=True)
+                with open(xml_final, "wb") as f:
+                    with open(xml_path, "rb") as xml_file:
+                        f.write(xml_file.read())
+            else:
+                s3_client.upload_file(xml_path, bucket, xml_key)
+
+            save_checkpoint(engine, job_id, "xml", xml_key, xml_path, checkpoint_params)
+            logging.info(f"XML conversion completed for job {job_id}")
+    except Exception as e:
+        if isinstance(e, BrokenProcessPool) and stage_pool.broken:
+            raise
+        logging.error(f"Error in XML conversion step for job {job_id}: {e}")
+        mark_job_as_error(engine, job_id, f"XML conversion error: {e}")
+        if audio_future:
+            wait([audio_future])
+        return
+
+    # 5b) XML → PDF, on this thread; the renderer batches its LilyPond run
+    #     with other jobs'
+    try:
+        if not pdf_done:
+            logging.info(f"Generating PDF for job {job_id} from {xml_path}")
+            convert_musicxml_to_pdf(xml_path, pdf_path, ly_path=ly_path, renderer=lilypond_renderer,
+                                    work_dir=scratch.path, pages_dir=pages_dir)
+
+            # Per-page SVGs, thumbnails and their manifest go under pdf/{job_id}/
+            # before the PDF, so the PDF's checkpoint implies they are stored
+            for page_path in sorted(pages_dir.iterdir()):
+                page_key = f"{pages_prefix}/{page_path.name}"
+                if local:
+                    page_final = UPLOAD_DIR / page_key
+                    page_final.parent.mkdir(parents=True, exist_ok=True)
+                    with open(page_final, "wb") as f:
+                        with open(page_path, "rb") as page_file:
+                            f.write(page_file.read())
+                else:
+                    s3_client.upload_file(str(page_path), bucket, page_key)
+            logging.info(f"Stored score pages for job {job_id} under {pages_prefix}/")
+
+            if local:
+                pdf_final = UPLOAD_DIR / pdf_key
+                pdf_final.parent.mkdir(parents=True, exist_ok=True)
+                with open(pdf_final, "wb") as f:
+                    with open(pdf_path, "rb") as pdf_file:
+                        f.write(pdf_file.read())
+                logging.info(f"Saved PDF locally at {pdf_final}")
+            else:
+                logging.info(f"Uploading PDF to s3://{bucket}/{pdf_key}")
+                s3_client.upload_file(pdf_path, bucket, pdf_key)
+                logging.info(f"Uploaded PDF for job {job_id} to S3 at {pdf_key}")
+
+            save_checkpoint(engine, job_id, "pdf", pdf_key, pdf_path, checkpoint_params)
 
     except Exception as e:
         logging.error(f"Error generating or uploading PDF for job {job_id}: {e}")
         mark_job_as_error(engine, job_id, f"PDF conversion error: {e}")
+        if audio_future:
+            wait([audio_future])
         return
-     
-    # 6) Convert MIDI to audio
-    audio_path = f"/tmp/{job_id}.mp3"
-    audio_key = f"processed_audio/{job_id}.mp3"
-    try:
-        audio_file_path, metadata = convert_midi_to_audio(Path(final_mid), Path(audio_path), job_id)
-        
-        logging.info(f"Audio file generated at {audio_file_path} with metadata: {metadata}")
-
-        if local:
-            audio_final = UPLOAD_DIR / f"processed_audio/{job_id}.mp3"
-            if not audio_final.parent.exists():
-                audio_final.parent.mkdir(parents=True, exist_ok=True)
-            with open(audio_final, "wb") as f:
-                with open(audio_path, "rb") as audio_file:
-                    f.write(audio_file.read())
 
-            with engine.connect() as db:
-                db.execute(text("""
-                    UPDATE jobs 
-                    SET audio_metadata = :audio_metadata 
-                    WHERE job_id = :job_id
-                """), {"audio_metadata": json.dumps(metadata), "job_id": job_id})
-                db.commit()
-        else:
-            audio_key = f"processed_audio/{job_id}.mp3"
-            s3_client.upload_file(audio_path, bucket, audio_key)
+    # 6) MIDI → audio (rendered alongside the sheet music branch)
+    try:
+        if audio_future:
+            audio_paths, metadata = audio_future.result()
+
+            logging.info(f"Audio files generated at {audio_paths} with metadata: {metadata}")
+
+            # Chunks and their manifest go under processed_audio/{job_id}/,
+            # every other rendition (and the waveform peaks) sits next to the
+            # MP3 under the same name. The MP3 goes last so its checkpoint
+            # implies the rest are stored.
+            chunk_dir = Path(audio_paths.pop("chunks"))
+            uploads = [(path, f"{chunk_prefix}/{path.name}") for path in sorted(chunk_dir.iterdir())]
+            uploads += [
+                (Path(rendition_path), str(Path(audio_key).with_suffix(f".{extension}")))
+                for extension, rendition_path in sorted(audio_paths.items(), key=lambda item: item[0] == "mp3")
+            ]
+            for upload_path, upload_key in uploads:
+                if local:
+                    audio_final = UPLOAD_DIR / upload_key
+                    audio_final.parent.mkdir(parents=True, exist_ok=True)
+                    with open(audio_final, "wb") as f:
+                        with open(upload_path, "rb") as audio_file:
+                            f.write(audio_file.read())
+                else:
+                    s3_client.upload_file(str(upload_path), bucket, upload_key)
 
             with engine.connect() as db:
                 db.execute(text("""
@@ -239,8 +354,10 @@ def process_job(job, engine, s3_client, aws_creds, local):
                 """), {"audio_metadata": json.dumps(metadata), "job_id": job_id})
                 db.commit()
 
-            audio_final = f"s3://{bucket}/{audio_key}"
+            save_checkpoint(engine, job_id, "audio", audio_key, audio_path, checkpoint_params)
     except Exception as e:
+        if isinstance(e, BrokenProcessPool) and stage_pool.broken:
+            raise
         logging.error(f"Error converting MIDI to audio for job {job_id}: {e}")
         mark_job_as_error(engine, job_id, f"MIDI to audio conversion error: {e}")
         return
@@ -267,16 +384,11 @@ def process_job(job, engine, s3_client, aws_creds, local):
         mark_job_as_error(engine, job_id, f"Final DB update error: {e}")
         return
 
-    # 8) cleanup tmp files
-
-    try:
-        for path in [Path(local_raw), Path(audio_path), Path(midi_path), Path(xml_path), Path(pdf_path)]:
-            if path.exists():
-                path.unlink()
-                logging.info(f"Deleted temporary file: {path}")
-    except Exception as e:
-        logging.error(f"Error cleaning up temporary files: {e}")
-        mark_job_as_error(engine, job_id, f"Temporary file cleanup error: {e}")
+    if result_cache and source_sha256:
+        try:
+            store_result(engine, job_id, source_sha256, cache_model, cache_level)
+        except Exception as e:
+            logging.warning(f"Could not store job {job_id} in the result cache: {e}")
 
 def main():
 
@@ -287,6 +399,30 @@ def main():
     local = Config.USE_LOCAL_STORAGE == "true"
     development = Config.ENVIRONMENT == "development"
 
+    if Config.ENVIRONMENT == "development":
+        queue_name = "pti_job_queue_dev"
+    elif Config.ENVIRONMENT == "production":
+        queue_name = "pti_job_queue_prod"
+    else:
+        logging.error(f"FATAL Unknown environment: {Config.ENVIRONMENT}")
+        return
+
+    # Number of jobs this worker runs at once; the DB pool is sized to match
+    slots = Config.WORKER_CONCURRENCY
+
+    # Soundfont is resolved once here; every stage process loads it a single
+    # time at startup and keeps its synthesizer for the lifetime of the worker
+    try:
+        soundfont = resolve_soundfont(Config.SOUNDFONT_PATH)
+    except FileNotFoundError as e:
+        logging.error(f"FATAL {e}")
+        return
+
+    # Processes for the XML and audio branches; started before anything
+    # else so the forked children don't inherit models or job threads. The
+    # pool is never re-forked: if a child dies the worker exits instead
+    stage_pool = StagePool(max_workers=2 * slots, initializer=start_synthesizer, initargs=(soundfont,))
+
     try:
         logging.info("Loading configuration for redis...")
         # Redis & DB
@@ -300,7 +436,7 @@ def main():
             DATABASE_URL,
             pool_pre_ping=True,
             pool_recycle=300,
-            pool_size=1,
+            pool_size=slots,
             max_overflow=2
         )
 
@@ -313,76 +449,131 @@ def main():
                 region_name=aws_creds["aws_region"],
             )
 
+        # Load the transcription model once for the lifetime of the worker
+        logging.info("Loading PianoTranscription model...")
+        transcriptor = load_pti_model(device="cpu")
+
     except Exception as e:
         logging.error(f"FATAL Error initializing worker: {e}")
+        stage_pool.shutdown()
         return
 
-    logging.info("Worker started, waiting for jobs…")
+    # Reliable mode leases each job instead of popping it, so jobs held by a
+    # container that dies are handed back to the queue by another worker
+    reliable_queue = None
+    if Config.RELIABLE_QUEUE == "true":
+        reliable_queue = ReliableQueue(r, queue_name)
+        reliable_queue.start()
+
+    # LilyPond runs are batched across all jobs on this worker
+    lilypond_renderer = LilyPondRenderer(
+        max_processes=Config.LILYPOND_PROCESSES,
+        batch_window=Config.LILYPOND_BATCH_WINDOW,
+        max_batch=Config.LILYPOND_BATCH_SIZE,
+        work_dir=Config.SCRATCH_DIR,
+    )
+    lilypond_renderer.start()
+
+    logging.info(f"Worker started with {slots} job slot(s), waiting for jobs…")
+    executor = ThreadPoolExecutor(max_workers=slots, thread_name_prefix="job")
+    free_slots = threading.BoundedSemaphore(slots)
+
+    def run_job(raw):
+        retry = False
+        try:
+            job = json.loads(raw)
+            logging.info(f"Dequeued {job['jobId']}")
+
+            acquire_task_protection(local=development)
+            try:
+                process_job(job, engine, s3_client, aws_creds, local, transcriptor, stage_pool, lilypond_renderer)
+            except BrokenProcessPool:
+                # The stage pool broke under this job, not because of it; it is
+                # handed back and resumed from its checkpoints after the restart
+                logging.warning(f"Stage pool broke during job {job['jobId']}; requeueing it")
+                retry = True
+            except Exception as e:
+                logging.exception("Error processing job; will continue.")
+                mark_job_as_error(engine, job["jobId"], f"Unexpected error: {e}")
+            finally:
+                release_task_protection(local=development)
+        except Exception:
+            logging.exception("Error parsing job; will continue.")
+        finally:
+            if retry:
+                try:
+                    if reliable_queue:
+                        reliable_queue.requeue(raw)
+                    else:
+                        r.rpush(queue_name, raw)
+                except Exception:
+                    logging.exception("Error requeueing job.")
+            elif reliable_queue:
+                # The job has reached done or error (or was unparseable);
+                # either way it must not be delivered again
+                try:
+                    reliable_queue.ack(raw)
+                except Exception:
+                    logging.exception("Error acking job; its lease will expire and it may be redelivered.")
+            free_slots.release()
+
     loop_count = 0
     try:
-        while not shutdown_requested:
+        while not shutdown_requested and not stage_pool.broken:
+            # Only take a job off the queue once a slot is free to run it
+            if not free_slots.acquire(timeout=5):
+                continue
+
+            submitted = False
             loop_count += 1
             logging.info(f"Loop iteration {loop_count}")
             try:
-                if Config.ENVIRONMENT == "development":
-                    item = r.brpop("pti_job_queue_dev", timeout=5)
-                elif Config.ENVIRONMENT == "production":
-                    item = r.brpop("pti_job_queue_prod", timeout=5)
+                if reliable_queue:
+                    raw = reliable_queue.pop(timeout=5)
                 else:
-                    logging.error(f"Unknown environment: {Config.ENVIRONMENT}")
-                    continue
+                    item = r.brpop(queue_name, timeout=5)
+                    raw = item[1] if item else None
 
-                if item is None:
+                if raw is None:
                     continue
 
-                if shutdown_requested:
-                    _, raw = item
+                if shutdown_requested or stage_pool.broken:
                     try:
-                        if Config.ENVIRONMENT == "development":
-                            r.lpush("pti_job_queue_dev", raw)
-                        elif Config.ENVIRONMENT == "production":
-                            r.lpush("pti_job_queue_prod", raw)
+                        # Put it back on the end workers consume from so it's picked up next
+                        if reliable_queue:
+                            reliable_queue.requeue(raw)
                         else:
-                            logging.error(f"Unknown environment: {Config.ENVIRONMENT}")
+                            r.rpush(queue_name, raw)
                         logging.info("Shutdown requested; requeued job and exiting.")
                     except Exception as e:
                         logging.error(f"Error requeuing job: {e}")
                     break
-                
-                if item:
-                    logging.info(f"Got job: {item}")
-                    _, raw = item
-                    try:
-                        job = json.loads(raw)
-                        logging.info(f"Dequeued {job['jobId']}")
-
-                        protection_enabled = False
-                        try:
-                            enable_task_protection(local=development)
-                            protection_enabled = True
-                        except Exception:
-                            logging.exception("Error enabling task protection; continuing without it.")
-
-                        try:
-                            process_job(job, engine, s3_client, aws_creds, local)
-                        except Exception:
-                            logging.exception("Error processing job; will continue.")
-                        finally:
-                            if protection_enabled:
-                                try:
-                                    disable_task_protection(local=development)
-                                except Exception:
-                                    logging.exception("Error disabling task protection; will continue.")
-                    except Exception:
-                        logging.exception("Error parsing job; will continue.")
-                else:
-                    logging.info("No jobs in queue, waiting…")
-                    time.sleep(1)
+
+                logging.info(f"Got job: {raw}")
+                executor.submit(run_job, raw)
+                submitted = True
             except redis.exceptions.ConnectionError as e:
                 logging.error(f"Redis connection error: {e}")
+                time.sleep(1)
+            finally:
+                if not submitted:
+                    free_slots.release()
 
     except KeyboardInterrupt:
         logging.info("Worker stopped by user.")
+    finally:
+        # Let in-flight jobs finish before the process exits
+        logging.info("Waiting for running jobs to finish…")
+        executor.shutdown(wait=True)
+        lilypond_renderer.stop()
+        stage_pool.shutdown()
+        if reliable_queue:
+            reliable_queue.stop()
+
+    if stage_pool.broken:
+        # Non-zero so the container is restarted with a fresh stage pool
+        logging.error("Exiting because the stage pool is broken")
+        sys.exit(1)
 
 if __name__=="__main__":
     main()
\ No newline at end of file